@@ -11,6 +11,7 @@ from kkpsgre.connector import DBConnector
 __all__ = [
     "select",
     "insert",
+    "upsert",
     "exec",
     "delete",
 ]
@@ -52,6 +53,25 @@ def insert(src: DBConnector | str, df: pd.DataFrame, tblname: str, is_select: bo
         res = requests.post(f"http://{src}/insert", json=dictwk, headers={'Content-type': 'application/json'})
         assert res.status_code == 200
 
+def upsert(src: DBConnector | str, df: pd.DataFrame, tblname: str, update_columns: list[str]=None, do_nothing: bool=False, keys: list[str]=None):
+    assert check_type(src, [DBConnector, str])
+    assert isinstance(df, pd.DataFrame)
+    assert isinstance(tblname, str)
+    assert update_columns is None or isinstance(update_columns, list)
+    assert isinstance(do_nothing, bool)
+    assert keys is None or isinstance(keys, list)
+    if isinstance(src, DBConnector):
+        src.upsert_from_df(df, tblname, update_columns=update_columns, do_nothing=do_nothing, set_sql=True, keys=keys)
+        src.execute_sql()
+    else:
+        assert re.search(r"^((25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?):([0-9]{1,5})$", src) is not None
+        dictwk = {
+            "data": to_str_timestamp(df).replace({float("nan"): None}).to_dict(),
+            "tblname": tblname, "update_columns": update_columns, "do_nothing": do_nothing, "keys": keys
+        }
+        res = requests.post(f"http://{src}/upsert", json=dictwk, headers={'Content-type': 'application/json'})
+        assert res.status_code == 200
+
 def exec(src: DBConnector | str, sql: str):
     assert check_type(src, [DBConnector, str])
     assert isinstance(sql, str)
@@ -1,14 +1,25 @@
-import psycopg2, re, datetime
+import psycopg2, re, datetime, io, os, tempfile, threading, contextlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import mysql.connector
 import pandas as pd
 import numpy as np
 import polars as pl
+import pyarrow as pa
 import pymongo
+try:
+    import psycopg # psycopg 3. It's optional and used by DBConnector(..., driver="psycopg").
+except ImportError:
+    psycopg = None
 
 # local package
 from kkpsgre.util.dataframe import drop_duplicate_columns, to_string_all_columns
 from kkpsgre.util.com import check_type_list, strfind, find_matching_words, is_valid_ipv4, parse_connection_string
-from kkpsgre.util.sql import escape_mysql_reserved_word, sql_to_mongo_filter
+from kkpsgre.util.sql import escape_mysql_reserved_word, sql_to_mongo_filter, create_range_conditions, create_minmax_sql, is_aggregate_select, sql_to_mongo_pipeline, convert_placeholders, get_select_table_name, split_sql_statements
+from kkpsgre.util.cache import QueryCache, normalize_sql, get_write_tables
+from kkpsgre.util.pgcopy import df_to_pgcopy, CopyStream, PGCOPY_TRAILER, PGCOPY_TYPES
+from kkpsgre.util.layout import LayoutStore, LazyLayout
+from kkpsgre.util.arrow import get_arrow_type_from_cursor, get_arrow_type_from_layout, arrow_types_to_polars, rows_to_arrow, read_psgre_csv, batched_docs_to_arrow
 from kklogger import set_logger
 LOGNAME = __name__
 
@@ -19,10 +30,16 @@ __all__ = [
 
 
 DBTYPES = ["psgre", "mysql", "mongo"]
+DRIVERS_PSGRE = ["psycopg2", "psycopg"]
 RESERVED_WORD_MYSQL = [
     "interval", "explain", "long", "short"
 ]
 RESERVED_WORD_PSGRE = []
+MAX_STATEMENT_BYTES_PSGRE = 2**25 # Default byte budget of one insert statement in PostgreSQL.
+MARGIN_PACKET_BYTES_MYSQL = 2**12 # Margin from max_allowed_packet for the packet header and the escape of reserved words.
+
+
+ERRORS_NO_RESULT = (psycopg2.ProgrammingError, mysql.connector.errors.InterfaceError) + ((psycopg.ProgrammingError, ) if psycopg is not None else ())
 
 
 class CustomSQLException(Exception):
@@ -41,6 +58,11 @@ class DBConnector:
             kwargs_db: dict={},
             is_read_layout: bool=True,
             use_polars: bool = False,
+            cache_max_bytes: int=None,
+            cache_ttl: float=None,
+            prepared_cache_size: int=None,
+            driver: str="psycopg2",
+            numeric_as_float: bool=False,
             **kwargs
         ):
         """
@@ -48,8 +70,26 @@ class DBConnector:
         Params::
             connection_string:
                 ex) host=172.18.10.2 port=5432 dbname=boatrace user=postgres password=postgres
+            cache_max_bytes:
+                If set, the results of select_sql are cached with LRU eviction within this memory budget [bytes].
+                The entries which read a table are invalidated when the table is written by this instance.
+            cache_ttl:
+                Time to live of each cached result [sec].
+            prepared_cache_size:
+                If set, the queries with params are executed as server-side prepared statements,
+                and this number of statements are kept per connection with LRU eviction.
+                PostgreSQL: PREPARE / EXECUTE / DEALLOCATE, MySQL: prepared cursor.
+                With driver="psycopg", psycopg 3 prepares the statements by itself and keeps this number of them.
+            driver:
+                PostgreSQL driver. "psycopg2" or "psycopg" ( psycopg 3, pip install "psycopg[binary]" ).
+                With "psycopg", the statements of execute_sql() and the queries of select_many() are sent in pipeline mode,
+                so a batch costs about one network round trip instead of one per statement.
+            numeric_as_float:
+                If True, NUMERIC / DECIMAL columns of select_sql are decoded as float64 ( polars: Float64 ).
+                If False, they are kept as Decimal ( pandas: object, polars: Decimal ), so no digits are lost.
         Note::
             If connection_string = None, empty update is enable.
+            select_copy always returns NUMERIC / DECIMAL columns as float64 because they are parsed from csv text.
         """
         assert host is None or isinstance(host, str)
         if host is not None:
@@ -69,6 +109,13 @@ class DBConnector:
         assert isinstance(max_disp_len, int)
         assert isinstance(is_read_layout, bool)
         assert isinstance(use_polars, bool)
+        assert cache_max_bytes is None or (isinstance(cache_max_bytes, int) and cache_max_bytes > 0)
+        assert cache_ttl is None or (isinstance(cache_ttl, (int, float)) and cache_ttl > 0)
+        assert prepared_cache_size is None or (isinstance(prepared_cache_size, int) and prepared_cache_size > 0)
+        assert isinstance(driver, str) and driver in DRIVERS_PSGRE
+        assert isinstance(numeric_as_float, bool)
+        if dbtype == "psgre" and driver == "psycopg" and psycopg is None:
+            raise ImportError('driver="psycopg" needs psycopg 3. pip install "psycopg[binary]"')
         self.dbinfo = {
             "host": host,
             "port": port,
@@ -76,8 +123,13 @@ class DBConnector:
             "user": user,
             "dbtype": dbtype,
         }
+        self.__password  = password
+        self.__kwargs_db = kwargs_db
         self.con = None
-        if   host is not None and dbtype == "psgre":
+        if   host is not None and dbtype == "psgre" and driver == "psycopg":
+            self.con = psycopg.connect(f"host={host} port={port} dbname={dbname} user={user} password={password}", **kwargs_db)
+            if prepared_cache_size is not None: self.con.prepared_max = prepared_cache_size
+        elif host is not None and dbtype == "psgre":
             self.con = psycopg2.connect(f"host={host} port={port} dbname={dbname} user={user} password={password}", **kwargs_db)
         elif host is not None and dbtype == "mysql":
             self.con = mysql.connector.connect(user=user, password=password, host=host, port=port, database=dbname, **kwargs_db)
@@ -86,41 +138,148 @@ class DBConnector:
         self.max_disp_len   = max_disp_len
         self.is_read_layout = is_read_layout
         self.use_polars     = use_polars
+        self.numeric_as_float = numeric_as_float
+        self.cache          = QueryCache(cache_max_bytes, ttl=cache_ttl) if cache_max_bytes is not None else None
+        self.prepared_size  = prepared_cache_size
+        self.prepared       = OrderedDict() # statement template: (name, keys) in PostgreSQL, (cursor, template, keys) in MySQL
+        self.prepared_count = 0
+        self.max_packet     = None # max_allowed_packet of MySQL. It's read when it's needed at first.
+        self.driver         = driver if dbtype == "psgre" else None
         self.logger         = set_logger(f"{LOGNAME}.{self.__class__.__name__}.{datetime.datetime.now().timestamp()}", **kwargs)
         if self.con is None:
             self.logger.info("dummy connection is established.")
         else:
             self.logger.info(f'connection is established. {self.dbinfo}')
-        self.sql_list = []
+        self.sql_list    = []
+        self.params_list = []
         self.initialize()
 
     def initialize(self):
         self.logger.info("START")
-        self.sql_list = [] # After setting a series of sql, we'll execute them all at once.(insert, update, delete)
-        if self.con is not None and self.is_read_layout:
-            if self.dbinfo["dbtype"] in ["psgre", "mysql"]:
-                df = self.read_table_layout()
-                self.db_layout      = {x: y.tolist() for x, y in df.groupby("tblname")["colname"]}
-                self.db_layout_type = {x: {a: b for a, b in y.values} for x, y in df.groupby("tblname")[["colname", "data_type"]]}
-                df = self.read_table_constraint()
-                self.db_constraint  = {x: y.tolist() for x, y in df.groupby("table_name")["column_name"]}
-            elif self.dbinfo["dbtype"] in ["mongo"]:
-                self.db_layout      = {x: self.select_sql(f"SELECT * FROM {x} LIMIT 1;", ret_polars=False).columns.tolist() for x in self.con.list_collection_names() if x.find("system") != 0}
-                self.db_layout_type = {}
-                self.db_constraint  = {x: None for x in self.con.list_collection_names() if x.find("system") != 0}
+        self.sql_list    = [] # After setting a series of sql, we'll execute them all at once.(insert, update, delete)
+        self.params_list = [] # Parameters of each sql in sql_list. None means the sql has no placeholder.
+        if self.cache is not None: self.cache.clear()
+        # The layout of each table is read on the first access of db_layout, db_layout_type or db_constraint.
+        self.set_layout_store(LayoutStore(), is_lazy=(self.con is not None and self.is_read_layout))
+        self.logger.info("END")
+
+    def set_layout_store(self, store: LayoutStore, is_lazy: bool=True):
+        """
+        Set db_layout, db_layout_type and db_constraint as the views of the store.
+        Params::
+            is_lazy:
+                If True, the table which is not in the store is loaded with this connection. ex) store shared by DBConnectorPool
+        """
+        assert isinstance(store, LayoutStore)
+        assert isinstance(is_lazy, bool)
+        self.layout_store   = store
+        self.db_layout      = LazyLayout(store, "layout",      connector=(self if is_lazy else None))
+        self.db_layout_type = LazyLayout(store, "layout_type", connector=(self if is_lazy else None))
+        self.db_constraint  = LazyLayout(store, "constraint",  connector=(self if is_lazy else None))
+
+    def set_table_layout(self, df_layout: pd.DataFrame, df_constraint: pd.DataFrame):
+        """ Set all tables of the layout store from the results of read_table_layout and read_table_constraint. """
+        self.layout_store.set_all(self.layout_rows_to_entries(
+            df_layout[["tblname", "colname", "data_type"]].values.tolist(), df_constraint[["table_name", "column_name"]].values.tolist()
+        ))
+
+    @classmethod
+    def layout_rows_to_entries(cls, rows_layout: list[tuple], rows_constraint: list[tuple]) -> dict[str, dict]:
+        """
+        Params::
+            rows_layout:     [(tblname, colname, data_type), ...] in order of the columns.
+            rows_constraint: [(table_name, ..., column_name), ...] of the primary keys.
+        Return::
+            {tblname: {"layout": [...], "layout_type": {...}, "constraint": [...]}}. See LayoutStore.
+        """
+        entries = {}
+        for tblname, colname, data_type in rows_layout:
+            entry = entries.setdefault(tblname, {"layout": [], "layout_type": {}})
+            entry["layout"].append(colname)
+            entry["layout_type"][colname] = data_type
+        for row in rows_constraint:
+            entries.setdefault(row[0], {}).setdefault("constraint", []).append(row[-1])
+        return entries
+
+    def is_in_transaction(self) -> bool:
+        if   self.dbinfo["dbtype"] == "psgre" and self.driver == "psycopg":
+            return self.con.info.transaction_status != psycopg.pq.TransactionStatus.IDLE
+        elif self.dbinfo["dbtype"] == "psgre":
+            return self.con.status != psycopg2.extensions.STATUS_READY
+        elif self.dbinfo["dbtype"] == "mysql":
+            return self.con.in_transaction
+        return False
+
+    def select_rows_metadata(self, sql: str) -> list[tuple]:
+        """
+        Read the metadata without the status check and the cache of select_sql,
+        so that the layout can be loaded between set_sql() and execute_sql(). If no transaction is open, it runs in autocommit.
+        """
+        is_transaction = self.is_in_transaction()
+        if not is_transaction: self.con.autocommit = True
+        cur = self.con.cursor()
+        try:
+            cur.execute(sql)
+            rows = [tuple(x) for x in cur.fetchall()]
+        finally:
+            cur.close()
+            if not is_transaction: self.con.autocommit = False
+        return rows
+
+    def load_table_layout(self, tblname: str) -> dict:
+        """ Read the layout and the primary keys of one table. It's called by db_layout, db_layout_type and db_constraint. """
+        assert isinstance(tblname, str)
+        if self.dbinfo["dbtype"] == "mongo":
+            if tblname.find("system") == 0 or len(self.con.list_collection_names(filter={"name": tblname})) == 0:
+                return {}
+            data = self.con.get_collection(tblname).find_one()
+            entry = {"layout": list(data.keys()) if data is not None else [], "constraint": None}
         else:
-            self.db_layout     = {}
-            self.db_constraint = {}
+            entry = self.layout_rows_to_entries(
+                self.select_rows_metadata(self.sql_table_layout(tblname=tblname)), self.select_rows_metadata(self.sql_table_constraint(tblname=tblname))
+            ).get(tblname, {})
+        self.logger.info(f"table: {tblname}, layout is loaded. {entry.get('layout')}")
+        return entry
+
+    def load_table_layout_all(self) -> dict[str, dict]:
+        """ Read the layout and the primary keys of all tables. It's called when db_layout, ... is iterated. """
+        self.logger.info("START")
+        if self.dbinfo["dbtype"] == "mongo":
+            entries = {x: self.load_table_layout(x) for x in self.con.list_collection_names() if x.find("system") != 0}
+        else:
+            entries = self.layout_rows_to_entries(self.select_rows_metadata(self.sql_table_layout()), self.select_rows_metadata(self.sql_table_constraint()))
+        self.logger.info("END")
+        return entries
+
+    def refresh(self, tblname: str=None):
+        """
+        Read the layout of the table again. If None, all tables are forgotten and they're read again on the next access.
+        """
+        self.logger.info("START")
+        assert tblname is None or isinstance(tblname, str)
+        self.layout_store.refresh(tblname)
+        if tblname is not None and self.con is not None:
+            self.layout_store.set(tblname, self.load_table_layout(tblname))
         self.logger.info("END")
     
     def __del__(self):
         if self.con is not None and self.is_closed() == False:
             if self.dbinfo["dbtype"] in ["psgre", "mysql"]:
+                self.clear_prepared()
                 self.con.close()
             elif self.dbinfo["dbtype"] in ["mongo"]:
                 self.con.client.close()
             self.logger.info("DB connection close successfully.")
     
+    def clone(self, is_read_layout: bool=False, **kwargs) -> "DBConnector":
+        """ Create a new connection which has the same connection information. """
+        return DBConnector(
+            self.dbinfo["host"], port=self.dbinfo["port"], dbname=self.dbinfo["dbname"], user=self.dbinfo["user"],
+            password=self.__password, dbtype=self.dbinfo["dbtype"], max_disp_len=self.max_disp_len,
+            kwargs_db=self.__kwargs_db, is_read_layout=is_read_layout, use_polars=self.use_polars,
+            driver=(self.driver if self.driver is not None else "psycopg2"), **({"numeric_as_float": self.numeric_as_float} | kwargs)
+        )
+
     def is_closed(self):
         boolwk = False
         if   self.dbinfo["dbtype"] == "psgre":
@@ -136,6 +295,16 @@ class DBConnector:
                 self.logger.raise_error("Something happens.", e)
         return boolwk
 
+    def cache_info(self) -> dict | None:
+        """ hits, misses, evictions and usage of the select cache. None if the cache is disabled. """
+        return self.cache.info() if self.cache is not None else None
+
+    def invalidate_cache(self, tblnames: list[str] | None=None):
+        """ If tblnames is None, all cached results are invalidated. """
+        if self.cache is not None:
+            n = self.cache.invalidate(tblnames)
+            if n > 0: self.logger.info(f"cache invalidated. tables: {tblnames}, n_entries: {n}")
+
     def raise_error(self, msg: str, exception: Exception = Exception):
         """ Implement your own to break the connection. """
         self.__del__()
@@ -164,81 +333,213 @@ class DBConnector:
         elif dbtype == "mysql":
             return [x[0] for x in description]
     
-    def select_sql(self, sql: str, ret_polars: bool=None) -> pd.DataFrame | pl.DataFrame:
-        self.logger.info("START")
+    def check_select_sql(self, sql: str) -> str:
         assert isinstance(sql, str)
-        assert ret_polars is None or isinstance(ret_polars, bool)
-        self.check_status(["open","lock"])
-        df  = pd.DataFrame()
         sql = sql.strip()
-        ret_polars = self.use_polars if ret_polars is None else ret_polars
         if self.dbinfo["dbtype"] == "mysql":
             sql = escape_mysql_reserved_word(sql, RESERVED_WORD_MYSQL)
         if not re.match(r"^\s*(WITH|SELECT)\s+", sql, flags=re.IGNORECASE | re.DOTALL):
             self.raise_error(f"sql: {self.display_sql(sql)} must start with 'WITH' or 'SELECT' and end with exactly one ';'", exception=CustomSQLException)
         self.logger.debug(f"SQL: {self.display_sql(sql)}")
-        if self.dbinfo["dbtype"] in ["mongo"]:
-            i_str, j_str = find_matching_words(sql, "select ", " from ", is_case_inensitive=True)
-            assert i_str >= 0 and j_str >= 0
-            str_select = sql[i_str:j_str].strip()
-            if str_select == "*": str_select = None
-            else: str_select = [x.strip() for x in str_select.split(",")]
-            i_str, j_str = find_matching_words(sql, " from ", [" where ", " group by ", " having ", " limit ", ";"], is_case_inensitive=True)
-            assert i_str >= 0
-            str_from = sql[i_str:].strip() if j_str < 0 else sql[i_str:j_str].strip()
-            i_str, j_str = find_matching_words(sql, " where ", [" group by ", " having ", " limit ", ";"], is_case_inensitive=True)
-            if i_str >= 0:
-                sql_where_clause = sql[i_str:j_str].strip() if j_str >= 0 else sql[i_str:].strip()
-                mongo_filter     = sql_to_mongo_filter(sql_where_clause)
+        return sql
+
+    def parse_select_sql_mongo(self, sql: str) -> (str, list[str] | None, dict | None, int | None):
+        """
+        Split "SELECT ... FROM ... WHERE ... LIMIT ...;" into the arguments of pymongo's find().
+        Return::
+            (collection name, projection, filter, limit)
+        """
+        i_str, j_str = find_matching_words(sql, "select ", " from ", is_case_inensitive=True)
+        assert i_str >= 0 and j_str >= 0
+        str_select = sql[i_str:j_str].strip()
+        if str_select == "*": str_select = None
+        else: str_select = [x.strip() for x in str_select.split(",")]
+        i_str, j_str = find_matching_words(sql, " from ", [" where ", " group by ", " having ", " limit ", ";"], is_case_inensitive=True)
+        assert i_str >= 0
+        str_from = sql[i_str:].strip() if j_str < 0 else sql[i_str:j_str].strip()
+        i_str, j_str = find_matching_words(sql, " where ", [" group by ", " having ", " limit ", ";"], is_case_inensitive=True)
+        if i_str >= 0:
+            sql_where_clause = sql[i_str:j_str].strip() if j_str >= 0 else sql[i_str:].strip()
+            mongo_filter     = sql_to_mongo_filter(sql_where_clause)
+        else:
+            mongo_filter = None
+        i_str, j_str = find_matching_words(sql, " limit ", [";"], is_case_inensitive=True)
+        if i_str >= 0:
+            sql_limit_clause = sql[i_str:j_str].strip() if j_str >= 0 else sql[i_str:].strip()
+            sql_limit_clause = int(sql_limit_clause)
+        else:
+            sql_limit_clause = None
+        self.logger.info(f"table name: {str_from}, filter: {mongo_filter}, projection: {str_select}, limit: {sql_limit_clause}")
+        return str_from, str_select, mongo_filter, sql_limit_clause
+
+    def parse_aggregate_sql_mongo(self, sql: str) -> tuple[str, list[dict], list[str]] | None:
+        """
+        If the sql has GROUP BY, aggregate functions or DISTINCT, convert it to the aggregation pipeline.
+        Return::
+            (collection name, pipeline, output column names) or None if the sql is not an aggregate query.
+        """
+        i_str, j_str = find_matching_words(sql, "select ", " from ", is_case_inensitive=True)
+        assert i_str >= 0 and j_str >= 0
+        str_select = sql[i_str:j_str].strip()
+        i_str, j_str = find_matching_words(sql, " group by ", [" having ", " limit ", ";"], is_case_inensitive=True)
+        str_group    = (sql[i_str:j_str].strip() if j_str >= 0 else sql[i_str:].strip()) if i_str >= 0 else None
+        if not is_aggregate_select(str_select, str_group=str_group):
+            return None
+        i_str, j_str = find_matching_words(sql, " having ", [" limit ", ";"], is_case_inensitive=True)
+        str_having   = (sql[i_str:j_str].strip() if j_str >= 0 else sql[i_str:].strip()) if i_str >= 0 else None
+        i_str, j_str = find_matching_words(sql, " from ", [" where ", " group by ", " having ", " limit ", ";"], is_case_inensitive=True)
+        assert i_str >= 0
+        str_from     = sql[i_str:].strip() if j_str < 0 else sql[i_str:j_str].strip()
+        i_str, j_str = find_matching_words(sql, " where ", [" group by ", " having ", " limit ", ";"], is_case_inensitive=True)
+        mongo_filter = sql_to_mongo_filter(sql[i_str:j_str].strip() if j_str >= 0 else sql[i_str:].strip()) if i_str >= 0 else None
+        i_str, j_str = find_matching_words(sql, " limit ", [";"], is_case_inensitive=True)
+        sql_limit_clause = int(sql[i_str:j_str].strip() if j_str >= 0 else sql[i_str:].strip()) if i_str >= 0 else None
+        try:
+            pipeline, columns = sql_to_mongo_pipeline(str_select, mongo_filter=mongo_filter, str_group=str_group, str_having=str_having, limit=sql_limit_clause)
+        except ValueError as e:
+            self.raise_error(f"sql: {self.display_sql(sql)} cannot be converted to aggregation pipeline. {e}", exception=CustomSQLException)
+        self.logger.info(f"table name: {str_from}, pipeline: {pipeline}")
+        return str_from, pipeline, columns
+
+    def open_cursor_mongo(self, sql: str, is_raw: bool=False, batch_size: int=None, db=None):
+        """
+        Open find() cursor, or aggregate() cursor with allowDiskUse=True for GROUP BY / aggregate / DISTINCT queries.
+        Params::
+            is_raw:
+                If True, find_raw_batches() or aggregate_raw_batches() is used.
+            db:
+                Database object which has get_collection(). If None, self.con. ex) motor's database
+        Return::
+            (cursor, collection name, projection or output column names, is_aggregate)
+        """
+        assert isinstance(is_raw, bool)
+        assert batch_size is None or (isinstance(batch_size, int) and batch_size > 0)
+        db     = self.con if db is None else db
+        parsed = self.parse_aggregate_sql_mongo(sql)
+        if parsed is not None:
+            str_from, pipeline, columns = parsed
+            kwargs = {"allowDiskUse": True} if batch_size is None else {"allowDiskUse": True, "batchSize": batch_size}
+            collection = db.get_collection(str_from)
+            cursor     = collection.aggregate_raw_batches(pipeline, **kwargs) if is_raw else collection.aggregate(pipeline, **kwargs)
+            return cursor, str_from, columns, True
+        str_from, str_select, mongo_filter, sql_limit_clause = self.parse_select_sql_mongo(sql)
+        collection = db.get_collection(str_from)
+        cursor     = collection.find_raw_batches(filter=mongo_filter, projection=str_select) if is_raw else collection.find(filter=mongo_filter, projection=str_select)
+        if sql_limit_clause is not None: cursor = cursor.limit(sql_limit_clause)
+        if batch_size is not None: cursor = cursor.batch_size(batch_size)
+        return cursor, str_from, str_select, False
+
+    def docs_to_df(self, data: list[dict], str_from: str, str_select: list[str] | None, ret_polars: bool) -> pd.DataFrame | pl.DataFrame:
+        if len(data) == 0:
+            if str_select is not None:
+                columns = str_select
+            elif hasattr(self, "db_layout") and str_from in self.db_layout:
+                columns = self.db_layout[str_from]
             else:
-                mongo_filter = None
-            i_str, j_str = find_matching_words(sql, " limit ", [";"], is_case_inensitive=True)
-            if i_str >= 0:
-                sql_limit_clause = sql[i_str:j_str].strip() if j_str >= 0 else sql[i_str:].strip()
-                sql_limit_clause = int(sql_limit_clause)
+                columns = []
+            if ret_polars:
+                df = pl.DataFrame([], schema=columns)
             else:
-                sql_limit_clause = None
-            self.logger.info(f"table name: {str_from}, filter: {mongo_filter}, projection: {str_select}, limit: {sql_limit_clause}")
-            if sql_limit_clause is not None:
-                cursor = self.con.get_collection(str_from).find(filter=mongo_filter, projection=str_select).limit(sql_limit_clause)
+                df = pd.DataFrame(columns=columns)
+        else:
+            if ret_polars:
+                df = pl.DataFrame(data, strict=False)
             else:
-                cursor = self.con.get_collection(str_from).find(filter=mongo_filter, projection=str_select)
-            data = list(cursor)
-            if len(data) == 0:
-                if str_select is not None:
-                    columns = str_select
-                elif hasattr(self, "db_layout") and str_from in self.db_layout:
-                    columns = self.db_layout[str_from]
-                else:
-                    columns = []
-                if ret_polars:
-                    df = pl.DataFrame([], schema=columns)
-                else:
-                    df = pd.DataFrame(columns=columns)
+                df = pd.DataFrame(data)
+        return df
+
+    def cursor_to_df_mongo(
+        self, data, str_from: str, str_select: list[str] | None, is_aggregate: bool, ret_polars: bool, use_arrow: bool
+    ) -> pd.DataFrame | pl.DataFrame:
+        """
+        Params::
+            data:
+                use_arrow=True: iterable of raw BSON batches. use_arrow=False: list of documents.
+        """
+        if use_arrow:
+            if is_aggregate:
+                colnames = str_select
+            elif str_select is not None:
+                colnames = ["_id"] + [x for x in str_select if x != "_id"]
+            elif hasattr(self, "db_layout") and str_from in self.db_layout:
+                colnames = self.db_layout[str_from]
             else:
-                if ret_polars:
-                    df = pl.DataFrame(data, strict=False)
-                else:
-                    df = pd.DataFrame(data)
-        elif self.dbinfo["dbtype"] in ["psgre", "mysql"] and self.con is not None:
-            self.con.autocommit = True # Autocommit ON because even references are locked in principle.
-            cur = self.con.cursor()
-            cur.execute(sql)
-            rows     = cur.fetchall()
-            colnames = self.get_colname_from_cursor(cur.description, self.dbinfo["dbtype"])
-            if ret_polars:
-                if len(rows) == 0:
-                    df = pl.DataFrame([], schema=colnames)
-                else:
+                colnames = None
+            table = batched_docs_to_arrow(data, colnames=colnames)
+            df    = pl.from_arrow(table) if ret_polars else table.to_pandas(coerce_temporal_nanoseconds=True)
+        else:
+            df = self.docs_to_df(data, str_from, str_select, ret_polars)
+        if is_aggregate and len(set(str_select) - set(df.columns)) == 0:
+            df = df[str_select] # The order of fields in the result of aggregation is not always same as the select list.
+        return df
+
+    def get_decode_schema(self, description, sql: str=None, numeric_as_float: bool=None) -> (list[str], list, dict):
+        """
+        Build the target schema of the result once from cursor.description and db_layout_type, and cache it in the layout store.
+        It's dropped with the layout of the table by refresh(), so the connections which share the store don't keep the old types.
+        The types which cannot be decided by the cursor ( ex. MySQL TEXT is BLOB ) are taken from the layout of the table in "FROM".
+        Params::
+            numeric_as_float:
+                If None, self.numeric_as_float is used.
+        Return::
+            (colnames, arrow types, polars schema_overrides)
+        """
+        colnames = self.get_colname_from_cursor(description, self.dbinfo["dbtype"])
+        tblname  = get_select_table_name(sql) if sql is not None else None
+        numeric_as_float = self.numeric_as_float if numeric_as_float is None else numeric_as_float
+        key      = (tblname, tuple((x[0], x[1]) for x in description), numeric_as_float) # The store may be shared by the connections with the other setting.
+        decode_schema = self.layout_store.decode_schema # If it's refreshed while building, the result is put into the old one and discarded.
+        if key not in decode_schema:
+            types = get_arrow_type_from_cursor(description, self.dbinfo["dbtype"], numeric_as_float=numeric_as_float)
+            if tblname is not None and tblname in self.db_layout_type:
+                types = get_arrow_type_from_layout(colnames, self.db_layout_type[tblname], types=types, numeric_as_float=numeric_as_float)
+            decode_schema[key] = (colnames, types, arrow_types_to_polars(colnames, types))
+        return decode_schema[key]
+
+    def rows_to_df(self, rows: list[tuple], description, ret_polars: bool, sql: str=None) -> pd.DataFrame | pl.DataFrame:
+        """
+        Decode rows with the schema of get_decode_schema, so that polars doesn't scan all rows to infer the types.
+        pandas: NUMERIC ( Decimal ) columns are converted to float64 by one astype only if numeric_as_float=True.
+        """
+        colnames, types, schema = self.get_decode_schema(description, sql=sql)
+        if ret_polars:
+            if len(rows) == 0:
+                df = pl.DataFrame([], schema=colnames, schema_overrides=schema)
+            else:
+                try:
+                    df = pl.DataFrame(rows, schema=colnames, schema_overrides=schema, orient="row", infer_schema_length=None)
+                except (pl.exceptions.PolarsError, TypeError, OverflowError) as e:
+                    self.logger.warning(f"rows cannot be decoded with the schema. types are inferred. {e}")
                     df = pl.DataFrame(rows, schema=colnames, orient="row", infer_schema_length=None)
+        else:
+            if len(rows) == 0:
+                df = pd.DataFrame(columns=colnames)
             else:
-                if len(rows) == 0:
-                    df = pd.DataFrame(columns=colnames)
-                else:
-                    df = pd.DataFrame(rows, columns=colnames)
-                df = drop_duplicate_columns(df)
-            cur.close()
-            self.con.autocommit = False
+                df = pd.DataFrame(rows, columns=colnames)
+            df = drop_duplicate_columns(df)
+            dtypes = {x: y for x, y in zip(colnames, types) if y is not None and pa.types.is_floating(y)}
+            dtypes = {x: np.float64 for x in df.columns[df.dtypes == object] if x in dtypes}
+            if len(dtypes) > 0 and df.shape[0] > 0:
+                df = df.astype(dtypes)
+        return df
+
+    def rows_to_df_arrow(self, rows: list[tuple], description, ret_polars: bool, sql: str=None) -> pd.DataFrame | pl.DataFrame:
+        """
+        Decode rows column by column into arrow buffers typed by get_decode_schema, then wrap them without copying.
+        pandas result has ArrowDtype columns and datetime columns are converted to UTC.
+        """
+        colnames, types, _ = self.get_decode_schema(description, sql=sql)
+        table    = rows_to_arrow(rows, colnames, types)
+        if ret_polars:
+            df = pl.from_arrow(table)
+        else:
+            df = table.to_pandas(types_mapper=pd.ArrowDtype)
+            df = drop_duplicate_columns(df)
+        return df
+
+    def postprocess_df(self, df: pd.DataFrame | pl.DataFrame, ret_polars: bool) -> pd.DataFrame | pl.DataFrame:
+        """ The conversions of all columns are collected and applied at once. """
+        exprs = []
         for x in df.columns:
             if ret_polars:
                 if self.dbinfo["dbtype"] in ["mysql", "mongo"]:
@@ -257,36 +558,391 @@ class DBConnector:
                     │ 2   ┆ 2023-05-05 16:30:00 ┆ null                ┆ 100        ┆ … ┆ foo's bar    ┆ false       ┆ null          ┆ B               │
                     └─────┴─────────────────────┴─────────────────────┴────────────┴───┴──────────────┴─────────────┴───────────────┴─────────────────┘
                     """
-                    if df.schema[x] == pl.Datetime:
-                        df = df.with_columns(df[x].dt.convert_time_zone("UTC"))
+                    if df.schema[x] == pl.Datetime and df.schema[x].time_zone != "UTC":
+                        exprs.append(pl.col(x).dt.convert_time_zone("UTC"))
                 if df.schema[x] == pl.String:
-                    df = df.with_columns(pl.col(x).str.replace(r"\\n", "\n", n=-1).str.replace(r"\\\\", "\\", n=-1))
+                    exprs.append(pl.col(x).str.replace(r"\\n", "\n", n=-1).str.replace(r"\\\\", "\\", n=-1))
             else:
                 if self.dbinfo["dbtype"] in ["mysql", "mongo"]:
-                    if pd.api.types.is_datetime64_any_dtype(df[x]):
-                        df[x] = df[x].dt.tz_localize("UTC")
+                    if pd.api.types.is_datetime64_any_dtype(df[x]) and df[x].dt.tz is None:
+                        exprs.append(x)
+        if len(exprs) > 0:
+            if ret_polars:
+                df = df.with_columns(exprs)
+            else:
+                df = df.assign(**{x: df[x].dt.tz_localize("UTC") for x in exprs})
+        return df
+
+    def execute_params(self, cur, sql: str, params: tuple | list | dict):
+        """
+        Execute the sql with the parameters.
+        If prepared_cache_size is set, the statement template is prepared on the server once and reused.
+        Note::
+            psycopg2 ( PostgreSQL ) doesn't bind on the server. The parameters are escaped and interpolated into the sql on the client,
+            and it's also true of "EXECUTE name (%s, ...)" of the prepared statement. Only the plan of the statement is reused.
+            psycopg 3 and the prepared cursor of MySQL send the parameters separately from the statement.
+        Return::
+            cursor which has the result. In MySQL, it's the cached prepared cursor, so don't close it.
+        """
+        assert isinstance(params, (tuple, list, dict))
+        if self.driver == "psycopg":
+            cur.execute(sql, params, prepare=(True if self.prepared_size is not None else None)) # psycopg 3 manages the prepared statements.
+            return cur
+        if self.prepared_size is None:
+            cur.execute(sql, params)
+            return cur
+        if sql in self.prepared:
+            self.prepared.move_to_end(sql)
+        else:
+            if self.dbinfo["dbtype"] == "psgre":
+                self.prepared_count += 1
+                name = f"kkpsgre_stmt_{self.prepared_count}"
+                sqlwk, keys = convert_placeholders(sql, "numeric")
+                cur.execute(f"PREPARE {name} AS {sqlwk}")
+                self.prepared[sql] = (name, keys)
+            else:
+                sqlwk, keys = convert_placeholders(sql, "qmark")
+                self.prepared[sql] = (self.con.cursor(prepared=True), sqlwk, keys)
+            self.logger.debug(f"prepared statement is created. n_prepared: {len(self.prepared)}")
+            while len(self.prepared) > self.prepared_size:
+                _, value = self.prepared.popitem(last=False)
+                if self.dbinfo["dbtype"] == "psgre":
+                    cur.execute(f"DEALLOCATE {value[0]}")
+                else:
+                    self.close_prepared_cursor(value[0])
+        if self.dbinfo["dbtype"] == "psgre":
+            name, keys = self.prepared[sql]
+            values = [params[x] for x in keys]
+            cur.execute(f"EXECUTE {name}" + (f" ({', '.join(['%s'] * len(values))})" if len(values) > 0 else ""), values)
+            return cur
+        else:
+            curp, sqlwk, keys = self.prepared[sql]
+            curp.execute(sqlwk, tuple(params[x] for x in keys)) # The same str object must be given to reuse the prepared statement.
+            return curp
+
+    def close_prepared_cursor(self, cur):
+        """ Close the prepared cursor of MySQL. The result which is not read is discarded so that close() doesn't fail. """
+        try:
+            if self.con.unread_result: self.con.consume_results()
+            cur.close()
+        except Exception as e:
+            self.logger.warning(f"prepared cursor cannot be closed. {e}")
+
+    def clear_prepared(self):
+        """ Forget all prepared statements. In MySQL, the prepared cursors are closed. """
+        if self.dbinfo["dbtype"] == "mysql":
+            for value in self.prepared.values(): self.close_prepared_cursor(value[0])
+        self.prepared = OrderedDict()
+
+    def rollback(self):
+        """
+        Roll back the transaction. In PostgreSQL with psycopg2, the prepared statements which don't exist on the server after that
+        are dropped from the cache, so that the next EXECUTE prepares them again.
+        """
+        self.con.rollback()
+        if self.dbinfo["dbtype"] == "psgre" and self.driver != "psycopg" and len(self.prepared) > 0:
+            try:
+                cur = self.con.cursor()
+                cur.execute("SELECT name FROM pg_prepared_statements;")
+                names = set([x[0] for x in cur.fetchall()])
+                cur.close()
+                self.con.rollback()
+                self.prepared = OrderedDict([(x, y) for x, y in self.prepared.items() if y[0] in names])
+            except Exception as e:
+                self.logger.warning(f"prepared statements cannot be checked, so all of them are forgotten. {e}")
+                self.prepared = OrderedDict()
+
+    def select_sql(self, sql: str, ret_polars: bool=None, use_arrow: bool=False, params: tuple | list | dict=None) -> pd.DataFrame | pl.DataFrame:
+        """
+        Params::
+            sql:
+                "SELECT ..." or "WITH ..." query.
+            ret_polars:
+                If None, follow use_polars of the instance.
+            use_arrow:
+                If True, the fetched rows are decoded into arrow columns with the types from cursor.description.
+                It avoids the row-wise type inference of polars and the per-value object boxing of pandas.
+                In MongoDB, the documents are read from find_raw_batches() and converted to arrow batch by batch, so only one batch
+                of python dict is alive at a time. The values are still decoded one by one, so it saves memory rather than decoding time.
+                ObjectId is converted to string.
+            params:
+                Parameters bound by the driver. The placeholders are %s or %(name)s. This is only for PostgreSQL and MySQL.
+                ex) select_sql("SELECT * FROM test_table WHERE id = %(id)s;", params={"id": 1})
+        """
+        self.logger.info("START")
+        assert isinstance(sql, str)
+        assert ret_polars is None or isinstance(ret_polars, bool)
+        assert isinstance(use_arrow, bool)
+        assert params is None or isinstance(params, (tuple, list, dict))
+        self.check_status(["open","lock"])
+        df  = pd.DataFrame()
+        ret_polars = self.use_polars if ret_polars is None else ret_polars
+        sql = self.check_select_sql(sql)
+        if self.cache is not None:
+            cache_key = (normalize_sql(sql), repr(params), ret_polars, use_arrow)
+            df = self.cache.get(cache_key)
+            if df is not None:
+                self.logger.info("END (cache hit)")
+                return df if ret_polars else df.copy()
+        if self.dbinfo["dbtype"] in ["mongo"]:
+            if params is not None:
+                self.raise_error("params is only for PostgreSQL and MySQL", exception=CustomSQLException)
+            cursor, str_from, str_select, is_aggregate = self.open_cursor_mongo(sql, is_raw=use_arrow)
+            df = self.cursor_to_df_mongo(cursor if use_arrow else list(cursor), str_from, str_select, is_aggregate, ret_polars, use_arrow)
+        elif self.dbinfo["dbtype"] in ["psgre", "mysql"] and self.con is not None:
+            self.con.autocommit = True # Autocommit ON because even references are locked in principle.
+            cur = self.con.cursor()
+            if params is None:
+                cur.execute(sql)
+                cur_ret = cur
+            else:
+                cur_ret = self.execute_params(cur, sql, params)
+            rows     = cur_ret.fetchall()
+            if use_arrow:
+                df = self.rows_to_df_arrow(rows, cur_ret.description, ret_polars, sql=sql)
+            else:
+                df = self.rows_to_df(rows, cur_ret.description, ret_polars, sql=sql)
+            cur.close()
+            self.con.autocommit = False
+        df = self.postprocess_df(df, ret_polars)
+        if self.cache is not None:
+            self.cache.set(cache_key, sql, df if ret_polars else df.copy())
         self.logger.info("END")
         return df
 
-    def set_sql(self, sql: list[str]):
+    def select_iter(self, sql: str, chunksize: int=100000, ret_polars: bool=None, use_arrow: bool=False):
+        """
+        Generator version of select_sql. The result is fetched chunk by chunk so that peak memory is bounded by chunksize.
+        Params::
+            sql:
+                "SELECT ..." or "WITH ..." query.
+            chunksize:
+                Number of rows in each yielded dataframe.
+                PostgreSQL: server-side (named) cursor, MySQL: unbuffered cursor, MongoDB: cursor with batch_size.
+            use_arrow:
+                Same as select_sql.
+        Usage::
+            >>> for df in DB.select_iter("SELECT * FROM test_table;", chunksize=10000):
+            ...     print(df.shape)
+        Note::
+            Don't run other queries with the same connection until the generator is exhausted or closed.
+            If the result is empty, an empty dataframe which has only columns is yielded once.
+        """
+        self.logger.info("START")
+        assert isinstance(sql, str)
+        assert isinstance(chunksize, int) and chunksize > 0
+        assert ret_polars is None or isinstance(ret_polars, bool)
+        assert isinstance(use_arrow, bool)
+        self.check_status(["open","lock"])
+        ret_polars = self.use_polars if ret_polars is None else ret_polars
+        sql = self.check_select_sql(sql)
+        is_yield = False
+        if get_select_table_name(sql) is not None:
+            self.db_layout_type.get(get_select_table_name(sql)) # The layout is loaded before the cursor is opened, because another query cannot run while fetching.
+        if self.dbinfo["dbtype"] in ["mongo"]:
+            cursor, str_from, str_select, _ = self.open_cursor_mongo(sql, batch_size=chunksize)
+            try:
+                data = []
+                for x in cursor:
+                    data.append(x)
+                    if len(data) >= chunksize:
+                        is_yield = True
+                        yield self.postprocess_df(self.docs_to_df(data, str_from, str_select, ret_polars), ret_polars)
+                        data = []
+                if len(data) > 0 or is_yield == False:
+                    yield self.postprocess_df(self.docs_to_df(data, str_from, str_select, ret_polars), ret_polars)
+            finally:
+                cursor.close()
+        elif self.dbinfo["dbtype"] in ["psgre", "mysql"] and self.con is not None:
+            if self.dbinfo["dbtype"] == "psgre":
+                # A named cursor is only valid inside a transaction.
+                self.con.autocommit = False
+                cur = self.con.cursor(name=f"select_iter_{id(self)}_{datetime.datetime.now().timestamp()}".replace(".", "_"))
+                cur.itersize = chunksize
+            else:
+                self.con.autocommit = True
+                cur = self.con.cursor(buffered=False)
+            try:
+                cur.execute(sql)
+                while True:
+                    rows = cur.fetchmany(chunksize)
+                    if len(rows) == 0 and is_yield: break
+                    # description of named cursor is set after the first fetch.
+                    if use_arrow:
+                        df = self.rows_to_df_arrow(rows, cur.description, ret_polars, sql=sql)
+                    else:
+                        df = self.rows_to_df(rows, cur.description, ret_polars, sql=sql)
+                    is_yield = True
+                    yield self.postprocess_df(df, ret_polars)
+                    if len(rows) < chunksize: break
+            finally:
+                if self.dbinfo["dbtype"] == "mysql" and self.con.unread_result:
+                    self.con.consume_results()
+                cur.close()
+                if self.dbinfo["dbtype"] == "psgre":
+                    self.con.rollback() # Only for closing the transaction which is opened by the named cursor.
+                self.con.autocommit = False
+        self.logger.info("END")
+
+    def select_sql_parallel(
+        self, sql: str, partition_col: str, n_partitions: int=4, n_workers: int=None, ret_polars: bool=None, use_arrow: bool=False,
+        vmin: object=None, vmax: object=None
+    ) -> pd.DataFrame | pl.DataFrame:
+        """
+        Split the query into disjoint ranges of partition_col and run them concurrently on separate connections.
+        Params::
+            sql:
+                "SELECT ..." or "WITH ..." query. partition_col must be in the result columns.
+            partition_col:
+                integer, float or datetime column. ex) unixtime
+            n_partitions:
+                Number of ranges. [min, max] of partition_col is split into equal width.
+            n_workers:
+                Number of connections used at the same time. If None, n_workers = n_partitions.
+                Each worker opens one connection and runs its partitions on it.
+            vmin, vmax:
+                Range of partition_col. If None, they're selected from the database.
+                If the sql is a simple single-table query, MIN and MAX are selected from the table directly. Otherwise, the sql runs in a sub query.
+                The rows out of [vmin, vmax] are not returned except NULL.
+        Usage::
+            >>> DB.select_sql_parallel("SELECT * FROM test_table WHERE unixtime >= 1700000000", "unixtime", n_partitions=8, n_workers=4)
+        Note::
+            The results are concatenated in order of the ranges. ORDER BY in the sql is valid only in each range.
+        """
+        self.logger.info("START")
+        assert isinstance(sql, str)
+        assert isinstance(partition_col, str)
+        assert isinstance(n_partitions, int) and n_partitions >= 1
+        assert n_workers is None or (isinstance(n_workers, int) and n_workers >= 1)
+        assert ret_polars is None or isinstance(ret_polars, bool)
+        if self.dbinfo["dbtype"] not in ["psgre", "mysql"]:
+            self.raise_error("parallel select is only for PostgreSQL and MySQL", exception=CustomSQLException)
+        self.check_status(["open","lock"])
+        ret_polars = self.use_polars if ret_polars is None else ret_polars
+        n_workers  = n_partitions if n_workers is None else n_workers
+        assert (vmin is None) == (vmax is None)
+        sql = self.check_select_sql(sql)
+        sql = re.sub(r";\s*$", "", sql)
+        if vmin is None:
+            sqlwk = create_minmax_sql(sql, partition_col)
+            sqlwk = f"SELECT MIN({partition_col}) AS vmin, MAX({partition_col}) AS vmax FROM ({sql}) AS __part;" if sqlwk is None else sqlwk
+            df    = self.select_sql(sqlwk, ret_polars=False)
+            vmin, vmax = df["vmin"].iloc[0], df["vmax"].iloc[0]
+        if vmin is None or pd.isna(vmin):
+            self.logger.info("END")
+            return self.select_sql(sql + ";", ret_polars=ret_polars, use_arrow=use_arrow)
+        sqls = [f"SELECT * FROM ({sql}) AS __part WHERE {x};" for x in create_range_conditions(partition_col, vmin, vmax, n_partitions, dbtype=self.dbinfo["dbtype"])]
+        self.logger.info(f"partition column: {partition_col}, min: {vmin}, max: {vmax}, n_partitions: {len(sqls)}, n_workers: {n_workers}")
+        local, list_db = threading.local(), []
+        def __work(sqlwk: str):
+            if getattr(local, "DB", None) is None:
+                local.DB = self.clone(is_read_layout=False) # One connection per worker thread. It's reused for the next partitions.
+                list_db.append(local.DB)
+            return local.DB.select_sql(sqlwk, ret_polars=ret_polars, use_arrow=use_arrow)
+        try:
+            with ThreadPoolExecutor(max_workers=min(n_workers, len(sqls))) as executor:
+                list_df = list(executor.map(__work, sqls))
+        finally:
+            for DB in list_db: DB.__del__()
+        if ret_polars:
+            df = pl.concat(list_df, how="vertical_relaxed")
+        else:
+            df = pd.concat(list_df, axis=0, ignore_index=True, sort=False)
+        self.logger.info("END")
+        return df
+
+    def select_copy(self, sql: str, ret_polars: bool=None) -> pd.DataFrame | pl.DataFrame:
+        """
+        Bulk export version of select_sql for PostgreSQL.
+        The query is wrapped in "COPY ( ... ) TO STDOUT WITH (FORMAT csv)" and the bytes are parsed by multithreaded pyarrow CSV reader,
+        so it skips the row protocol and the per-value typecasting of psycopg2. It's much faster for large analytical extracts.
+        Params::
+            sql:
+                "SELECT ..." or "WITH ..." query.
+            ret_polars:
+                If None, follow use_polars of the instance.
+        Note::
+            The column types are taken from cursor.description of "SELECT * FROM ( ... ) LIMIT 0".
+            The timezone of datetime is same as select_sql. pandas: session TimeZone, polars: UTC.
+        """
+        self.logger.info("START")
+        assert isinstance(sql, str)
+        assert ret_polars is None or isinstance(ret_polars, bool)
+        if self.dbinfo["dbtype"] not in ["psgre"]:
+            self.raise_error("COPY command is only for PostgreSQL", exception=CustomSQLException)
+        self.check_status(["open","lock"])
+        ret_polars = self.use_polars if ret_polars is None else ret_polars
+        sql = self.check_select_sql(sql)
+        sql = re.sub(r";\s*$", "", sql)
+        df  = pd.DataFrame()
+        if self.con is not None:
+            self.con.autocommit = True
+            cur = self.con.cursor()
+            try:
+                cur.execute(f"SELECT * FROM ({sql}) AS __copy LIMIT 0;")
+                colnames, types, _ = self.get_decode_schema(cur.description, sql=sql, numeric_as_float=True) # csv text has no Decimal.
+                cur.execute("SHOW TimeZone;")
+                timezone = cur.fetchone()[0]
+                buffer   = io.BytesIO()
+                self.copy_expert(cur, f"COPY ({sql}) TO STDOUT WITH (FORMAT csv)", buffer)
+            finally:
+                cur.close()
+                self.con.autocommit = False
+            self.logger.info(f"finish to copy to stdout. size: {len(buffer.getbuffer())} bytes")
+            table = read_psgre_csv(buffer, colnames, types)
+            if ret_polars:
+                df = pl.from_arrow(table)
+            else:
+                df = table.to_pandas(coerce_temporal_nanoseconds=True) # Same datetime64[ns] as select_sql.
+                df = drop_duplicate_columns(df)
+                for x in df.columns:
+                    if isinstance(df[x].dtype, pd.DatetimeTZDtype):
+                        df[x] = df[x].dt.tz_convert(timezone)
+        df = self.postprocess_df(df, ret_polars)
+        self.logger.info("END")
+        return df
+
+    def set_sql(self, sql: list[str], params: tuple | list | dict | list[tuple | list | dict]=None):
+        """
+        Params::
+            params:
+                Parameters bound by the driver. If sql is list, params must be list which has the same length.
+                ex) set_sql("DELETE FROM test_table WHERE id = %s;", params=(1, ))
+                ex) set_sql(["DELETE FROM test_table WHERE id = %s;", "DELETE FROM test_table;"], params=[(1, ), None])
+        """
         self.logger.info("START")
         assert isinstance(sql, str) or isinstance(sql, list)
         assert self.dbinfo["dbtype"] in ["psgre", "mysql"]
-        if isinstance(sql, str): sql = [sql, ]
-        for x in sql:
+        if isinstance(sql, str):
+            sql    = [sql, ]
+            params = [params, ]
+        elif params is None:
+            params = [None] * len(sql)
+        assert isinstance(params, list) and len(params) == len(sql)
+        for x, y in zip(sql, params):
+            assert y is None or isinstance(y, (tuple, list, dict))
             if strfind(r"^select", x, flags=re.IGNORECASE):
                 self.raise_error(self.display_sql(x) + ". you can't set 'SELECT' sql.", exception=CustomSQLException)
             else:
                 if self.dbinfo["dbtype"] == "mysql":
                     x = escape_mysql_reserved_word(x, RESERVED_WORD_MYSQL)
                 self.sql_list.append(x)
+                self.params_list.append(y)
                 self.logger.debug(f"SQL: {self.display_sql(x)}")
         self.logger.info("END")
 
-    def execute_sql(self, sql: str=None):
-        """ Execute the contents of sql_list. """
+    def execute_sql(self, sql: str=None, params: tuple | list | dict=None):
+        """
+        Execute the contents of sql_list.
+        Params::
+            sql:
+                If set, it's executed alone. sql_list must be empty.
+            params:
+                Parameters of sql bound by the driver. See set_sql.
+        """
         self.logger.info("START")
         assert sql is None or isinstance(sql, str)
+        assert params is None or sql is not None
         if self.dbinfo["dbtype"] in ["mongo"]:
             self.logger.warning("Execute function is ignored in case dbtype is 'MongoDB'")
             self.logger.info("END")
@@ -296,29 +952,112 @@ class DBConnector:
         self.check_status(["open"])
         if sql is not None:
             self.check_status(["lock"])
-            self.set_sql(sql)
+            self.set_sql(sql, params=params)
         self.check_status(["esql"])
         if self.con is not None:
             self.con.autocommit = False
             cur = self.con.cursor()
+            cur_ret = cur
             try:
-                for x in self.sql_list:
-                    self.logger.info(self.display_sql(x))
-                    cur.execute(x)
+                with (self.con.pipeline() if self.is_pipeline(self.sql_list) else contextlib.nullcontext()):
+                    for x, params in zip(self.sql_list, self.params_list):
+                        self.logger.info(self.display_sql(x))
+                        if params is None:
+                            cur.execute(x)
+                            cur_ret = cur
+                        else:
+                            cur_ret = self.execute_params(cur, x, params)
                 self.con.commit()
+                for x in self.sql_list: self.invalidate_cache(get_write_tables(x))
             except Exception as e:
-                self.con.rollback()
+                self.rollback()
                 cur.close()
                 self.raise_error(f"SQL ERROR: {e.args}", exception=e)
             try:
-                results = cur.fetchall()
-            except psycopg2.ProgrammingError:
+                results = cur_ret.fetchall()
+            except ERRORS_NO_RESULT:
                 results = None
             cur.close()
-        self.sql_list = []
+        self.sql_list    = []
+        self.params_list = []
         self.logger.info("END")
         return results
 
+    def is_pipeline(self, list_sql: list[str]) -> bool:
+        """
+        Pipeline mode is used in psycopg 3 when there are 2 or more statements.
+        A string which has several statements cannot be sent in pipeline mode ( extended query protocol ), so it's not used then.
+        """
+        if self.driver != "psycopg" or len(list_sql) < 2:
+            return False
+        for x in list_sql:
+            listwk = split_sql_statements(x)
+            if listwk is None or len(listwk) > 1:
+                return False
+        return True
+
+    def copy_expert(self, cur, sql: str, file, size: int=2**20):
+        """
+        cursor.copy_expert() of psycopg2. In psycopg 3, the data is written or read by cursor.copy().
+        Params::
+            file:
+                "COPY ... FROM STDIN": object which has read(size). ex) CopyStream
+                "COPY ... TO STDOUT":  object which has write(data). ex) io.BytesIO
+        """
+        if self.driver != "psycopg":
+            return cur.copy_expert(sql, file, size=size)
+        with cur.copy(sql) as copy:
+            if re.search(r"\sfrom\s+stdin\b", sql, flags=re.IGNORECASE):
+                while True:
+                    data = file.read(size)
+                    if len(data) == 0: break
+                    copy.write(data)
+            else:
+                for data in copy: file.write(data)
+
+    def select_many(self, list_sql: list[str], ret_polars: bool=None, use_arrow: bool=False) -> list[pd.DataFrame | pl.DataFrame]:
+        """
+        Run several select queries and return the results in the same order.
+        With driver="psycopg", all queries are sent at once in pipeline mode, so it costs about one network round trip.
+        Otherwise, it's the same as calling select_sql() for each query.
+        Usage::
+            >>> df1, df2 = DB.select_many(["SELECT * FROM test_table WHERE id = 1;", "SELECT COUNT(*) AS n FROM test_table;"])
+        """
+        self.logger.info("START")
+        assert check_type_list(list_sql, str)
+        assert ret_polars is None or isinstance(ret_polars, bool)
+        assert isinstance(use_arrow, bool)
+        ret_polars = self.use_polars if ret_polars is None else ret_polars
+        if self.driver != "psycopg" or self.con is None:
+            list_df = [self.select_sql(x, ret_polars=ret_polars, use_arrow=use_arrow) for x in list_sql]
+            self.logger.info("END")
+            return list_df
+        self.check_status(["open","lock"])
+        list_sql = [self.check_select_sql(x) for x in list_sql]
+        list_key = [(normalize_sql(x), repr(None), ret_polars, use_arrow) for x in list_sql]
+        list_df  = [(self.cache.get(x) if self.cache is not None else None) for x in list_key]
+        indexes  = [i for i, x in enumerate(list_df) if x is None]
+        self.logger.info(f"n_sql: {len(list_sql)}, n_cache_hit: {len(list_sql) - len(indexes)}")
+        self.con.autocommit = True
+        curs = [self.con.cursor() for _ in indexes]
+        try:
+            with self.con.pipeline():
+                for i, cur in zip(indexes, curs): cur.execute(list_sql[i])
+            for i, cur in zip(indexes, curs):
+                rows = cur.fetchall()
+                if use_arrow:
+                    df = self.rows_to_df_arrow(rows, cur.description, ret_polars, sql=list_sql[i])
+                else:
+                    df = self.rows_to_df(rows, cur.description, ret_polars, sql=list_sql[i])
+                list_df[i] = self.postprocess_df(df, ret_polars)
+                if self.cache is not None:
+                    self.cache.set(list_key[i], list_sql[i], list_df[i] if ret_polars else list_df[i].copy())
+        finally:
+            for cur in curs: cur.close()
+            self.con.autocommit = False
+        self.logger.info("END")
+        return [(x if ret_polars else x.copy()) for x in list_df]
+
     def read_table_layout(self, tblname: str=None) -> pd.DataFrame:
         self.logger.info("START")
         assert tblname is None or isinstance(tblname, str)
@@ -340,19 +1079,33 @@ class DBConnector:
             else:
                 df = pd.concat(df, axis=0, ignore_index=True, sort=False)
         else:
-            if   self.dbinfo["dbtype"] == "psgre":
-                sql = f"SELECT table_name as tblname, column_name as colname, data_type as data_type FROM information_schema.columns where table_schema = 'public' "
-            elif self.dbinfo["dbtype"] == "mysql":
-                sql = f"SELECT table_name as tblname, column_name as colname, data_type as data_type FROM information_schema.columns where table_schema = '{self.dbinfo['dbname']}' "
-            if tblname is not None: sql += f"and table_name = '{tblname}' "
-            sql += "order by table_name, ordinal_position;"
-            df = self.select_sql(sql, ret_polars=False)
+            df = self.select_sql(self.sql_table_layout(tblname=tblname), ret_polars=False)
         self.logger.info("END")
         return df
+
+    def sql_table_layout(self, tblname: str=None) -> str:
+        """ PostgreSQL and MySQL. The query of read_table_layout. """
+        assert tblname is None or isinstance(tblname, str)
+        if   self.dbinfo["dbtype"] == "psgre":
+            sql = f"SELECT table_name as tblname, column_name as colname, data_type as data_type FROM information_schema.columns where table_schema = 'public' "
+        elif self.dbinfo["dbtype"] == "mysql":
+            sql = f"SELECT table_name as tblname, column_name as colname, data_type as data_type FROM information_schema.columns where table_schema = '{self.dbinfo['dbname']}' "
+        if tblname is not None: sql += f"and table_name = '{tblname.replace(chr(39), chr(39) * 2)}' "
+        sql += "order by table_name, ordinal_position;"
+        return sql
     
     def read_table_constraint(self, tblname: str=None) -> pd.DataFrame:
         self.logger.info("START")
         assert tblname is None or isinstance(tblname, str)
+        if self.dbinfo["dbtype"] not in ["psgre", "mysql"]:
+            return pd.DataFrame(columns=["table_name", "column_name"])
+        df = self.select_sql(self.sql_table_constraint(tblname=tblname), ret_polars=False)
+        self.logger.info("END")
+        return df
+
+    def sql_table_constraint(self, tblname: str=None) -> str:
+        """ PostgreSQL and MySQL. The query of read_table_constraint. """
+        assert tblname is None or isinstance(tblname, str)
         if   self.dbinfo["dbtype"] == "psgre":
             sql = f"""
             SELECT ccu.table_name, ccu.constraint_name, ccu.column_name FROM information_schema.table_constraints tc
@@ -367,7 +1120,7 @@ class DBConnector:
                 and tc.table_schema='public'
                 and tc.constraint_type='PRIMARY KEY'
             """.strip()
-            if tblname is not None: sql += f" and tc.table_name = '{tblname}' "
+            if tblname is not None: sql += f" and tc.table_name = '{tblname.replace(chr(39), chr(39) * 2)}' "
             sql += ";"
         elif self.dbinfo["dbtype"] == "mysql":
             sql = f"""
@@ -376,18 +1129,14 @@ class DBConnector:
                 table_schema = '{self.dbinfo['dbname']}' and
                 column_key   = 'PRI'
             """.strip()
-            if tblname is not None: sql += f" and table_name = '{tblname}' "
+            if tblname is not None: sql += f" and table_name = '{tblname.replace(chr(39), chr(39) * 2)}' "
             sql += " ORDER BY table_name, ordinal_position;"
-        else:
-            return pd.DataFrame(columns=["table_name", "column_name"])
-        df = self.select_sql(sql, ret_polars=False)
-        self.logger.info("END")
-        return df
+        return sql
 
     def execute_copy_from_df(
         self, df: pd.DataFrame | pl.DataFrame, tblname: str, system_colname_list: list[str] = ["sys_updated"], 
         filename: str=None, encoding: str="utf8", n_round: int=8, 
-        str_null :str="%%null%%", check_columns: bool=True, n_jobs: int=1
+        str_null :str="%%null%%", check_columns: bool=True, n_jobs: int=1, format: str="csv", chunksize: int=100000
     ):
         """
         Params::
@@ -399,9 +1148,9 @@ class DBConnector:
                 special column names that does not insert.
                 "sys_updated" is automatically inserted the update datetime.
             filename:
-                temporary csv name to output
+                Not used. The data is streamed to the server without temporary csv. It's kept for compatibility.
             encoding:
-                "shift-jisx0213", "utf8", ...
+                Not used. The strings are encoded with the client encoding of the connection. It's kept for compatibility.
             n_round:
                 Number of digits to round numbers
             str_null:
@@ -411,53 +1160,210 @@ class DBConnector:
                 Else, all nan to create dataframe cplumns that do not exist in table columns.
             n_jobs:
                 Number of workers used for parallelisation
+            format:
+                "csv":    all values are converted to strings and copied as tab separated text.
+                "binary": columns are encoded directly into PostgreSQL binary COPY format with the types of db_layout_type.
+                          n_round and str_null are not used. NaN, inf and -inf are NULL.
+            chunksize:
+                Number of rows serialised at once. The chunks are created lazily while the server consumes the stream,
+                so the whole serialised data never exists in memory at once.
+        Return::
+            The dataframe which has the copied columns. It's before serialising.
         """
         self.logger.info("START")
+        assert isinstance(format, str) and format in ["csv", "binary"]
+        assert isinstance(chunksize, int) and chunksize > 0
         if self.dbinfo["dbtype"] not in ["psgre"]:
             self.raise_error("COPY command is only for PostgreSQL", exception=CustomSQLException)
         if self.use_polars:
             assert isinstance(df, pl.DataFrame)
-            df = df.to_pandas()
         else:
             assert isinstance(df, pd.DataFrame)
         assert isinstance(tblname, str)
         assert check_type_list(system_colname_list, str)
-        if filename is None:
-            filename = f"./postgresql_copy.{str(id(self.con))}.csv"
-        assert isinstance(filename, str)
+        assert filename is None or isinstance(filename, str)
         assert isinstance(encoding, str)
         assert isinstance(check_columns, bool)
         self.check_status(["open", "lock"])
+        df = self.select_table_columns(df, tblname, system_colname_list, check_columns)
+        if format == "binary":
+            data_types = [self.db_layout_type[tblname][x] for x in df.columns]
+            stream     = CopyStream(self.iter_copy_binary(df, data_types, chunksize), is_bytes=True)
+            sql        = f"COPY {tblname} ({','.join(list(df.columns))}) FROM STDIN WITH (FORMAT binary)"
+        else:
+            if self.use_polars:
+                stream = CopyStream(self.iter_copy_csv_polars(df, tblname, chunksize, n_round=n_round, str_null=str_null), is_bytes=False)
+            else:
+                stream = CopyStream(self.iter_copy_csv(df, tblname, chunksize, n_round=n_round, str_null=str_null, n_jobs=n_jobs), is_bytes=False)
+            str_nullwk = str_null.replace("'", "''")
+            sql        = f"COPY {tblname} ({','.join(list(df.columns))}) FROM STDIN WITH (FORMAT text, DELIMITER E'\\t', NULL '{str_nullwk}')"
+        self.logger.info(f"start to copy from stream. table: {tblname}, format: {format}")
+        if self.con is not None:
+            cur = self.con.cursor()
+            try:
+                self.copy_expert(cur, sql, stream, size=2**20)
+                self.con.commit()
+                self.invalidate_cache([tblname])
+                self.logger.info(f"finish to copy from stream. table: {tblname}, size: {stream.n_read} ({'bytes' if format == 'binary' else 'chars'})")
+            except Exception as e:
+                self.con.rollback()
+                self.raise_error(f"{format} copy error !!", exception=e)
+            finally:
+                cur.close()
+        self.logger.info("END")
+        return df
+
+    def select_table_columns(self, df: pd.DataFrame | pl.DataFrame, tblname: str, system_colname_list: list[str], check_columns: bool) -> pd.DataFrame | pl.DataFrame:
+        """
+        Select the columns of the table in order of db_layout for bulk loading.
+        Params::
+            check_columns:
+                If True, check that all table columns are present in the datafarme.
+                Else, the columns that do not exist in df are created as null.
+        """
         columns = [x for x in self.db_layout.get(tblname) if x not in system_colname_list] if self.db_layout.get(tblname) is not None else []
-        ndf     = np.isin(columns, df.columns.values)
+        ndf     = np.isin(columns, list(df.columns))
         if check_columns:
             if (ndf == False).sum() > 0:
                 self.raise_error(f'{np.array(columns)[~ndf]} columns must be added in df: {df}.', exception=CustomSQLException)
-            df = df.loc[:, columns].copy()
+            df = df.select(columns) if isinstance(df, pl.DataFrame) else df.loc[:, columns].copy()
         else:
             # Create a column that does not exist in the table columns.
-            df = df.loc[:, np.array(columns)[ndf]].copy()
-            for x in np.array(columns)[~ndf]: df[x] = float("nan")
-        df = self.convert_df_for_dbtype(df, tblname)
-        df = df.replace("''", "'", regex=True) # To back to original from escaped value.
-        df = to_string_all_columns(df, n_round=n_round, rep_nan=str_null, rep_inf=str_null, rep_minf=str_null, strtmp="-9999999", n_jobs=n_jobs)
-        df = df.replace(r"\r\n", " ", regex=True).replace(r"\n", " ", regex=True).replace(r"\t", " ", regex=True).replace(r"\\", " ", regex=True) # Convert line breaks and tabs to spaces.
-        self.logger.info(f"start to copy from csv. table: {tblname}")
-        df.to_csv(filename, encoding=encoding, quotechar="\t", sep="\t", index=False, header=False) # "\t" is not appearing in any string because it's escaped to space in above process.
+            if isinstance(df, pl.DataFrame):
+                df = df.with_columns([pl.lit(None).alias(x) for x in np.array(columns)[~ndf]]).select(columns)
+            else:
+                df = df.loc[:, np.array(columns)[ndf]].copy()
+                for x in np.array(columns)[~ndf]: df[x] = float("nan")
+        return df
+
+    def execute_load_data_from_df(
+        self, df: pd.DataFrame | pl.DataFrame, tblname: str, system_colname_list: list[str] = ["sys_updated"],
+        n_round: int=8, str_null :str="%%null%%", check_columns: bool=True, n_jobs: int=1, chunksize: int=100000
+    ):
+        """
+        MySQL version of execute_copy_from_df. The rows are serialised chunk by chunk in the same way as the COPY csv format,
+        and streamed by "LOAD DATA LOCAL INFILE" through a named pipe, so no file is written on disk.
+        Params::
+            Same as execute_copy_from_df.
+        Note::
+            The connection must be created with allow_local_infile=True, and local_infile must be ON in the server.
+            ex) DBConnector(..., dbtype="mysql", kwargs_db={"allow_local_infile": True})
+            Named pipe ( os.mkfifo ) is POSIX only. On the other platforms ( ex. Windows ) all chunks are written to a temporary file first,
+            so the disk needs the space of the serialised df.
+        Return::
+            The dataframe which has the loaded columns. It's before serialising.
+        """
+        self.logger.info("START")
+        if self.dbinfo["dbtype"] not in ["mysql"]:
+            self.raise_error("LOAD DATA command is only for MySQL", exception=CustomSQLException)
+        if self.use_polars:
+            assert isinstance(df, pl.DataFrame)
+        else:
+            assert isinstance(df, pd.DataFrame)
+        assert isinstance(tblname, str)
+        assert check_type_list(system_colname_list, str)
+        assert isinstance(check_columns, bool)
+        assert isinstance(chunksize, int) and chunksize > 0
+        self.check_status(["open", "lock"])
+        df = self.select_table_columns(df, tblname, system_colname_list, check_columns)
+        if self.use_polars:
+            chunks = self.iter_copy_csv_polars(df, tblname, chunksize, n_round=n_round, str_null=str_null)
+        else:
+            chunks = self.iter_copy_csv(df, tblname, chunksize, n_round=n_round, str_null=str_null, n_jobs=n_jobs)
+        cols       = [f"`{x}`" for x in df.columns]
+        str_nullwk = str_null.replace("'", "''")
+        self.logger.info(f"start to load data from stream. table: {tblname}")
         if self.con is not None:
+            is_pipe  = hasattr(os, "mkfifo")
+            dirname  = tempfile.mkdtemp(prefix="kkpsgre_load_")
+            filename = os.path.join(dirname, "data.tsv")
+            if is_pipe: os.mkfifo(filename) # Named pipe is POSIX only. The others use a temporary file.
+            sql = (
+                f"LOAD DATA LOCAL INFILE '{filename.replace(os.sep, '/')}' INTO TABLE {tblname} CHARACTER SET utf8mb4 " + # "/" is accepted in Windows too.
+                "FIELDS TERMINATED BY '\\t' ESCAPED BY '' LINES TERMINATED BY '\\n' " +
+                "(" + ",".join([f"@v{i}" for i in range(len(cols))]) + ") " +
+                "SET " + ",".join([f"{x} = NULLIF(@v{i}, '{str_nullwk}')" for i, x in enumerate(cols)]) + ";"
+            )
+            errors, opened = [], threading.Event()
+            def __write():
+                try:
+                    with open(filename, mode="w", encoding="utf8", newline="\n") as f:
+                        opened.set()
+                        for x in chunks: f.write(x)
+                except BrokenPipeError:
+                    pass
+                except Exception as e:
+                    errors.append(e)
+            thread = threading.Thread(target=__write, daemon=True)
+            if is_pipe: thread.start()
+            cur = self.con.cursor()
             try:
-                cur = self.con.cursor()
-                with open(filename, mode="r", encoding=encoding) as f:
-                    cur.copy_from(f, tblname, columns=tuple(df.columns.tolist()), sep="\t", null=str_null)
-                self.con.commit() # Not sure if this code is needed.
-                self.logger.info(f"finish to copy from csv. table: {tblname}")
+                if not is_pipe: __write() # The file is written before LOAD DATA reads it.
+                if len(errors) > 0: raise errors[0]
+                cur.execute(sql)
+                if is_pipe: thread.join()
+                if len(errors) > 0: raise errors[0]
+                self.con.commit()
+                self.invalidate_cache([tblname])
+                self.logger.info(f"finish to load data from stream. table: {tblname}, rows: {cur.rowcount}")
             except Exception as e:
-                self.con.rollback() # Not sure if this code is needed.
+                self.con.rollback()
+                self.raise_error("load data error !!", exception=e)
+            finally:
                 cur.close()
-                self.raise_error("csv copy error !!", exception=e)
+                if is_pipe and thread.is_alive():
+                    # The server didn't read the pipe. Open the reading side until the writer opens the pipe, then close it so that the writer gets BrokenPipeError.
+                    fd = os.open(filename, os.O_RDONLY | os.O_NONBLOCK)
+                    opened.wait(timeout=10)
+                    os.close(fd)
+                if is_pipe: thread.join(timeout=10)
+                if os.path.exists(filename): os.remove(filename)
+                os.rmdir(dirname)
         self.logger.info("END")
         return df
 
+    def iter_copy_csv(self, df: pd.DataFrame, tblname: str, chunksize: int, n_round: int=8, str_null: str="%%null%%", n_jobs: int=1):
+        """
+        Serialise df into tab separated text of COPY chunk by chunk.
+        Line breaks, tabs and backslashes are converted to spaces, so "\t" is not appearing in any string.
+        """
+        for i in range(0, df.shape[0], chunksize):
+            dfwk = self.convert_df_for_dbtype(df.iloc[i:i+chunksize].copy(), tblname)
+            dfwk = dfwk.replace("''", "'", regex=True) # To back to original from escaped value.
+            dfwk = to_string_all_columns(dfwk, n_round=n_round, rep_nan=str_null, rep_inf=str_null, rep_minf=str_null, strtmp="-9999999", n_jobs=n_jobs)
+            dfwk = dfwk.replace(r"\r\n", " ", regex=True).replace(r"\n", " ", regex=True).replace(r"\t", " ", regex=True).replace(r"\\", " ", regex=True) # Convert line breaks and tabs to spaces.
+            yield dfwk.to_csv(quotechar="\t", sep="\t", index=False, header=False, lineterminator="\n")
+
+    def iter_copy_csv_polars(self, df: pl.DataFrame, tblname: str, chunksize: int, n_round: int=8, str_null: str="%%null%%"):
+        """
+        Polars version of iter_copy_csv. All conversions are polars expressions and each chunk is written by write_csv().
+        NaN, inf and -inf are NULL, floats are rounded and line breaks, tabs and backslashes are converted to spaces.
+        """
+        df    = self.convert_df_for_dbtype(df, tblname)
+        exprs = []
+        for x, y in df.schema.items():
+            if y in [pl.Float64, pl.Float32]:
+                exprs.append(pl.col(x).round(n_round))
+            elif y == pl.Boolean:
+                exprs.append(pl.col(x).cast(pl.Int8))
+            elif y == pl.Utf8:
+                exprs.append(pl.col(x).str.replace_all("''", "'", literal=True).str.replace_all(r"\r\n|\n|\t|\\", " "))
+            elif y == pl.Categorical:
+                exprs.append(pl.col(x).cast(pl.Utf8).str.replace_all(r"\r\n|\n|\t|\\", " "))
+        if len(exprs) > 0:
+            df = df.with_columns(exprs)
+        for i in range(0, df.shape[0], chunksize):
+            yield df.slice(i, chunksize).write_csv(None, separator="\t", include_header=False, null_value=str_null, quote_style="never", line_terminator="\n")
+
+    def iter_copy_binary(self, df: pd.DataFrame | pl.DataFrame, data_types: list[str], chunksize: int):
+        """ Encode df into PostgreSQL binary COPY format chunk by chunk. polars df is converted to pandas chunk by chunk. """
+        for i in range(0, df.shape[0], chunksize):
+            dfwk = df.slice(i, chunksize).to_pandas() if isinstance(df, pl.DataFrame) else df.iloc[i:i+chunksize]
+            yield df_to_pgcopy(dfwk, data_types, header=(i == 0), trailer=False).getvalue()
+        if df.shape[0] == 0:
+            yield df_to_pgcopy(df.to_pandas() if isinstance(df, pl.DataFrame) else df, data_types, header=True, trailer=False).getvalue()
+        yield PGCOPY_TRAILER
+
     def convert_df_for_dbtype(self, df: pd.DataFrame | pl.DataFrame, tblname: str) -> pd.DataFrame | pl.DataFrame:
         if isinstance(df, pl.DataFrame):
             use_polars = True
@@ -500,9 +1406,327 @@ class DBConnector:
                                 df[x] = df[x].str.replace("\\", "\\\\")
         return df
 
+    def df_to_native_rows(self, df: pd.DataFrame | pl.DataFrame, tblname: str) -> list[tuple]:
+        """
+        Convert df to the rows of python native values which are bound by the driver.
+        NaN, inf and -inf are None. The datetime columns of the table are timezone aware,
+        and in MySQL they are converted to naive UTC datetime because MySQL doesn't manage TimeZone.
+        """
+        layout_type = self.db_layout_type.get(tblname, {})
+        columns     = []
+        if isinstance(df, pl.DataFrame):
+            exprs = []
+            for x, y in df.schema.items():
+                if y in [pl.Float64, pl.Float32]:
+                    exprs.append(pl.when(pl.col(x).is_infinite() | pl.col(x).is_nan()).then(None).otherwise(pl.col(x)).alias(x))
+                elif y == pl.Datetime and self.dbinfo["dbtype"] == "mysql":
+                    exprs.append((pl.col(x).dt.convert_time_zone("UTC").dt.replace_time_zone(None) if y.time_zone is not None else pl.col(x)).alias(x))
+                elif y == pl.Categorical:
+                    exprs.append(pl.col(x).cast(pl.Utf8))
+            if len(exprs) > 0:
+                df = df.with_columns(exprs)
+            return df.rows()
+        for x in df.columns:
+            se = df[x]
+            if layout_type.get(x) in ["datetime", "timestamp with time zone"] or pd.api.types.is_datetime64_any_dtype(se):
+                se = pd.to_datetime(se, utc=True)
+                if self.dbinfo["dbtype"] == "mysql": se = se.dt.tz_localize(None)
+                columns.append([(y if not pd.isna(y) else None) for y in se.dt.to_pydatetime().tolist()])
+            elif pd.api.types.is_float_dtype(se):
+                ndf = se.to_numpy(dtype=np.float64, na_value=np.nan)
+                columns.append(np.where(np.isfinite(ndf), ndf, None).tolist())
+            else:
+                columns.append(se.astype(object).where(se.notna(), None).tolist())
+        return list(zip(*columns))
+
+    def create_insert_pages(
+        self, df: pd.DataFrame | pl.DataFrame, tblname: str, page_size: int, str_conflict: str="", tblname_into: str=None
+    ) -> (list[str], list[tuple]):
+        """
+        Split the rows into "INSERT ... VALUES (%s, ...), (%s, ...), ...{str_conflict};" statements of page_size rows.
+        The values are bound by the driver. page_size is limited so that one statement has 65535 parameters or less.
+        Params::
+            tblname_into:
+                If set, the rows are inserted into this table instead of tblname. The types are still from tblname's layout.
+        Return::
+            (list of sql, list of params)
+        """
+        cols      = [f"`{x}`" if x in RESERVED_WORD_MYSQL else x for x in df.columns] if self.dbinfo["dbtype"] == "mysql" else list(df.columns)
+        rows      = self.df_to_native_rows(df, tblname)
+        page_size = max(1, min(page_size, 65535 // max(len(cols), 1)))
+        values    = "(" + ",".join(["%s"] * len(cols)) + ")"
+        list_sql, list_params = [], []
+        for i in range(0, len(rows), page_size):
+            rowswk = rows[i:i+page_size]
+            list_sql.append(f"insert into {tblname if tblname_into is None else tblname_into} ({','.join(cols)}) values " + ",".join([values] * len(rowswk)) + str_conflict + ";")
+            list_params.append(tuple(y for x in rowswk for y in x))
+        self.logger.info(f"rows: {len(rows)}, statements: {len(list_sql)}")
+        return list_sql, list_params
+
+    def set_sql_pages(self, list_sql: list[str], list_params: list[tuple], set_sql: bool=True):
+        """ If set_sql is False, the statements are executed at once in one transaction. """
+        if len(list_sql) == 0: return None
+        if not set_sql: self.check_status(["lock"])
+        self.set_sql(list_sql, params=list_params)
+        if not set_sql: self.execute_sql()
+
+    def upsert_from_df(
+        self, df: pd.DataFrame | pl.DataFrame, tblname: str, update_columns: list[str]=None, do_nothing: bool=False,
+        set_sql: bool=True, page_size: int=1000, keys: list[str]=None, chunksize: int=10000, n_jobs: int=1
+    ):
+        """
+        Insert rows, and update the rows whose primary key already exists.
+        PostgreSQL: INSERT ... ON CONFLICT (keys) DO UPDATE SET col = EXCLUDED.col / DO NOTHING
+        MySQL:      INSERT ... ON DUPLICATE KEY UPDATE col = VALUES(col)
+        MongoDB:    bulk_write of ReplaceOne / UpdateOne with upsert=True. See bulk_write_mongo.
+        Params::
+            df:
+                input dataframe. The columns which are not in the table are ignored. It must have all primary key columns.
+            update_columns:
+                Columns which are updated when the key exists. If None, all columns except the primary keys.
+            do_nothing:
+                If True, the existing rows are not updated.
+            page_size:
+                Number of rows in one statement. The values are bound by the driver like insert_from_df(method="values").
+            keys:
+                Key columns. If None, the primary keys of db_constraint. It's required in MongoDB.
+            chunksize, n_jobs:
+                MongoDB only. Number of documents of one bulk_write and number of threads.
+                In MongoDB, update_columns=None replaces the whole document.
+        Note::
+            The primary keys are from db_constraint, so is_read_layout must be True.
+            If the same key appears more than once in df, the last row is used.
+        """
+        self.logger.info("START")
+        if self.use_polars:
+            assert isinstance(df, pl.DataFrame)
+        else:
+            assert isinstance(df, pd.DataFrame)
+        assert isinstance(tblname, str)
+        assert update_columns is None or check_type_list(update_columns, str)
+        assert isinstance(do_nothing, bool)
+        assert isinstance(set_sql, bool)
+        assert isinstance(page_size, int) and page_size > 0
+        assert keys is None or check_type_list(keys, str)
+        keys = self.db_constraint.get(tblname) if keys is None else keys
+        if keys is None or len(keys) == 0:
+            self.raise_error(f"table: {tblname} doesn't have primary keys in db_constraint.", exception=CustomSQLException)
+        if len(set(keys) - set(df.columns)) > 0:
+            self.raise_error(f"{sorted(set(keys) - set(df.columns))} columns must be added in df.", exception=CustomSQLException)
+        if self.dbinfo["dbtype"] == "mongo":
+            if self.use_polars:
+                df = df.unique(subset=keys, keep="last", maintain_order=True)
+            else:
+                df = df.drop_duplicates(subset=keys, keep="last")
+            self.bulk_write_mongo(df, tblname, keys, update_columns=update_columns, upsert=True, do_nothing=do_nothing, chunksize=chunksize, n_jobs=n_jobs)
+            self.logger.info("END")
+            return None
+        columns = self.db_layout.get(tblname)
+        columns = [x for x in df.columns if x in columns] if columns is not None else list(df.columns)
+        if self.use_polars:
+            df = df.select(columns).unique(subset=keys, keep="last", maintain_order=True)
+        else:
+            df = df.loc[:, columns].drop_duplicates(subset=keys, keep="last")
+        update_columns = [x for x in columns if x not in keys] if update_columns is None else update_columns
+        if len(set(update_columns) - set(columns)) > 0:
+            self.raise_error(f"update_columns: {sorted(set(update_columns) - set(columns))} are not in df.", exception=CustomSQLException)
+        __esc = lambda x: f"`{x}`" if (self.dbinfo["dbtype"] == "mysql" and x in RESERVED_WORD_MYSQL) else x
+        if self.dbinfo["dbtype"] == "psgre":
+            if do_nothing or len(update_columns) == 0:
+                str_conflict = f" on conflict ({','.join(keys)}) do nothing"
+            else:
+                str_conflict = f" on conflict ({','.join(keys)}) do update set " + ",".join([f"{x} = EXCLUDED.{x}" for x in update_columns])
+        else:
+            if do_nothing or len(update_columns) == 0:
+                str_conflict = f" on duplicate key update {__esc(keys[0])} = {__esc(keys[0])}" # No-op update. "INSERT IGNORE" ignores the other errors too.
+            else:
+                str_conflict = " on duplicate key update " + ",".join([f"{__esc(x)} = VALUES({__esc(x)})" for x in update_columns])
+        self.set_sql_pages(*self.create_insert_pages(df, tblname, page_size, str_conflict=str_conflict), set_sql=set_sql)
+        self.logger.info("END")
+
+    def get_max_statement_bytes(self) -> int:
+        """
+        Default byte budget of one insert statement.
+        MySQL: max_allowed_packet of the server minus the margin. PostgreSQL: MAX_STATEMENT_BYTES_PSGRE.
+        """
+        if self.dbinfo["dbtype"] == "mysql":
+            if self.max_packet is None and self.con is not None:
+                cur = self.con.cursor()
+                try:
+                    cur.execute("SELECT @@max_allowed_packet;")
+                    self.max_packet = int(cur.fetchall()[0][0])
+                finally:
+                    cur.close()
+                self.logger.info(f"max_allowed_packet: {self.max_packet}")
+            if self.max_packet is not None:
+                return max(self.max_packet - MARGIN_PACKET_BYTES_MYSQL, 1)
+        return MAX_STATEMENT_BYTES_PSGRE
+
+    def iter_insert_values(self, df: pd.DataFrame | pl.DataFrame, tblname: str, n_round: int=8, str_null: str="%%null%%", n_jobs: int=1, blocksize: int=100000):
+        """
+        Yield the "(...)" string of each row for "INSERT ... VALUES". The rows are stringified block by block.
+        """
+        for i in range(0, df.shape[0], blocksize):
+            if self.use_polars:
+                dfwk = self.convert_df_for_dbtype(df.slice(i, blocksize), tblname)
+                se = dfwk.map_rows(lambda x: str(x).replace(", ", ","), return_dtype=pl.Utf8)["map"].str.replace_many(
+                    [",None,", ",None)", "(None,", ",True,", ",True)", "(True,", ",False,", ",False)", "(False,", ": True,", ": True}", ": False,", ": False}"],
+                    [",null,", ",null)", "(null,", ",true,", ",true)", "(true,", ",false,", ",false)", "(false,", ": true,", ": true}", ": false,", ": false}"]
+                ).str.replace_many(
+                    [",None,", ",None)", "(None,", ",True,", ",True)", "(True,", ",False,", ",False)", "(False,"],
+                    [",null,", ",null)", "(null,", ",true,", ",true)", "(true,", ",false,", ",false)", "(false,"]
+                ) # Consider this patter ,None,None,None, ( -> ,null,None,null, at first process done) 
+                se = se.str.replace_many([',"', '",'], [",'", "',"]).str.replace_many([',"', '",'], [",'", "',"]) # ...","... This type cannot be replaced in the first process.
+                yield from se.to_list()
+            else:
+                dfwk = self.convert_df_for_dbtype(df.iloc[i:i+blocksize].copy(), tblname)
+                dfwk = to_string_all_columns(dfwk, n_round=n_round, rep_nan=str_null, rep_inf=str_null, rep_minf=str_null, strtmp="-9999999", n_jobs=n_jobs)
+                for ndf in dfwk.values:
+                    yield ("('" + "','".join(ndf.tolist()) + "')").replace("'"+str_null+"'", "null")
+
+    def iter_insert_sql(self, sql_prefix: str, values, max_bytes: int, max_rows: int=None):
+        """
+        Join the values into "{sql_prefix}(...),(...),...;" statements.
+        Each statement is max_bytes or less in utf8 and has max_rows rows or less.
+        A row which is larger than max_bytes by itself is an error because the server cannot receive it.
+        """
+        assert isinstance(sql_prefix, str)
+        assert isinstance(max_bytes, int) and max_bytes > 0
+        assert max_rows is None or (isinstance(max_rows, int) and max_rows > 0)
+        n_prefix = len(sql_prefix.encode("utf8")) + 1 # + ";"
+        listwk, n_bytes = [], n_prefix
+        for x in values:
+            n_value = len(x) if x.isascii() else len(x.encode("utf8"))
+            if n_prefix + n_value > max_bytes:
+                self.raise_error(f"one row is {n_value} bytes. It's over the statement size limit: {max_bytes} bytes.", exception=CustomSQLException)
+            if len(listwk) > 0 and (n_bytes + 1 + n_value > max_bytes or (max_rows is not None and len(listwk) >= max_rows)):
+                yield sql_prefix + ",".join(listwk) + ";"
+                listwk, n_bytes = [], n_prefix
+            n_bytes += n_value + (1 if len(listwk) > 0 else 0)
+            listwk.append(x)
+        if len(listwk) > 0:
+            yield sql_prefix + ",".join(listwk) + ";"
+
+    def df_to_docs(self, df: pd.DataFrame | pl.DataFrame) -> list[dict]:
+        """
+        Build MongoDB documents column by column. NaT and pd.NA are None.
+        """
+        if isinstance(df, pl.DataFrame):
+            return df.to_dicts()
+        columns = []
+        for x in df.columns:
+            se = df[x]
+            if pd.api.types.is_datetime64_any_dtype(se) or getattr(se.dtype, "na_value", None) is pd.NA:
+                columns.append(se.astype(object).where(se.notna(), None).tolist())
+            else:
+                columns.append(se.tolist())
+        colnames = [str(x) for x in df.columns]
+        return [dict(zip(colnames, x)) for x in zip(*columns)]
+
+    def insert_many_mongo(
+        self, df: pd.DataFrame | pl.DataFrame, tblname: str, chunksize: int=10000, n_jobs: int=1, sort_by: str | list[str]=None
+    ) -> int:
+        """
+        Insert df into the collection by insert_many(ordered=False) chunk by chunk.
+        The documents of each chunk are built in the worker threads, and at most n_jobs * 2 chunks are in flight,
+        so the memory is bounded by chunksize and not by the size of df.
+        Params::
+            chunksize:
+                Number of documents of one insert_many.
+            n_jobs:
+                Number of threads which call insert_many at the same time. MongoClient is thread-safe.
+            sort_by:
+                If set, df is sorted by the columns before inserting. ex) the time field of the time series collection.
+                https://www.mongodb.com/ja-jp/docs/manual/core/timeseries/timeseries-best-practices/
+        Return::
+            Number of inserted documents.
+        """
+        assert isinstance(tblname, str)
+        assert isinstance(chunksize, int) and chunksize > 0
+        assert isinstance(n_jobs, int) and n_jobs > 0
+        if isinstance(sort_by, str): sort_by = [sort_by, ]
+        assert sort_by is None or check_type_list(sort_by, str)
+        if sort_by is not None:
+            df = df.sort(sort_by, maintain_order=True) if isinstance(df, pl.DataFrame) else df.sort_values(sort_by, kind="stable")
+        collection = self.con.get_collection(tblname)
+        n_inserted = sum(self.map_chunks_mongo(df, lambda x: len(collection.insert_many(x, ordered=False).inserted_ids), chunksize, n_jobs))
+        self.invalidate_cache([tblname])
+        self.logger.info(f"collection: {tblname}, inserted: {n_inserted}, chunks: {(df.shape[0] + chunksize - 1) // chunksize}, n_jobs: {n_jobs}")
+        return n_inserted
+
+    def map_chunks_mongo(self, df: pd.DataFrame | pl.DataFrame, func, chunksize: int, n_jobs: int) -> list:
+        """
+        Call func(documents) for each chunk of df in n_jobs threads, and return the results in order of the chunks.
+        The documents of each chunk are built in the worker threads, and at most n_jobs * 2 chunks are in flight.
+        """
+        def __work(i: int):
+            dfwk = df.slice(i, chunksize) if isinstance(df, pl.DataFrame) else df.iloc[i:i+chunksize]
+            return func(self.df_to_docs(dfwk))
+        results, futures = [], []
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            for i in range(0, df.shape[0], chunksize):
+                if len(futures) >= n_jobs * 2:
+                    results.append(futures.pop(0).result())
+                futures.append(executor.submit(__work, i))
+            for x in futures: results.append(x.result())
+        return results
+
+    def bulk_write_mongo(
+        self, df: pd.DataFrame | pl.DataFrame, tblname: str, keys: list[str], update_columns: list[str]=None,
+        upsert: bool=True, do_nothing: bool=False, chunksize: int=10000, n_jobs: int=1
+    ) -> dict:
+        """
+        Update the documents which match the keys by bulk_write(ordered=False) chunk by chunk. One round trip per chunk.
+        Params::
+            keys:
+                Columns of the filter of each document. ex) {"id": 1, "unixtime": ...}
+            update_columns:
+                If None, the whole document is replaced by ReplaceOne. Else, UpdateOne with {"$set": {...}} of the columns.
+            upsert:
+                If True, the document is inserted when it doesn't match.
+            do_nothing:
+                If True, the matched documents are not updated. UpdateOne with {"$setOnInsert": document}.
+        Return::
+            {"matched": int, "modified": int, "upserted": int}
+        """
+        assert check_type_list(keys, str) and len(keys) > 0
+        assert update_columns is None or check_type_list(update_columns, str)
+        assert isinstance(upsert, bool)
+        assert isinstance(do_nothing, bool)
+        assert isinstance(chunksize, int) and chunksize > 0
+        assert isinstance(n_jobs, int) and n_jobs > 0
+        if len(set(keys) - set(df.columns)) > 0:
+            self.raise_error(f"{sorted(set(keys) - set(df.columns))} columns must be added in df.", exception=CustomSQLException)
+        if update_columns is not None and len(set(update_columns) - set(df.columns)) > 0:
+            self.raise_error(f"update_columns: {sorted(set(update_columns) - set(df.columns))} are not in df.", exception=CustomSQLException)
+        collection = self.con.get_collection(tblname)
+        def __work(docs: list[dict]):
+            result = collection.bulk_write(self.create_bulk_requests_mongo(docs, keys, update_columns=update_columns, upsert=upsert, do_nothing=do_nothing), ordered=False)
+            return (result.matched_count, result.modified_count, result.upserted_count)
+        results = self.map_chunks_mongo(df, __work, chunksize, n_jobs)
+        dictwk  = {x: sum([y[i] for y in results]) for i, x in enumerate(["matched", "modified", "upserted"])}
+        self.invalidate_cache([tblname])
+        self.logger.info(f"collection: {tblname}, result: {dictwk}, chunks: {len(results)}, n_jobs: {n_jobs}")
+        return dictwk
+
+    @classmethod
+    def create_bulk_requests_mongo(cls, docs: list[dict], keys: list[str], update_columns: list[str]=None, upsert: bool=True, do_nothing: bool=False) -> list:
+        """ Requests of bulk_write for each document. See bulk_write_mongo. """
+        def __request(doc: dict):
+            filter = {x: doc[x] for x in keys}
+            if do_nothing:
+                return pymongo.UpdateOne(filter, {"$setOnInsert": doc}, upsert=upsert)
+            elif update_columns is None:
+                return pymongo.ReplaceOne(filter, doc, upsert=upsert)
+            else:
+                return pymongo.UpdateOne(filter, {"$set": {x: doc[x] for x in update_columns}}, upsert=upsert)
+        return [__request(x) for x in docs]
+
     def insert_from_df(
         self, df: pd.DataFrame | pl.DataFrame, tblname: str, 
-        set_sql: bool=True, n_round: int=8, str_null :str="%%null%%", is_select: bool=False, n_jobs: int=1
+        set_sql: bool=True, n_round: int=8, str_null :str="%%null%%", is_select: bool=False, n_jobs: int=1,
+        method: str="sql", page_size: int=1000, max_bytes: int=None, max_rows: int=None,
+        chunksize: int=10000, sort_by: str | list[str]=None
     ):
         """
         Params::
@@ -516,25 +1740,40 @@ class DBConnector:
                 A special string that temporarily replaces NULL.
             n_jobs:
                 Number of workers used for parallelisation
+            method:
+                "sql":    values are stringified and written into one sql.
+                "values": values are bound by the driver as native types. Rows are split into pages of page_size rows,
+                          and each page is "INSERT ... VALUES (%s, ...), (%s, ...), ..." like psycopg2.extras.execute_values
+                          and executemany of mysql.connector. n_round and str_null are not used.
+            page_size:
+                Number of rows in one statement of method="values".
+                It's limited so that the number of parameters in one statement is 65535 or less.
+            max_bytes:
+                Byte budget of one statement of method="sql". The rows are split into statements within this size.
+                If None, max_allowed_packet of the server in MySQL and MAX_STATEMENT_BYTES_PSGRE in PostgreSQL.
+            max_rows:
+                Maximum number of rows in one statement of method="sql". If None, it's limited by max_bytes only.
+            chunksize:
+                MongoDB only. Number of documents of one insert_many. n_jobs threads insert the chunks at the same time.
+            sort_by:
+                MongoDB only. The columns by which df is sorted before inserting. See insert_many_mongo.
+        Note::
+            In method="sql", the statements are created one by one while they're set into sql_list.
+            If set_sql=False, they're executed at once in one transaction like set_sql_pages.
         """
         self.logger.info("START")
+        assert isinstance(method, str) and method in ["sql", "values"]
+        assert isinstance(page_size, int) and page_size > 0
+        assert max_bytes is None or (isinstance(max_bytes, int) and max_bytes > 0)
+        assert max_rows  is None or (isinstance(max_rows,  int) and max_rows  > 0)
         if self.use_polars:
             assert isinstance(df, pl.DataFrame)
         else:
             assert isinstance(df, pd.DataFrame)
-            df = df.copy()
         assert isinstance(tblname, str)
         assert isinstance(set_sql, bool)
         if self.dbinfo["dbtype"] in ["mongo"]:
-            if self.use_polars:
-                data = df.to_dicts()
-            else:
-                for x in df.columns:
-                    if pd.api.types.is_datetime64_any_dtype(df[x]):
-                        df[x] = df[x].replace({pd.NaT: None})
-                data = df.to_dict(orient='records')
-            result = self.con.get_collection(tblname).insert_many(data, ordered=False) # https://www.mongodb.com/ja-jp/docs/manual/core/timeseries/timeseries-best-practices/
-            self.logger.info(f"{str(result)[:self.max_disp_len]} ...")
+            self.insert_many_mongo(df, tblname, chunksize=chunksize, n_jobs=n_jobs, sort_by=sort_by)
         elif self.dbinfo["dbtype"] in ["psgre", "mysql"]:
             if is_select:
                 columns = self.db_layout.get(tblname) if self.db_layout.get(tblname) is not None else []
@@ -542,37 +1781,65 @@ class DBConnector:
                     df = df.select([x for x in df.columns if x in columns])
                 else:
                     df = df.loc[:, df.columns.isin(columns)].copy()
-            df   = self.convert_df_for_dbtype(df, tblname)
-            cols = [f"`{x}`" if x in RESERVED_WORD_MYSQL else x for x in df.columns] if self.dbinfo["dbtype"] == "mysql" else list(df.columns)
-            sql  = "insert into " + tblname + " (" + ",".join(cols) + ") values "
-            if self.use_polars:
-                se = df.map_rows(lambda x: str(x).replace(", ", ","), return_dtype=pl.Utf8)["map"].str.replace_many(
-                    [",None,", ",None)", "(None,", ",True,", ",True)", "(True,", ",False,", ",False)", "(False,", ": True,", ": True}", ": False,", ": False}"],
-                    [",null,", ",null)", "(null,", ",true,", ",true)", "(true,", ",false,", ",false)", "(false,", ": true,", ": true}", ": false,", ": false}"]
-                ).str.replace_many(
-                    [",None,", ",None)", "(None,", ",True,", ",True)", "(True,", ",False,", ",False)", "(False,"],
-                    [",null,", ",null)", "(null,", ",true,", ",true)", "(true,", ",false,", ",false)", "(false,"]
-                ) # Consider this patter ,None,None,None, ( -> ,null,None,null, at first process done) 
-                se = se.str.replace_many([',"', '",'], [",'", "',"]).str.replace_many([',"', '",'], [",'", "',"]) # ...","... This type cannot be replaced in the first process.
-                sql += ",".join(se.to_list())
-                sql += ";"
-            else:
-                df = to_string_all_columns(df, n_round=n_round, rep_nan=str_null, rep_inf=str_null, rep_minf=str_null, strtmp="-9999999", n_jobs=n_jobs)
-                for ndf in df.values:
-                    sql += "('" + "','".join(ndf.tolist()) + "'), "
-                sql = sql[:-2] + ";"
-                sql = sql.replace("'"+str_null+"'", "null")
-            if set_sql:
+            if method == "values":
+                self.set_sql_pages(*self.create_insert_pages(df, tblname, page_size), set_sql=set_sql)
+                self.logger.info("END")
+                return None
+            if not set_sql: self.check_status(["lock"])
+            cols      = [f"`{x}`" if x in RESERVED_WORD_MYSQL else x for x in df.columns] if self.dbinfo["dbtype"] == "mysql" else list(df.columns)
+            values    = self.iter_insert_values(df, tblname, n_round=n_round, str_null=str_null, n_jobs=n_jobs)
+            max_bytes = self.get_max_statement_bytes() if max_bytes is None else max_bytes
+            n_sql     = 0
+            for sql in self.iter_insert_sql("insert into " + tblname + " (" + ",".join(cols) + ") values ", values, max_bytes, max_rows=max_rows):
                 self.set_sql(sql)
-            else:
-                self.execute_sql(sql)
+                n_sql += 1
+            self.logger.info(f"rows: {df.shape[0]}, statements: {n_sql}, max_bytes: {max_bytes}")
+            if not set_sql and n_sql > 0: self.execute_sql()
         self.logger.info("END")
     
     def update_from_df(
         self, df: pd.DataFrame | pl.DataFrame, tblname: str, columns_set: list[str], columns_where: list[str],
-        set_sql: bool=True, n_round: int=8, str_null :str="%%null%%", n_jobs: int=1
+        set_sql: bool=True, n_round: int=8, str_null :str="%%null%%", n_jobs: int=1,
+        method: str="sql", chunksize: int=100000, page_size: int=1000
     ):
+        """
+        Params::
+            columns_set:
+                Columns which are updated.
+            columns_where:
+                Columns which specify the rows to update. ex) primary keys
+            method:
+                "sql":     one "UPDATE ... WHERE ..." statement per row.
+                "staging": df is bulk loaded into a temporary table and the rows are updated by a join per batch.
+                           PostgreSQL: COPY binary into the temporary table, then "UPDATE ... SET ... FROM tmp WHERE ...".
+                                       If a column type is not supported by COPY binary, batched inserts are used instead.
+                           MySQL:      batched inserts into the temporary table, then "UPDATE ... JOIN tmp ON ... SET ...".
+                           It's executed at once in one transaction, so set_sql, n_round, str_null and n_jobs are not used.
+            chunksize:
+                Number of rows of one batch of method="staging".
+                In MongoDB, number of documents of one bulk_write.
+            page_size:
+                Number of rows in one insert statement of method="staging" in MySQL ( and PostgreSQL without COPY binary ).
+        Note::
+            In MongoDB, the documents which match columns_where are updated by bulk_write of UpdateOne with {"$set": ...}
+            in n_jobs threads. The documents which don't match are not inserted. method is not used.
+        """
         self.logger.info("START")
+        assert isinstance(method, str) and method in ["sql", "staging"]
+        if self.dbinfo["dbtype"] == "mongo":
+            assert check_type_list(columns_set,   str)
+            assert check_type_list(columns_where, str)
+            if self.use_polars:
+                df = df.unique(subset=columns_where, keep="last", maintain_order=True)
+            else:
+                df = df.drop_duplicates(subset=columns_where, keep="last")
+            self.bulk_write_mongo(df, tblname, columns_where, update_columns=columns_set, upsert=False, chunksize=chunksize, n_jobs=n_jobs)
+            self.logger.info("END")
+            return None
+        if method == "staging":
+            self.update_from_df_staging(df, tblname, columns_set, columns_where, chunksize=chunksize, page_size=page_size)
+            self.logger.info("END")
+            return None
         if self.use_polars:
             assert isinstance(df, pl.DataFrame)
             df = df.to_pandas()
@@ -613,6 +1880,85 @@ class DBConnector:
                 self.execute_sql(sql)
         self.logger.info("END")
 
+    def update_from_df_staging(
+        self, df: pd.DataFrame | pl.DataFrame, tblname: str, columns_set: list[str], columns_where: list[str],
+        chunksize: int=100000, page_size: int=1000
+    ):
+        """
+        Set-based update through a temporary table. See update_from_df(method="staging").
+        The temporary table has the same column types as the table ( CREATE ... AS SELECT ... LIMIT 0 ) and no constraints.
+        If the same key appears more than once in df, the last row is used.
+        PostgreSQL loads it by COPY binary only if all columns are in PGCOPY_TYPES. Otherwise it's loaded by batched inserts as MySQL,
+        because the text format of iter_copy_csv converts line breaks, tabs and backslashes in strings to spaces.
+        """
+        self.logger.info("START")
+        if self.use_polars:
+            assert isinstance(df, pl.DataFrame)
+        else:
+            assert isinstance(df, pd.DataFrame)
+        assert isinstance(tblname, str)
+        assert check_type_list(columns_set,   str) and len(columns_set)   > 0
+        assert check_type_list(columns_where, str) and len(columns_where) > 0
+        assert isinstance(chunksize, int) and chunksize > 0
+        assert isinstance(page_size, int) and page_size > 0
+        if self.dbinfo["dbtype"] not in ["psgre", "mysql"]:
+            self.raise_error("update by staging table is only for PostgreSQL and MySQL", exception=CustomSQLException)
+        columns = columns_where + [x for x in columns_set if x not in columns_where]
+        if len(set(columns) - set(df.columns)) > 0:
+            self.raise_error(f"{sorted(set(columns) - set(df.columns))} columns must be added in df.", exception=CustomSQLException)
+        self.check_status(["open", "lock"])
+        if self.use_polars:
+            df = df.select(columns).unique(subset=columns_where, keep="last", maintain_order=True)
+        else:
+            df = df.loc[:, columns].drop_duplicates(subset=columns_where, keep="last")
+        tblname_tmp = "tmp_kkpsgre_" + re.sub(r"\W", "_", tblname)
+        if self.dbinfo["dbtype"] == "psgre":
+            layout_type = self.db_layout_type.get(tblname, {})
+            is_binary   = len([x for x in columns if layout_type.get(x) not in PGCOPY_TYPES]) == 0
+            sql_create  = f"CREATE TEMPORARY TABLE {tblname_tmp} AS SELECT {','.join(columns)} FROM {tblname} LIMIT 0;"
+            sql_copy    = f"COPY {tblname_tmp} ({','.join(columns)}) FROM STDIN WITH (FORMAT binary)"
+            sql_update  = (
+                f"UPDATE {tblname} SET " + ",".join([f"{x} = s.{x}" for x in columns_set]) +
+                f" FROM {tblname_tmp} AS s WHERE " + " AND ".join([f"{tblname}.{x} = s.{x}" for x in columns_where]) + ";"
+            )
+            sql_drop    = f"DROP TABLE {tblname_tmp};"
+        else:
+            __esc = lambda x: f"`{x}`" if x in RESERVED_WORD_MYSQL else x
+            is_binary   = False
+            sql_create  = f"CREATE TEMPORARY TABLE {tblname_tmp} AS SELECT {','.join([__esc(x) for x in columns])} FROM {tblname} LIMIT 0;"
+            sql_update  = (
+                f"UPDATE {tblname} AS t JOIN {tblname_tmp} AS s ON " + " AND ".join([f"t.{__esc(x)} = s.{__esc(x)}" for x in columns_where]) +
+                " SET " + ",".join([f"t.{__esc(x)} = s.{__esc(x)}" for x in columns_set]) + ";"
+            )
+            sql_drop    = f"DROP TEMPORARY TABLE {tblname_tmp};"
+        if self.con is not None:
+            self.con.autocommit = False
+            cur = self.con.cursor()
+            try:
+                cur.execute(sql_create)
+                n_rows = 0
+                for i in range(0, df.shape[0], chunksize):
+                    dfwk = df.slice(i, chunksize) if self.use_polars else df.iloc[i:i+chunksize]
+                    if is_binary:
+                        chunks = self.iter_copy_binary(dfwk, [layout_type[x] for x in columns], chunksize)
+                        self.copy_expert(cur, sql_copy, CopyStream(chunks, is_bytes=True), size=2**20)
+                    else:
+                        for x, y in zip(*self.create_insert_pages(dfwk, tblname, page_size, tblname_into=tblname_tmp)):
+                            cur.execute(x, y)
+                    cur.execute(sql_update)
+                    n_rows += cur.rowcount
+                    cur.execute(f"DELETE FROM {tblname_tmp};")
+                    self.logger.info(f"table: {tblname}, batch: {i // chunksize}, updated rows: {n_rows}")
+                cur.execute(sql_drop)
+                self.con.commit()
+                self.invalidate_cache([tblname])
+            except Exception as e:
+                self.con.rollback()
+                self.raise_error("update by staging table error !!", exception=e)
+            finally:
+                cur.close()
+        self.logger.info("END")
+
     def delete_sql(self, tblname: str, str_where: str=None, set_sql: bool=True):
         self.logger.info("START")
         assert isinstance(tblname, str)
@@ -633,5 +1979,6 @@ class DBConnector:
             filter = sql_to_mongo_filter(str_where.strip()) if str_where is not None else {}
             self.logger.info(f"table name: {tblname}, filter: {filter}")
             result = self.con.get_collection(tblname).delete_many(filter=filter)
+            self.invalidate_cache([tblname])
             self.logger.info(f"{result}")
         self.logger.info("END")
@@ -0,0 +1,565 @@
+import asyncio, re
+from collections import namedtuple
+import pandas as pd
+import polars as pl
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+try:
+    import aiomysql
+except ImportError:
+    aiomysql = None
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+except ImportError:
+    AsyncIOMotorClient = None
+
+# local package
+from kkpsgre.connector import DBConnector, CustomSQLException, DBTYPES, RESERVED_WORD_MYSQL
+from kkpsgre.util.com import check_type_list, strfind, is_valid_ipv4, parse_connection_string
+from kkpsgre.util.sql import convert_placeholders, sql_to_mongo_filter, split_sql_statements
+from kkpsgre.util.cache import normalize_sql, get_write_tables
+
+
+__all__ = [
+    "AsyncDBConnector",
+]
+
+
+ASYNC_DRIVERS = {
+    "psgre": ("asyncpg",  lambda: asyncpg),
+    "mysql": ("aiomysql", lambda: aiomysql),
+    "mongo": ("motor",    lambda: AsyncIOMotorClient),
+}
+REGEX_RETURN_ROWS = re.compile(r"^\s*(WITH|SELECT)\s+|\sRETURNING\s", flags=re.IGNORECASE) # Only these statements are prepared to fetch the rows in execute_sql().
+Column = namedtuple("Column", ["name", "type_code"]) # The same interface as psycopg2's cursor.description for asyncpg's attributes.
+
+
+async def iter_async(chunks, encoding: str="utf8"):
+    """
+    Pull the chunks of a blocking generator in a worker thread, so that the event loop isn't blocked by the serialisation.
+    If encoding is set, str chunks are encoded into bytes.
+    """
+    chunks = iter(chunks)
+    while True:
+        chunk = await asyncio.to_thread(next, chunks, None)
+        if chunk is None: break
+        yield chunk.encode(encoding) if encoding is not None and isinstance(chunk, str) else chunk
+
+
+class AsyncDBConnector(DBConnector):
+    def __init__(
+            self,
+            host: str,
+            port: int=None,
+            dbname: str=None,
+            user: str=None,
+            password: str=None,
+            dbtype: str="psgre",
+            max_disp_len: int=100,
+            kwargs_db: dict={},
+            is_read_layout: bool=True,
+            use_polars: bool = False,
+            cache_max_bytes: int=None,
+            cache_ttl: float=None,
+            prepared_cache_size: int=None,
+            pool_size: int=10,
+            **kwargs
+        ):
+        """
+        asyncio version of DBConnector on asyncpg ( PostgreSQL ), aiomysql ( MySQL ) and motor ( MongoDB ).
+        The connection pool is opened by "await connect()" or "async with". Each query borrows one connection from the pool,
+        so the queries of different tasks run concurrently in one process.
+        The layout caching, the sql creation and the dataframe conversion are the same as DBConnector.
+        Params::
+            prepared_cache_size:
+                PostgreSQL: statement_cache_size of each connection of asyncpg. The queries are always prepared by asyncpg.
+                MySQL and MongoDB: not used.
+            pool_size:
+                Maximum number of connections of the pool. maxPoolSize in MongoDB.
+            kwargs_db:
+                Keyword arguments of asyncpg.create_pool(), aiomysql.create_pool() or AsyncIOMotorClient().
+        Usage::
+            >>> async with AsyncDBConnector("127.0.0.1", port=5432, dbname="testdb", user="postgres", password="postgres", dbtype="psgre") as DB:
+            ...     df1, df2 = await asyncio.gather(DB.select_sql("SELECT * FROM test_table;"), DB.select_sql("SELECT * FROM test_table2;"))
+        Note::
+            select_sql, insert_from_df, upsert_from_df, update_from_df, bulk_write_mongo, execute_copy_from_df, delete_sql and execute_sql are coroutines.
+            The other methods of DBConnector which create sql can be used with set_sql=True, and then "await execute_sql()".
+        """
+        assert isinstance(host, str)
+        if is_valid_ipv4(host):
+            assert isinstance(port, int)
+            assert isinstance(dbname, str)
+            assert isinstance(user, str)
+            assert isinstance(password, str)
+        else:
+            dictwk   = parse_connection_string(host)
+            host     = dictwk["host"]
+            port     = int(dictwk["port"])
+            dbname   = dictwk["dbname"]
+            user     = dictwk["user"]
+            password = dictwk["password"]
+        assert isinstance(dbtype, str) and dbtype in DBTYPES
+        assert prepared_cache_size is None or (isinstance(prepared_cache_size, int) and prepared_cache_size > 0)
+        assert isinstance(pool_size, int) and pool_size > 0
+        name, module = ASYNC_DRIVERS[dbtype]
+        if module() is None:
+            raise ImportError(f"dbtype: {dbtype} needs {name}. pip install {name}")
+        super().__init__(
+            None, dbtype=dbtype, max_disp_len=max_disp_len, is_read_layout=is_read_layout, use_polars=use_polars,
+            cache_max_bytes=cache_max_bytes, cache_ttl=cache_ttl, **kwargs
+        )
+        self.dbinfo.update({"host": host, "port": port, "dbname": dbname, "user": user})
+        self.__password  = password
+        self.__kwargs_db = kwargs_db
+        self.driver      = name
+        self.pool        = None # asyncpg.Pool, aiomysql.Pool or motor's database
+        self.pool_size   = pool_size
+        self.prepared_size = prepared_cache_size
+
+    async def __aenter__(self) -> "AsyncDBConnector":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def connect(self) -> "AsyncDBConnector":
+        self.logger.info("START")
+        if self.pool is not None:
+            self.logger.warning("connection is already established.")
+            self.logger.info("END")
+            return self
+        host, port, dbname, user = self.dbinfo["host"], self.dbinfo["port"], self.dbinfo["dbname"], self.dbinfo["user"]
+        if   self.dbinfo["dbtype"] == "psgre":
+            kwargs_db = {"statement_cache_size": self.prepared_size} if self.prepared_size is not None else {}
+            self.pool = await asyncpg.create_pool(
+                host=host, port=port, database=dbname, user=user, password=self.__password,
+                min_size=1, max_size=self.pool_size, **(kwargs_db | self.__kwargs_db)
+            )
+        elif self.dbinfo["dbtype"] == "mysql":
+            self.pool = await aiomysql.create_pool(
+                host=host, port=port, db=dbname, user=user, password=self.__password,
+                minsize=1, maxsize=self.pool_size, autocommit=True, **self.__kwargs_db
+            ) # Autocommit ON because even references are locked in principle. execute_sql() begins the transaction.
+        elif self.dbinfo["dbtype"] == "mongo":
+            client    = AsyncIOMotorClient(f"mongodb://{user}:{self.__password}@{host}:{port}/?authSource=admin", maxPoolSize=self.pool_size, **self.__kwargs_db)
+            self.pool = client[dbname]
+        self.logger.info(f'connection is established. {self.dbinfo}')
+        await self.initialize_async()
+        self.logger.info("END")
+        return self
+
+    async def close(self):
+        if self.pool is None: return None
+        if   self.dbinfo["dbtype"] == "psgre":
+            await self.pool.close()
+        elif self.dbinfo["dbtype"] == "mysql":
+            self.pool.close()
+            await self.pool.wait_closed()
+        elif self.dbinfo["dbtype"] == "mongo":
+            self.pool.client.close()
+        self.pool = None
+        self.logger.info("DB connection close successfully.")
+
+    async def initialize_async(self):
+        """ Async version of initialize(). The table layout is read with the pool. """
+        self.logger.info("START")
+        self.initialize()
+        if self.pool is not None and self.is_read_layout:
+            if self.dbinfo["dbtype"] in ["psgre", "mysql"]:
+                self.max_packet = None
+                if self.dbinfo["dbtype"] == "mysql":
+                    self.max_packet = int((await self.fetch_rows("SELECT @@max_allowed_packet;"))[0][0][0])
+                df_layout, df_constraint = await asyncio.gather(
+                    self.select_sql(self.sql_table_layout(), ret_polars=False),
+                    self.select_sql(self.sql_table_constraint(), ret_polars=False),
+                )
+                self.set_table_layout(df_layout, df_constraint)
+            elif self.dbinfo["dbtype"] in ["mongo"]:
+                tblnames = [x for x in await self.pool.list_collection_names() if x.find("system") != 0]
+                docs     = await asyncio.gather(*[self.pool[x].find_one() for x in tblnames])
+                self.layout_store.set_all({x: {"layout": list(y.keys()) if y is not None else [], "constraint": None} for x, y in zip(tblnames, docs)})
+        self.logger.info("END")
+
+    def clone(self, is_read_layout: bool=False, **kwargs) -> "AsyncDBConnector":
+        """ Create a new instance which has the same connection information. It's not connected yet. """
+        return AsyncDBConnector(
+            self.dbinfo["host"], port=self.dbinfo["port"], dbname=self.dbinfo["dbname"], user=self.dbinfo["user"],
+            password=self.__password, dbtype=self.dbinfo["dbtype"], max_disp_len=self.max_disp_len,
+            kwargs_db=self.__kwargs_db, is_read_layout=is_read_layout, use_polars=self.use_polars,
+            prepared_cache_size=self.prepared_size, pool_size=self.pool_size, **({"numeric_as_float": self.numeric_as_float} | kwargs)
+        )
+
+    def is_closed(self):
+        return self.pool is None
+
+    def check_status(self, check_list: list[str]=["open"]):
+        assert check_type_list(check_list, str)
+        for x in check_list: assert x in ["open", "lock", "esql"]
+        if "open" in check_list and self.is_closed():
+            self.raise_error("connection is not established. await connect() at first.", exception=CustomSQLException)
+        if "lock" in check_list and len(self.sql_list) > 0:
+            self.raise_error("sql_list is not empty. you can do after ExecuteSQL().", exception=CustomSQLException)
+        if "esql" in check_list and len(self.sql_list) == 0:
+            self.raise_error("sql_list is empty. you set executable sql.", exception=CustomSQLException)
+
+    def set_sql_pages(self, list_sql: list[str], list_params: list[tuple], set_sql: bool=True):
+        if not set_sql:
+            self.raise_error("set_sql=False is not supported. Use set_sql=True and then await execute_sql().", exception=CustomSQLException)
+        super().set_sql_pages(list_sql, list_params, set_sql=True)
+
+    async def fetch_rows(self, sql: str, params: tuple | list | dict=None) -> (list[tuple], list):
+        """
+        PostgreSQL and MySQL. Run one query with a connection of the pool.
+        Return::
+            (rows, description) description has the same interface as the cursor of DBConnector.
+        """
+        if self.dbinfo["dbtype"] == "psgre":
+            args = []
+            if params is not None:
+                sql, keys = convert_placeholders(sql, "numeric")
+                args = [params[x] for x in keys]
+            async with self.pool.acquire() as con:
+                stmt = await con.prepare(sql)
+                rows = await stmt.fetch(*args)
+                description = [Column(x.name, x.type.oid) for x in stmt.get_attributes()]
+            return [tuple(x) for x in rows], description
+        else:
+            async with self.pool.acquire() as con:
+                async with con.cursor() as cur:
+                    await cur.execute(sql, params)
+                    rows = await cur.fetchall()
+                    description = cur.description
+            return list(rows), description
+
+    async def select_sql(self, sql: str, ret_polars: bool=None, use_arrow: bool=False, params: tuple | list | dict=None) -> pd.DataFrame | pl.DataFrame:
+        """
+        See DBConnector.select_sql. The decoding of the rows runs in a worker thread.
+        """
+        self.logger.info("START")
+        assert isinstance(sql, str)
+        assert ret_polars is None or isinstance(ret_polars, bool)
+        assert isinstance(use_arrow, bool)
+        assert params is None or isinstance(params, (tuple, list, dict))
+        self.check_status(["open","lock"])
+        ret_polars = self.use_polars if ret_polars is None else ret_polars
+        sql = self.check_select_sql(sql)
+        if self.cache is not None:
+            cache_key = (normalize_sql(sql), repr(params), ret_polars, use_arrow)
+            df = self.cache.get(cache_key)
+            if df is not None:
+                self.logger.info("END (cache hit)")
+                return df if ret_polars else df.copy()
+        if self.dbinfo["dbtype"] in ["mongo"]:
+            if params is not None:
+                self.raise_error("params is only for PostgreSQL and MySQL", exception=CustomSQLException)
+            cursor, str_from, str_select, is_aggregate = self.open_cursor_mongo(sql, is_raw=use_arrow, db=self.pool)
+            data = [x async for x in cursor]
+            df   = await asyncio.to_thread(self.cursor_to_df_mongo, data, str_from, str_select, is_aggregate, ret_polars, use_arrow)
+        else:
+            rows, description = await self.fetch_rows(sql, params=params)
+            if use_arrow:
+                df = await asyncio.to_thread(self.rows_to_df_arrow, rows, description, ret_polars, sql=sql)
+            else:
+                df = await asyncio.to_thread(self.rows_to_df, rows, description, ret_polars, sql=sql)
+        df = self.postprocess_df(df, ret_polars)
+        if self.cache is not None:
+            self.cache.set(cache_key, sql, df if ret_polars else df.copy())
+        self.logger.info("END")
+        return df
+
+    async def execute_sql(self, sql: str=None, params: tuple | list | dict=None):
+        """
+        Execute the contents of sql_list in one transaction. See DBConnector.execute_sql.
+        sql_list is taken out at the beginning, so the sql set by the other tasks after that is not included.
+        Return::
+            The rows of the last statement. None if it doesn't return rows.
+        """
+        self.logger.info("START")
+        assert sql is None or isinstance(sql, str)
+        assert params is None or sql is not None
+        if self.dbinfo["dbtype"] in ["mongo"]:
+            self.logger.warning("Execute function is ignored in case dbtype is 'MongoDB'")
+            self.logger.info("END")
+            return None
+        self.check_status(["open"])
+        if sql is not None:
+            self.check_status(["lock"])
+            self.set_sql(sql, params=params)
+        self.check_status(["esql"])
+        list_sql, list_params = self.sql_list, self.params_list
+        self.sql_list    = []
+        self.params_list = []
+        results = await self.execute_sql_list(list_sql, list_params)
+        self.logger.info("END")
+        return results
+
+    async def execute_sql_list(self, list_sql: list[str], list_params: list[tuple | list | dict]):
+        """
+        Execute the statements in one transaction without sql_list. It's used when the statements must not be mixed with the sql set by the other tasks.
+        Return::
+            The rows of the last statement. None if it doesn't return rows.
+        """
+        assert check_type_list(list_sql, str)
+        assert isinstance(list_params, list) and len(list_params) == len(list_sql)
+        results = None
+        try:
+            if self.dbinfo["dbtype"] == "psgre":
+                async with self.pool.acquire() as con:
+                    async with con.transaction():
+                        for i, (x, params) in enumerate(zip(list_sql, list_params)):
+                            self.logger.info(self.display_sql(x))
+                            args = []
+                            if params is not None:
+                                x, keys = convert_placeholders(x, "numeric")
+                                args = [params[y] for y in keys]
+                            listwk = split_sql_statements(x) if params is None else [x]
+                            if i < len(list_sql) - 1 or listwk is None or len(listwk) != 1 or not REGEX_RETURN_ROWS.search(x):
+                                await con.execute(x, *args) # Without args, it's the simple query protocol and it can have several statements.
+                                results = None
+                            else:
+                                stmt    = await con.prepare(x)
+                                rows    = await stmt.fetch(*args)
+                                results = [tuple(y) for y in rows] if len(stmt.get_attributes()) > 0 else None
+            else:
+                async with self.pool.acquire() as con:
+                    await con.begin()
+                    try:
+                        async with con.cursor() as cur:
+                            for x, params in zip(list_sql, list_params):
+                                self.logger.info(self.display_sql(x))
+                                await cur.execute(x, params)
+                            results = await cur.fetchall() if cur.description is not None else None
+                        await con.commit()
+                    except Exception:
+                        await con.rollback()
+                        raise
+                results = list(results) if results is not None else None
+            for x in list_sql: self.invalidate_cache(get_write_tables(x))
+        except Exception as e:
+            self.raise_error(f"SQL ERROR: {e.args}", exception=e)
+        return results
+
+    async def insert_from_df(
+        self, df: pd.DataFrame | pl.DataFrame, tblname: str,
+        set_sql: bool=True, n_round: int=8, str_null :str="%%null%%", is_select: bool=False, n_jobs: int=1,
+        method: str="sql", page_size: int=1000, max_bytes: int=None, max_rows: int=None,
+        chunksize: int=10000, sort_by: str | list[str]=None
+    ):
+        """
+        See DBConnector.insert_from_df. The statements are created in a worker thread.
+        Note::
+            If set_sql=False, the statements are executed at once in one transaction.
+            In MongoDB, n_jobs chunks are inserted at the same time.
+            In method="values" of PostgreSQL, asyncpg doesn't cast the parameters, so the dtypes must match the table. ex) datetime for timestamp
+        """
+        self.logger.info("START")
+        assert isinstance(method, str) and method in ["sql", "values"]
+        assert isinstance(set_sql, bool)
+        if self.dbinfo["dbtype"] in ["mongo"]:
+            await self.insert_many_mongo(df, tblname, chunksize=chunksize, n_jobs=n_jobs, sort_by=sort_by)
+        elif set_sql:
+            super().insert_from_df(
+                df, tblname, set_sql=True, n_round=n_round, str_null=str_null, is_select=is_select, n_jobs=n_jobs,
+                method=method, page_size=page_size, max_bytes=max_bytes, max_rows=max_rows
+            )
+        else:
+            self.check_status(["open", "lock"])
+            if self.use_polars:
+                assert isinstance(df, pl.DataFrame)
+            else:
+                assert isinstance(df, pd.DataFrame)
+            if is_select:
+                columns = self.db_layout.get(tblname) if self.db_layout.get(tblname) is not None else []
+                if self.use_polars:
+                    df = df.select([x for x in df.columns if x in columns])
+                else:
+                    df = df.loc[:, df.columns.isin(columns)].copy()
+            if method == "values":
+                list_sql, list_params = await asyncio.to_thread(self.create_insert_pages, df, tblname, page_size)
+                if len(list_sql) > 0: await self.execute_sql_list(list_sql, list_params)
+            else:
+                cols      = [f"`{x}`" if x in RESERVED_WORD_MYSQL else x for x in df.columns] if self.dbinfo["dbtype"] == "mysql" else list(df.columns)
+                values    = self.iter_insert_values(df, tblname, n_round=n_round, str_null=str_null, n_jobs=n_jobs)
+                max_bytes = self.get_max_statement_bytes() if max_bytes is None else max_bytes
+                list_sql  = [sql async for sql in iter_async(self.iter_insert_sql("insert into " + tblname + " (" + ",".join(cols) + ") values ", values, max_bytes, max_rows=max_rows), encoding=None)]
+                self.logger.info(f"rows: {df.shape[0]}, statements: {len(list_sql)}, max_bytes: {max_bytes}")
+                if len(list_sql) > 0: await self.execute_sql_list(list_sql, [None] * len(list_sql))
+        self.logger.info("END")
+
+    async def insert_many_mongo(
+        self, df: pd.DataFrame | pl.DataFrame, tblname: str, chunksize: int=10000, n_jobs: int=1, sort_by: str | list[str]=None
+    ) -> int:
+        """
+        See DBConnector.insert_many_mongo. At most n_jobs insert_many are in flight, and the documents are built in worker threads.
+        """
+        assert isinstance(tblname, str)
+        assert isinstance(chunksize, int) and chunksize > 0
+        assert isinstance(n_jobs, int) and n_jobs > 0
+        if isinstance(sort_by, str): sort_by = [sort_by, ]
+        assert sort_by is None or check_type_list(sort_by, str)
+        self.check_status(["open"])
+        if sort_by is not None:
+            df = df.sort(sort_by, maintain_order=True) if isinstance(df, pl.DataFrame) else df.sort_values(sort_by, kind="stable")
+        collection = self.pool.get_collection(tblname)
+        semaphore  = asyncio.Semaphore(n_jobs)
+        async def __work(i: int):
+            async with semaphore:
+                dfwk   = df.slice(i, chunksize) if isinstance(df, pl.DataFrame) else df.iloc[i:i+chunksize]
+                docs   = await asyncio.to_thread(self.df_to_docs, dfwk)
+                result = await collection.insert_many(docs, ordered=False)
+                return len(result.inserted_ids)
+        n_inserted = sum(await asyncio.gather(*[__work(i) for i in range(0, df.shape[0], chunksize)]))
+        self.invalidate_cache([tblname])
+        self.logger.info(f"collection: {tblname}, inserted: {n_inserted}, chunks: {(df.shape[0] + chunksize - 1) // chunksize}, n_jobs: {n_jobs}")
+        return n_inserted
+
+    async def bulk_write_mongo(
+        self, df: pd.DataFrame | pl.DataFrame, tblname: str, keys: list[str], update_columns: list[str]=None,
+        upsert: bool=True, do_nothing: bool=False, chunksize: int=10000, n_jobs: int=1
+    ) -> dict:
+        """
+        See DBConnector.bulk_write_mongo. At most n_jobs bulk_write are in flight, and the requests are built in worker threads.
+        """
+        assert check_type_list(keys, str) and len(keys) > 0
+        assert update_columns is None or check_type_list(update_columns, str)
+        assert isinstance(upsert, bool)
+        assert isinstance(do_nothing, bool)
+        assert isinstance(chunksize, int) and chunksize > 0
+        assert isinstance(n_jobs, int) and n_jobs > 0
+        self.check_status(["open"])
+        if len(set(keys) - set(df.columns)) > 0:
+            self.raise_error(f"{sorted(set(keys) - set(df.columns))} columns must be added in df.", exception=CustomSQLException)
+        if update_columns is not None and len(set(update_columns) - set(df.columns)) > 0:
+            self.raise_error(f"update_columns: {sorted(set(update_columns) - set(df.columns))} are not in df.", exception=CustomSQLException)
+        collection = self.pool.get_collection(tblname)
+        semaphore  = asyncio.Semaphore(n_jobs)
+        def __requests(dfwk: pd.DataFrame | pl.DataFrame):
+            return self.create_bulk_requests_mongo(self.df_to_docs(dfwk), keys, update_columns=update_columns, upsert=upsert, do_nothing=do_nothing)
+        async def __work(i: int):
+            async with semaphore:
+                dfwk   = df.slice(i, chunksize) if isinstance(df, pl.DataFrame) else df.iloc[i:i+chunksize]
+                result = await collection.bulk_write(await asyncio.to_thread(__requests, dfwk), ordered=False)
+                return (result.matched_count, result.modified_count, result.upserted_count)
+        results = await asyncio.gather(*[__work(i) for i in range(0, df.shape[0], chunksize)])
+        dictwk  = {x: sum([y[i] for y in results]) for i, x in enumerate(["matched", "modified", "upserted"])}
+        self.invalidate_cache([tblname])
+        self.logger.info(f"collection: {tblname}, result: {dictwk}, chunks: {len(results)}, n_jobs: {n_jobs}")
+        return dictwk
+
+    async def upsert_from_df(
+        self, df: pd.DataFrame | pl.DataFrame, tblname: str, update_columns: list[str]=None, do_nothing: bool=False,
+        set_sql: bool=True, page_size: int=1000, keys: list[str]=None, chunksize: int=10000, n_jobs: int=1
+    ):
+        """
+        See DBConnector.upsert_from_df. In PostgreSQL and MySQL, only set_sql=True is supported, and then "await execute_sql()".
+        """
+        self.logger.info("START")
+        if self.dbinfo["dbtype"] == "mongo":
+            assert isinstance(tblname, str)
+            assert isinstance(do_nothing, bool)
+            assert keys is None or check_type_list(keys, str)
+            keys = self.db_constraint.get(tblname) if keys is None else keys
+            if keys is None or len(keys) == 0:
+                self.raise_error(f"table: {tblname} doesn't have primary keys in db_constraint.", exception=CustomSQLException)
+            if self.use_polars:
+                df = df.unique(subset=keys, keep="last", maintain_order=True)
+            else:
+                df = df.drop_duplicates(subset=keys, keep="last")
+            await self.bulk_write_mongo(df, tblname, keys, update_columns=update_columns, upsert=True, do_nothing=do_nothing, chunksize=chunksize, n_jobs=n_jobs)
+        else:
+            super().upsert_from_df(df, tblname, update_columns=update_columns, do_nothing=do_nothing, set_sql=set_sql, page_size=page_size, keys=keys)
+        self.logger.info("END")
+
+    async def update_from_df(
+        self, df: pd.DataFrame | pl.DataFrame, tblname: str, columns_set: list[str], columns_where: list[str],
+        set_sql: bool=True, n_round: int=8, str_null :str="%%null%%", n_jobs: int=1,
+        method: str="sql", chunksize: int=100000, page_size: int=1000
+    ):
+        """
+        See DBConnector.update_from_df. In PostgreSQL and MySQL, only method="sql" with set_sql=True is supported, and then "await execute_sql()".
+        """
+        self.logger.info("START")
+        if self.dbinfo["dbtype"] == "mongo":
+            assert isinstance(tblname, str)
+            assert check_type_list(columns_set,   str)
+            assert check_type_list(columns_where, str)
+            if self.use_polars:
+                df = df.unique(subset=columns_where, keep="last", maintain_order=True)
+            else:
+                df = df.drop_duplicates(subset=columns_where, keep="last")
+            await self.bulk_write_mongo(df, tblname, columns_where, update_columns=columns_set, upsert=False, chunksize=chunksize, n_jobs=n_jobs)
+        elif set_sql and method == "sql":
+            super().update_from_df(df, tblname, columns_set, columns_where, set_sql=True, n_round=n_round, str_null=str_null, n_jobs=n_jobs, method=method)
+        else:
+            self.raise_error(f"set_sql: {set_sql}, method: {method} is not supported. Use set_sql=True and method=\"sql\", and then await execute_sql().", exception=CustomSQLException)
+        self.logger.info("END")
+
+    async def execute_copy_from_df(
+        self, df: pd.DataFrame | pl.DataFrame, tblname: str, system_colname_list: list[str] = ["sys_updated"],
+        filename: str=None, encoding: str="utf8", n_round: int=8,
+        str_null :str="%%null%%", check_columns: bool=True, n_jobs: int=1, format: str="csv", chunksize: int=100000
+    ):
+        """
+        See DBConnector.execute_copy_from_df. The chunks are serialised in a worker thread and streamed by asyncpg's copy_to_table().
+        """
+        self.logger.info("START")
+        assert isinstance(format, str) and format in ["csv", "binary"]
+        assert isinstance(chunksize, int) and chunksize > 0
+        if self.dbinfo["dbtype"] not in ["psgre"]:
+            self.raise_error("COPY command is only for PostgreSQL", exception=CustomSQLException)
+        if self.use_polars:
+            assert isinstance(df, pl.DataFrame)
+        else:
+            assert isinstance(df, pd.DataFrame)
+        assert isinstance(tblname, str)
+        assert check_type_list(system_colname_list, str)
+        assert isinstance(check_columns, bool)
+        self.check_status(["open", "lock"])
+        df = self.select_table_columns(df, tblname, system_colname_list, check_columns)
+        if format == "binary":
+            chunks  = self.iter_copy_binary(df, [self.db_layout_type[tblname][x] for x in df.columns], chunksize)
+            options = {"format": "binary"}
+        else:
+            if self.use_polars:
+                chunks = self.iter_copy_csv_polars(df, tblname, chunksize, n_round=n_round, str_null=str_null)
+            else:
+                chunks = self.iter_copy_csv(df, tblname, chunksize, n_round=n_round, str_null=str_null, n_jobs=n_jobs)
+            options = {"format": "text", "delimiter": "\t", "null": str_null}
+        self.logger.info(f"start to copy from stream. table: {tblname}, format: {format}")
+        try:
+            async with self.pool.acquire() as con:
+                result = await con.copy_to_table(tblname, source=iter_async(chunks, encoding="utf8"), columns=list(df.columns), **options)
+            self.invalidate_cache([tblname])
+            self.logger.info(f"finish to copy from stream. table: {tblname}, result: {result}")
+        except Exception as e:
+            self.raise_error(f"{format} copy error !!", exception=e)
+        self.logger.info("END")
+        return df
+
+    async def delete_sql(self, tblname: str, str_where: str=None, set_sql: bool=True):
+        self.logger.info("START")
+        assert isinstance(tblname, str)
+        assert str_where is None or isinstance(str_where, str)
+        assert isinstance(set_sql, bool)
+        if isinstance(str_where, str):
+            assert strfind(r"^where ", str_where.lower()) == False
+        if self.dbinfo["dbtype"] in ["psgre", "mysql"]:
+            sql = f"DELETE FROM {tblname}"
+            if str_where is not None:
+                sql += f" WHERE {str_where}"
+            sql += ";"
+            if set_sql:
+                self.set_sql(sql)
+            else:
+                await self.execute_sql(sql)
+        elif self.dbinfo["dbtype"] in ["mongo"]:
+            self.check_status(["open"])
+            filter = sql_to_mongo_filter(str_where.strip()) if str_where is not None else {}
+            self.logger.info(f"table name: {tblname}, filter: {filter}")
+            result = await self.pool.get_collection(tblname).delete_many(filter=filter)
+            self.invalidate_cache([tblname])
+            self.logger.info(f"{result}")
+        self.logger.info("END")
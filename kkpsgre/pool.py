@@ -0,0 +1,181 @@
+import datetime, time, threading, contextlib
+# local package
+from kkpsgre.connector import DBConnector, CustomSQLException
+from kkpsgre.util.cache import QueryCache
+from kklogger import set_logger
+LOGNAME = __name__
+
+
+__all__ = [
+    "DBConnectorPool",
+]
+
+
+class DBConnectorPool:
+    def __init__(
+            self,
+            host: str,
+            port: int=None,
+            dbname: str=None,
+            user: str=None,
+            password: str=None,
+            dbtype: str="psgre",
+            min_size: int=1,
+            max_size: int=10,
+            timeout: float=30.0,
+            max_disp_len: int=100,
+            kwargs_db: dict={},
+            use_polars: bool=False,
+            cache_max_bytes: int=None,
+            cache_ttl: float=None,
+            **kwargs
+        ):
+        """
+        Thread-safe pool of DBConnector. Each connection has its own sql_list,
+        and all connections share the layout store ( db_layout, db_layout_type, db_constraint ) and the select cache.
+        The layout of a table is read by the connection which accesses it first.
+        Params::
+            min_size:
+                Number of connections which are opened at first and kept.
+            max_size:
+                Maximum number of connections. If all of them are checked out, connection() waits for one to be returned.
+            timeout:
+                Maximum waiting time of connection() [sec]. If None, it waits forever.
+            cache_max_bytes, cache_ttl:
+                Cache of select results shared by all connections. See DBConnector.
+            kwargs:
+                The other arguments of DBConnector. ex) driver="psycopg", logfilepath="..."
+        Usage::
+            >>> pool = DBConnectorPool("127.0.0.1", port=5432, dbname="testdb", user="postgres", password="postgres", dbtype="psgre", max_size=4)
+            >>> with pool.connection() as DB:
+            ...     df = DB.select_sql("SELECT * FROM test_table;")
+        """
+        assert isinstance(min_size, int) and min_size >= 1
+        assert isinstance(max_size, int) and max_size >= min_size
+        assert timeout is None or (isinstance(timeout, (int, float)) and timeout > 0)
+        self.logger    = set_logger(f"{LOGNAME}.{self.__class__.__name__}.{datetime.datetime.now().timestamp()}", **{x: y for x, y in kwargs.items() if x in ["logfilepath", "log_level", "is_newlogfile"]})
+        self.logger.info("START")
+        self.min_size  = min_size
+        self.max_size  = max_size
+        self.timeout   = timeout
+        self.cache     = QueryCache(cache_max_bytes, ttl=cache_ttl) if cache_max_bytes is not None else None
+        self.condition = threading.Condition()
+        self.idle      = [] # connections which can be checked out. The last one is used first.
+        self.n_open    = 0  # number of the connections which are idle or checked out.
+        self.is_closed = False
+        self.base      = DBConnector(
+            host, port=port, dbname=dbname, user=user, password=password, dbtype=dbtype, max_disp_len=max_disp_len,
+            kwargs_db=kwargs_db, is_read_layout=True, use_polars=use_polars, **kwargs
+        ) # This connection is the first connection of the pool.
+        self.kwargs    = {x: y for x, y in kwargs.items() if x not in ["driver", "is_newlogfile"]} # driver is passed by clone(). The log file is created once.
+        self.dbinfo    = self.base.dbinfo
+        self.layout_store = self.base.layout_store
+        self.release(self.__share(self.base), is_new=True)
+        for _ in range(min_size - 1):
+            self.release(self.open(), is_new=True)
+        self.logger.info("END")
+
+    def __share(self, DB: DBConnector) -> DBConnector:
+        DB.set_layout_store(self.layout_store, is_lazy=True)
+        DB.cache = self.cache
+        return DB
+
+    def open(self) -> DBConnector:
+        """ Open a new connection which shares the layout and the cache. It's not counted until release( ..., is_new=True ). """
+        return self.__share(self.base.clone(is_read_layout=False, **self.kwargs))
+
+    def acquire(self, timeout: float=None) -> DBConnector:
+        """
+        Check out one connection. It must be returned by release(). connection() is the context manager version.
+        Params::
+            timeout:
+                If None, the timeout of the pool.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        time_ed = (time.monotonic() + timeout) if timeout is not None else None
+        with self.condition:
+            while True:
+                if self.is_closed:
+                    self.logger.raise_error("pool is closed.", CustomSQLException)
+                if len(self.idle) > 0:
+                    return self.idle.pop()
+                if self.n_open < self.max_size:
+                    self.n_open += 1
+                    break
+                time_wait = (time_ed - time.monotonic()) if time_ed is not None else None
+                if time_wait is not None and time_wait <= 0:
+                    self.logger.raise_error(f"no connection is returned in {timeout} [sec]. max_size: {self.max_size}", TimeoutError)
+                self.condition.wait(timeout=time_wait)
+        try:
+            DB = self.open() # The slot is reserved above, so a new connection is opened out of the lock.
+        except Exception:
+            with self.condition:
+                self.n_open -= 1
+                self.condition.notify()
+            raise
+        self.logger.info(f"new connection is opened. n_open: {self.n_open}")
+        return DB
+
+    def release(self, DB: DBConnector, is_new: bool=False):
+        """
+        Return the connection to the pool. If sql_list remains, it's discarded.
+        If the connection is closed ( ex. after raise_error ) or the pool is closed, it's not reused.
+        """
+        assert isinstance(DB, DBConnector)
+        if len(DB.sql_list) > 0:
+            self.logger.warning(f"sql_list is not executed and is discarded. n_sql: {len(DB.sql_list)}")
+            DB.sql_list    = []
+            DB.params_list = []
+        is_alive = DB.con is not None and DB.is_closed() == False
+        self.__share(DB)
+        with self.condition:
+            if is_new: self.n_open += 1
+            if is_alive and not self.is_closed:
+                self.idle.append(DB)
+            else:
+                self.n_open -= 1
+            self.condition.notify()
+        if not is_alive:
+            self.logger.warning(f"closed connection is removed from the pool. n_open: {self.n_open}")
+        elif self.is_closed:
+            DB.__del__()
+
+    @contextlib.contextmanager
+    def connection(self, timeout: float=None):
+        DB = self.acquire(timeout=timeout)
+        try:
+            yield DB
+        finally:
+            self.release(DB)
+
+    def reload_layout(self, tblname: str=None):
+        """
+        Read the table layout again. It's shared by all connections, and the decode schemas built from the old layout are dropped with it.
+        Params::
+            tblname:
+                If None, all tables are forgotten and each table is read again on the next access.
+        """
+        self.logger.info("START")
+        if tblname is None:
+            self.layout_store.refresh()
+        else:
+            with self.connection() as DB:
+                DB.refresh(tblname)
+        self.logger.info("END")
+
+    def cache_info(self) -> dict | None:
+        return self.cache.info() if self.cache is not None else None
+
+    def info(self) -> dict:
+        with self.condition:
+            return {"n_open": self.n_open, "n_idle": len(self.idle), "min_size": self.min_size, "max_size": self.max_size}
+
+    def close(self):
+        """ Close the idle connections. The checked out connections are closed when they're returned. """
+        with self.condition:
+            self.is_closed = True
+            listwk, self.idle = self.idle, []
+            self.n_open -= len(listwk)
+            self.condition.notify_all()
+        for DB in listwk: DB.__del__()
+        self.logger.info("pool is closed.")
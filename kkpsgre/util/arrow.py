@@ -0,0 +1,248 @@
+import io
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import polars as pl
+import bson
+from mysql.connector.constants import FieldType
+# local package
+from kkpsgre.util.com import check_type_list
+
+
+__all__ = [
+    "PSGRE_OID_TO_ARROW",
+    "MYSQL_FIELD_TO_ARROW",
+    "LAYOUT_TYPE_TO_ARROW",
+    "PSGRE_OID_NUMERIC",
+    "MYSQL_FIELD_NUMERIC",
+    "LAYOUT_TYPE_NUMERIC",
+    "get_arrow_type_from_cursor",
+    "get_arrow_type_from_layout",
+    "arrow_types_to_polars",
+    "to_arrow_array",
+    "rows_to_arrow",
+    "read_psgre_csv",
+    "docs_to_arrow",
+    "batched_docs_to_arrow",
+]
+
+
+# https://github.com/postgres/postgres/blob/master/src/include/catalog/pg_type.dat
+PSGRE_OID_TO_ARROW = {
+    16:   pa.bool_(),                    # bool
+    20:   pa.int64(),                    # int8
+    21:   pa.int16(),                    # int2
+    23:   pa.int32(),                    # int4
+    25:   pa.string(),                   # text
+    700:  pa.float32(),                  # float4
+    701:  pa.float64(),                  # float8
+    1042: pa.string(),                   # bpchar
+    1043: pa.string(),                   # varchar
+    1082: pa.date32(),                   # date
+    1114: pa.timestamp("us"),            # timestamp
+    1184: pa.timestamp("us", tz="UTC"),  # timestamp with time zone
+    1700: pa.float64(),                  # numeric ( Decimal -> float64, only if numeric_as_float=True )
+}
+MYSQL_FIELD_TO_ARROW = {
+    FieldType.TINY:       pa.int8(),
+    FieldType.SHORT:      pa.int16(),
+    FieldType.INT24:      pa.int32(),
+    FieldType.LONG:       pa.int32(),
+    FieldType.LONGLONG:   pa.int64(),
+    FieldType.FLOAT:      pa.float32(),
+    FieldType.DOUBLE:     pa.float64(),
+    FieldType.DECIMAL:    pa.float64(),
+    FieldType.NEWDECIMAL: pa.float64(),
+    FieldType.VARCHAR:    pa.string(),
+    FieldType.VAR_STRING: pa.string(),
+    FieldType.STRING:     pa.string(),
+    FieldType.DATE:       pa.date32(),
+    FieldType.DATETIME:   pa.timestamp("us", tz="UTC"), # MySQL doesn't manage TimeZone. All datetime is stored as UTC by this package.
+    FieldType.TIMESTAMP:  pa.timestamp("us", tz="UTC"),
+}
+# data_type of information_schema.columns ( db_layout_type ). It's used when the cursor type is not in the maps above.
+LAYOUT_TYPE_TO_ARROW = {
+    "text":              pa.string(),
+    "mediumtext":        pa.string(),
+    "longtext":          pa.string(),
+    "tinytext":          pa.string(),
+    "character varying": pa.string(),
+    "character":         pa.string(),
+    "varchar":           pa.string(),
+    "char":              pa.string(),
+    "numeric":           pa.float64(),
+    "decimal":           pa.float64(),
+    "double precision":  pa.float64(),
+    "double":            pa.float64(),
+    "real":              pa.float32(),
+    "float":             pa.float32(),
+    "bigint":            pa.int64(),
+    "integer":           pa.int32(),
+    "int":               pa.int32(),
+    "smallint":          pa.int16(),
+    "boolean":           pa.bool_(),
+    "date":              pa.date32(),
+}
+# The types which are decoded as Decimal by the drivers. They're converted to float64 only if numeric_as_float=True.
+PSGRE_OID_NUMERIC   = [1700]
+MYSQL_FIELD_NUMERIC = [FieldType.DECIMAL, FieldType.NEWDECIMAL]
+LAYOUT_TYPE_NUMERIC = ["numeric", "decimal"]
+
+
+def get_arrow_type_from_cursor(description, dbtype: str, numeric_as_float: bool=True) -> list[pa.DataType | None]:
+    """
+    Params::
+        description:
+            cursor.description after execute().
+            PostgreSQL: psycopg2 Column object. type_code is OID.
+            MySQL: tuple. description[i][1] is mysql.connector.constants.FieldType.
+        numeric_as_float:
+            If False, the type of NUMERIC / DECIMAL is None, so the values are kept as Decimal.
+    Return::
+        List of arrow type. None means the type is inferred by pyarrow.
+    """
+    assert dbtype in ["psgre", "mysql"]
+    assert isinstance(numeric_as_float, bool)
+    if dbtype == "psgre":
+        return [(None if not numeric_as_float and x.type_code in PSGRE_OID_NUMERIC else PSGRE_OID_TO_ARROW.get(x.type_code)) for x in description]
+    else:
+        return [(None if not numeric_as_float and x[1] in MYSQL_FIELD_NUMERIC else MYSQL_FIELD_TO_ARROW.get(x[1])) for x in description]
+
+def get_arrow_type_from_layout(
+    colnames: list[str], layout_type: dict[str, str], types: list[pa.DataType | None]=None, numeric_as_float: bool=True
+) -> list[pa.DataType | None]:
+    """
+    Fill the unknown types ( None ) by the data_type of the table layout.
+    Params::
+        layout_type:
+            {colname: data_type} of one table. ex) DB.db_layout_type["test_table"]
+        numeric_as_float:
+            If False, NUMERIC / DECIMAL columns are left as None.
+    """
+    assert check_type_list(colnames, str)
+    assert isinstance(layout_type, dict)
+    assert isinstance(numeric_as_float, bool)
+    if types is None: types = [None] * len(colnames)
+    assert isinstance(types, list) and len(types) == len(colnames)
+    list_type = []
+    for x, y in zip(colnames, types):
+        if y is None:
+            data_type = str(layout_type.get(x)).lower()
+            if numeric_as_float or data_type not in LAYOUT_TYPE_NUMERIC:
+                y = LAYOUT_TYPE_TO_ARROW.get(data_type)
+        list_type.append(y)
+    return list_type
+
+def arrow_types_to_polars(colnames: list[str], types: list[pa.DataType | None]) -> dict[str, pl.DataType]:
+    """
+    Return::
+        {colname: polars dtype} for schema_overrides of pl.DataFrame(). The columns whose type is None are not included.
+    """
+    assert check_type_list(colnames, str)
+    assert isinstance(types, list) and len(types) == len(colnames)
+    schema = pa.schema([(x, y) for x, y in zip(colnames, types) if y is not None])
+    return dict(pl.from_arrow(schema.empty_table()).schema)
+
+def to_arrow_array(values: list | tuple, _type: pa.DataType=None) -> pa.Array:
+    """
+    Convert python values of one column to arrow array.
+    If the values cannot be converted with the given type, the type is inferred and the last resort is string.
+    """
+    if _type is not None:
+        try:
+            return pa.array(values, type=_type, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            pass
+        try:
+            return pa.array(values, from_pandas=True).cast(_type) # ex) Decimal -> decimal128 -> float64
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, OverflowError):
+            pass
+    try:
+        return pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        return pa.array([(str(x) if x is not None else None) for x in values], type=pa.string())
+
+def rows_to_arrow(rows: list[tuple], colnames: list[str], types: list[pa.DataType | None]=None) -> pa.Table:
+    """
+    Build arrow table column by column from the rows fetched by cursor.
+    polars.from_arrow() and pa.Table.to_pandas(types_mapper=pd.ArrowDtype) wrap the buffers without copying.
+    Usage::
+        >>> rows_to_arrow([(1, "a"), (2, None)], ["id", "name"], [pa.int64(), pa.string()])
+        pyarrow.Table
+        id: int64
+        name: string
+    """
+    assert isinstance(rows, list)
+    assert check_type_list(colnames, str)
+    if types is None: types = [None] * len(colnames)
+    assert isinstance(types, list) and len(types) == len(colnames)
+    if len(rows) == 0:
+        return pa.table([pa.array([], type=(x if x is not None else pa.null())) for x in types], names=colnames)
+    columns = list(zip(*rows))
+    return pa.table([to_arrow_array(x, _type=y) for x, y in zip(columns, types)], names=colnames)
+
+def read_psgre_csv(buffer: io.BytesIO, colnames: list[str], types: list[pa.DataType | None]=None) -> pa.Table:
+    """
+    Parse the output of PostgreSQL "COPY ... TO STDOUT WITH (FORMAT csv)" by multithreaded pyarrow CSV reader.
+    In PostgreSQL CSV format, NULL is an unquoted empty value and an empty string is quoted "".
+    Params::
+        buffer:
+            bytes written by cursor.copy_expert(). The header must not be included.
+        colnames:
+            column names of the result.
+        types:
+            arrow types of each column. None means the type is inferred by pyarrow.
+    """
+    assert isinstance(buffer, io.BytesIO)
+    assert check_type_list(colnames, str)
+    if types is None: types = [None] * len(colnames)
+    assert isinstance(types, list) and len(types) == len(colnames)
+    buffer.seek(0)
+    if len(buffer.getbuffer()) == 0:
+        return pa.table([pa.array([], type=(x if x is not None else pa.null())) for x in types], names=colnames)
+    return pacsv.read_csv(
+        buffer,
+        read_options=pacsv.ReadOptions(column_names=colnames, use_threads=True),
+        convert_options=pacsv.ConvertOptions(
+            column_types={x: y for x, y in zip(colnames, types) if y is not None},
+            true_values=["t"], false_values=["f"], null_values=[""],
+            strings_can_be_null=True, quoted_strings_can_be_null=False,
+        ),
+    )
+
+def docs_to_arrow(docs: list[dict], colnames: list[str]=None) -> pa.Table:
+    """
+    Build arrow table column by column from MongoDB documents.
+    Params::
+        colnames:
+            The columns which are created first. The keys which are not in colnames are appended in order of appearance.
+    Note::
+        ObjectId is converted to string because arrow doesn't have the type.
+    """
+    assert isinstance(docs, list)
+    colnames = [] if colnames is None else list(colnames)
+    assert check_type_list(colnames, str)
+    setwk = set(colnames)
+    for doc in docs:
+        for x in doc.keys():
+            if x not in setwk:
+                colnames.append(x)
+                setwk.add(x)
+    arrays = []
+    for x in colnames:
+        values = [doc.get(x) for doc in docs]
+        if len(values) > 0 and isinstance(next((y for y in values if y is not None), None), bson.ObjectId):
+            values = [(str(y) if y is not None else None) for y in values]
+        arrays.append(to_arrow_array(values))
+    return pa.table(arrays, names=colnames)
+
+def batched_docs_to_arrow(batches, colnames: list[str]=None) -> pa.Table:
+    """
+    Decode raw BSON batches from pymongo's find_raw_batches() into documents one batch at a time, and convert each batch by docs_to_arrow.
+    Only one batch of python dict is alive at a time, but each document is still decoded into python objects. It's not columnar BSON decoding.
+    The arrow tables of each batch are concatenated with type promotion ( ex. null -> int64, int64 -> double ).
+    """
+    tables = [docs_to_arrow(bson.decode_all(batch), colnames=colnames) for batch in batches]
+    tables = [x for x in tables if x.num_rows > 0]
+    if len(tables) == 0:
+        return docs_to_arrow([], colnames=colnames)
+    return pa.concat_tables(tables, promote_options="permissive")
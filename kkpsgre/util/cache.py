@@ -0,0 +1,143 @@
+import re, time, threading
+from collections import OrderedDict
+import pandas as pd
+import polars as pl
+# local package
+from kkpsgre.util.com import check_type_list
+
+
+__all__ = [
+    "normalize_sql",
+    "get_write_tables",
+    "estimate_df_size",
+    "QueryCache",
+]
+
+
+PATTERNS_WRITE_TABLE = [
+    r"^insert\s+(?:ignore\s+)?into\s+([^\s(]+)",
+    r"^replace\s+into\s+([^\s(]+)",
+    r"^update\s+([^\s(]+)",
+    r"^delete\s+from\s+([^\s(;]+)",
+    r"^copy\s+([^\s(]+)",
+]
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Usage::
+        >>> normalize_sql("SELECT *\\n  FROM test_table ;")
+        'SELECT * FROM test_table'
+    """
+    assert isinstance(sql, str)
+    return re.sub(r"\s+", " ", sql).strip().rstrip(";").strip()
+
+def get_write_tables(sql: str) -> list[str] | None:
+    """
+    Return the table names which the sql writes to.
+    None means the tables cannot be specified ( DDL, function call, ... ), so all cache should be invalidated.
+    Usage::
+        >>> get_write_tables("insert into test_table (id) values (1);")
+        ['test_table']
+        >>> get_write_tables("ALTER TABLE test_table ADD COLUMN aa int;")
+        None
+    """
+    assert isinstance(sql, str)
+    tblnames = []
+    for sqlwk in [x for x in normalize_sql(sql).split(";") if x.strip() != ""]:
+        sqlwk = sqlwk.strip().lower()
+        for pattern in PATTERNS_WRITE_TABLE:
+            match = re.match(pattern, sqlwk)
+            if match is not None:
+                tblnames.append(match.group(1).split(".")[-1].strip('`"'))
+                break
+        else:
+            return None
+    return tblnames
+
+def estimate_df_size(df: pd.DataFrame | pl.DataFrame) -> int:
+    if isinstance(df, pl.DataFrame):
+        return int(df.estimated_size())
+    else:
+        return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class QueryCache:
+    def __init__(self, max_bytes: int, ttl: float=None):
+        """
+        LRU cache of select results with the memory budget and TTL.
+        Each entry keeps the words in its sql, and the entry is invalidated when one of the written tables is in the words.
+        Params::
+            max_bytes:
+                Memory budget of all cached dataframes. The least recently used entry is evicted when it's over.
+            ttl:
+                Time to live of each entry [sec]. If None, the entry doesn't expire.
+        """
+        assert isinstance(max_bytes, int) and max_bytes > 0
+        assert ttl is None or (isinstance(ttl, (int, float)) and ttl > 0)
+        self.max_bytes = max_bytes
+        self.ttl       = ttl
+        self.entries   = OrderedDict() # key: (df, size, expire, words)
+        self.n_bytes   = 0
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+        self.lock      = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __pop(self, key: object):
+        _, size, _, _ = self.entries.pop(key)
+        self.n_bytes -= size
+
+    def get(self, key: object) -> pd.DataFrame | pl.DataFrame | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] < time.monotonic():
+                self.__pop(key)
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: object, sql: str, df: pd.DataFrame | pl.DataFrame):
+        assert isinstance(sql, str)
+        size = estimate_df_size(df)
+        if size > self.max_bytes:
+            return None
+        with self.lock:
+            if key in self.entries:
+                self.__pop(key)
+            expire = (time.monotonic() + self.ttl) if self.ttl is not None else None
+            self.entries[key] = (df, size, expire, set(re.findall(r"\w+", sql.lower())))
+            self.n_bytes += size
+            while self.n_bytes > self.max_bytes:
+                self.__pop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate(self, tblnames: list[str] | None=None) -> int:
+        """ If tblnames is None, all entries are invalidated. """
+        assert tblnames is None or check_type_list(tblnames, str)
+        with self.lock:
+            if tblnames is None:
+                keys = list(self.entries.keys())
+            else:
+                tblnames = set(x.lower() for x in tblnames)
+                keys     = [x for x, y in self.entries.items() if len(tblnames & y[3]) > 0]
+            for x in keys: self.__pop(x)
+        return len(keys)
+
+    def clear(self):
+        self.invalidate(None)
+
+    def info(self) -> dict:
+        with self.lock:
+            return {
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "n_entries": len(self.entries), "n_bytes": self.n_bytes, "max_bytes": self.max_bytes, "ttl": self.ttl,
+            }
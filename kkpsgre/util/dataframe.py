@@ -1,3 +1,4 @@
+import re
 import pandas as pd
 import numpy as np
 from joblib import Parallel, delayed
@@ -14,11 +15,16 @@ __all__ = [
     "check_column_is_integer",
     "check_column_is_float",
     "correct_round_values",
+    "to_string_all_columns_legacy",
     "to_string_all_columns",
 ]
 
 
 LIST_NUM_TYPES = [int, float, np.int8, np.int16, np.int32, np.int64, np.float16, np.float32, np.float64, np.float128]
+# Same patterns as check_column_is_integer / check_column_is_float in one regex.
+REGEX_INTEGER = r"^(?:[0-9]|-[1-9]|[0-9]\.0+|-[0-9]+\.0+|[1-9][0-9]+|-[1-9][0-9]+|[1-9][0-9]+\.0+|-[1-9][0-9]+\.0+)$"
+REGEX_FLOAT   = r"^(?:[0-9]\.[0-9]+|-[0-9]\.[0-9]+|[1-9][0-9]+\.[0-9]+|-[1-9][0-9]+\.[0-9]+)$"
+INT64_MAX     = 9223372036854775807
 
 
 def parallel_apply(df: pd.DataFrame, func, axis: int=0, group_key=None, func_aft=None, batch_size: int=1, n_jobs: int=1):
@@ -66,20 +72,11 @@ def drop_duplicate_columns(df: pd.DataFrame) -> pd.DataFrame:
     """
     Remove duplicate columns.
     When retrieved from a database, the same column name can exist.
+    The first one is kept. It's a hash-based O(n) check, so it's cheap even for wide tables.
     """
     assert isinstance(df, pd.DataFrame)
-    list_bool, listwk = [], []
-    for x in df.columns:
-        if (df.columns == x).sum() == 1:
-            list_bool.append(True)
-            listwk.append(x)
-        else:
-            if x in listwk:
-                list_bool.append(False)
-            else:
-                list_bool.append(True)
-                listwk.append(x)
-    return df.loc[:, list_bool]
+    if df.columns.is_unique: return df
+    return df.loc[:, ~df.columns.duplicated(keep="first")]
 
 def apply_fill_missing_values(df: pd.DataFrame, rep_nan: str, rep_inf: str, rep_minf: str, dtype=object, batch_size: int=1, n_jobs: int=1) -> pd.DataFrame:
     assert isinstance(df, pd.DataFrame)
@@ -148,10 +145,11 @@ def correct_round_values(df: pd.DataFrame, strtmp: str=None, rep_nan: str=None,
             se = se.replace(rep_nan, strtmp, inplace=False, regex=False).astype(np.float128).astype(np.int64).astype(str).replace(strtmp, rep_nan, regex=False)
         elif check_column_is_float(  se, except_strings=[rep_nan]).sum() == se.shape[0]:
             se =  se.replace(rep_nan, np.nan, inplace=False, regex=False).astype(np.float64).round(n_round).astype(str).replace(str(np.nan), rep_nan, regex=False)
+            se =  se.fillna(rep_nan) # pandas>=3.0 keeps NaN as missing value after astype(str)
         list_se.append(se)
     return pd.concat(list_se, axis=1).loc[:, df.columns]
 
-def to_string_all_columns(
+def to_string_all_columns_legacy(
     df: pd.DataFrame, n_round=3, rep_nan: str="%%null%%", rep_inf: str="%%null%%", rep_minf: str="%%null%%", 
     strtmp: str="-9999999", batch_size: int=1, n_jobs: int=1
 ) -> pd.DataFrame:
@@ -210,3 +208,138 @@ def to_string_all_columns(
         )
     df = df.loc[:, columns_org]
     return df
+
+def _is_integer_string(x: str) -> bool:
+    return re.match(REGEX_INTEGER, x) is not None and x.zfill(len(str(INT64_MAX))) <= str(INT64_MAX)
+
+def _format_float(ndf: np.ndarray, rep_nan: str, rep_inf: str, rep_minf: str) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Same string as str(int(x)) if x is integer else str(x) of each value.
+    Return::
+        (strings, mask of finite value, mask of integer value)
+    """
+    boolfin = np.isfinite(ndf)
+    boolint = boolfin & (np.floor(np.where(boolfin, ndf, 0)) == ndf)
+    ret     = np.full(ndf.shape[0], rep_nan, dtype=object)
+    ret[ndf ==  np.inf] = rep_inf
+    ret[ndf == -np.inf] = rep_minf
+    boolwk = boolint & (np.abs(np.where(boolint, ndf, 0)) < 2**63)
+    ret[boolwk] = ndf[boolwk].astype(np.int64).astype(str)
+    ret[boolint & ~boolwk] = [str(int(x)) for x in ndf[boolint & ~boolwk].tolist()]
+    ret[boolfin & ~boolint] = ndf[boolfin & ~boolint].astype(str)
+    return ret, boolfin, boolint
+
+def _format_datetime(se: pd.Series, rep_nan: str) -> np.ndarray:
+    """ Same string as str(pd.Timestamp) of each value. """
+    boolnan = se.isna().to_numpy()
+    us      = se.dt.microsecond.to_numpy(dtype=np.int64, na_value=0)
+    ns      = se.dt.nanosecond.to_numpy(dtype=np.int64, na_value=0)
+    frac    = np.full(se.shape[0], "", dtype=object)
+    frac[us > 0] = [f".{x:06d}" for x in us[us > 0].tolist()]
+    frac[ns > 0] = [f".{x:06d}{y:03d}" for x, y in zip(us[ns > 0].tolist(), ns[ns > 0].tolist())]
+    ret = se.dt.strftime("%Y-%m-%d %H:%M:%S").to_numpy(dtype=object, na_value=rep_nan) + frac
+    if isinstance(se.dtype, pd.DatetimeTZDtype):
+        tz  = se.dt.strftime("%z").to_numpy(dtype=object, na_value="")
+        ret = ret + np.array([(x[:3] + ":" + x[3:] if len(x) == 5 else x) for x in tz.tolist()], dtype=object)
+    ret[boolnan] = rep_nan
+    return ret
+
+def _to_string_column(se: pd.Series, n_round: int, rep_nan: str, rep_inf: str, rep_minf: str, strtmp: str) -> np.ndarray | None:
+    """
+    Convert one column into the same strings as to_string_all_columns_legacy by dispatching on the dtype.
+    Return::
+        object array of strings. None means the dtype is not supported and the legacy conversion is needed.
+    """
+    dtype = se.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        ndf = se.to_numpy(dtype=object, na_value=None)
+        ret = np.where(ndf == True, "1", "0").astype(object)
+        ret[se.isna().to_numpy()] = rep_nan
+        kind = "int"
+    elif pd.api.types.is_integer_dtype(dtype):
+        boolnan = se.isna().to_numpy()
+        ret     = np.full(se.shape[0], rep_nan, dtype=object)
+        ret[~boolnan] = se[~boolnan].to_numpy().astype(str)
+        kind = "int"
+    elif dtype == np.float64 or isinstance(dtype, pd.Float64Dtype):
+        ndf = se.to_numpy(dtype=np.float64, na_value=np.nan)
+        if dtype == np.float64: ndf = np.round(ndf, n_round) # Same as legacy. The nullable Float64 isn't rounded.
+        ret, boolfin, boolint = _format_float(ndf, rep_nan, rep_inf, rep_minf)
+        kind = "float"
+    elif pd.api.types.is_datetime64_any_dtype(dtype):
+        ret  = _format_datetime(se, rep_nan)
+        kind = "datetime"
+    elif dtype == object or pd.api.types.is_string_dtype(dtype) or isinstance(dtype, pd.CategoricalDtype):
+        if isinstance(dtype, pd.CategoricalDtype): se = se.astype(object)
+        if pd.api.types.infer_dtype(se, skipna=True) not in ["string", "empty"]:
+            return None
+        boolnan = se.isna().to_numpy()
+        ret     = se.to_numpy(dtype=object, na_value=rep_nan, copy=True)
+        ret[boolnan] = rep_nan
+        boolnan = boolnan | (ret == rep_nan)
+        kind = "string"
+    else:
+        return None
+    if (ret == strtmp).any():
+        raise Exception(f"strtmp: {strtmp} exist.")
+    # The conversion of correct_round_values
+    if kind == "float":
+        setwk = set(ret[~boolfin].tolist())
+        boolbig = boolfin & (np.abs(np.where(boolfin, ndf, 0)) >= 2**63)
+        if boolint[boolfin].all() and all(_is_integer_string(x) for x in ret[boolbig].tolist()):
+            if boolbig.any() or len(setwk - {rep_nan}) > 0:
+                return None # Legacy conversion gives overflowed or corrected values.
+        elif not boolint.any() and ((np.abs(ndf[boolfin]) >= 1e-4) & (np.abs(ndf[boolfin]) < 1e16)).all(): # str(x) isn't the exponent format.
+            if len(setwk - {rep_nan}) > 0:
+                return None
+            ndfwk   = np.round(ndf, n_round)
+            boolwk  = boolfin & (ndfwk != ndf)
+            ret[boolwk] = pd.Series(ndfwk[boolwk]).astype(str).to_numpy(dtype=object) # Only the values which are changed by rounding again.
+    elif kind == "string":
+        values = ret[~boolnan]
+        if values.shape[0] == 0: return ret
+        if not (re.match(REGEX_INTEGER, values[0]) or re.match(REGEX_FLOAT, values[0])): return ret
+        sewk = pd.Series(values, dtype=object)
+        if sewk.str.match(REGEX_INTEGER).all() and (sewk.str.zfill(len(str(INT64_MAX))) <= str(INT64_MAX)).all():
+            ret[~boolnan] = sewk.str.replace(r"\.0+$", "", regex=True).astype(np.int64).astype(str).to_numpy(dtype=object) # "-1.00" -> "-1" -> -1
+        elif sewk.str.match(REGEX_FLOAT).all():
+            ret[~boolnan] = sewk.astype(np.float64).round(n_round).astype(str).to_numpy(dtype=object)
+    return ret
+
+def to_string_all_columns(
+    df: pd.DataFrame, n_round=3, rep_nan: str="%%null%%", rep_inf: str="%%null%%", rep_minf: str="%%null%%", 
+    strtmp: str="-9999999", batch_size: int=1, n_jobs: int=1
+) -> pd.DataFrame:
+    """
+    Convert all columns to strings. The output is the same as to_string_all_columns_legacy.
+    Each column is formatted once by numpy / pandas vectorised conversion dispatched on its dtype
+    ( int, nullable Int, float64, nullable Float64, bool, datetime and string ).
+    The columns of the other dtypes ( ex. float32, object of mixed types ) are converted by to_string_all_columns_legacy.
+    Params::
+        Same as to_string_all_columns_legacy.
+        batch_size, n_jobs:
+            They are used for the columns which are converted by to_string_all_columns_legacy.
+    """
+    assert isinstance(df, pd.DataFrame)
+    assert isinstance(n_round, int) and n_round >= 0
+    assert isinstance(rep_nan, str)
+    assert isinstance(rep_inf, str)
+    assert isinstance(rep_minf, str)
+    assert isinstance(strtmp, str) and check_str_is_integer(strtmp)
+    assert isinstance(batch_size, int) and batch_size >= 1
+    assert isinstance(n_jobs, int) and n_jobs >= 1
+    dict_ret, list_legacy = {}, []
+    for i in range(df.shape[1]):
+        ret = _to_string_column(df.iloc[:, i], n_round, rep_nan, rep_inf, rep_minf, strtmp)
+        if ret is None:
+            list_legacy.append(i)
+        else:
+            dict_ret[i] = ret
+    if len(list_legacy) > 0:
+        dfwk = to_string_all_columns_legacy(
+            df.iloc[:, list_legacy], n_round=n_round, rep_nan=rep_nan, rep_inf=rep_inf, rep_minf=rep_minf, strtmp=strtmp, batch_size=batch_size, n_jobs=n_jobs
+        )
+        for i, x in enumerate(list_legacy): dict_ret[x] = dfwk.iloc[:, i].to_numpy(dtype=object)
+    dfret = pd.DataFrame({i: dict_ret[i] for i in range(df.shape[1])}, index=df.index, dtype=str)
+    dfret.columns = df.columns
+    return dfret
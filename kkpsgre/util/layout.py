@@ -0,0 +1,107 @@
+import threading, weakref
+from collections.abc import Mapping
+
+
+__all__ = [
+    "LayoutStore",
+    "LazyLayout",
+]
+
+
+class LayoutStore:
+    def __init__(self):
+        """
+        Memo of the metadata of each table. It's shared by db_layout, db_layout_type and db_constraint,
+        and by the connections of DBConnectorPool.
+        One entry is {"layout": [colname, ...], "layout_type": {colname: data_type}, "constraint": [colname, ...]}.
+        The fields which the table doesn't have are not in the entry. ex) a table without primary key has no "constraint".
+        """
+        self.entries       = {}
+        self.is_complete   = False # If True, all tables are in entries, so a table which is not in entries doesn't exist.
+        self.decode_schema = {} # (tblname, cursor types, numeric_as_float): (colnames, arrow types, polars schema) of DBConnector.get_decode_schema. It depends on "layout_type".
+        self.lock          = threading.Lock()
+
+    def get(self, tblname: str, loader=None) -> dict:
+        """
+        Params::
+            loader:
+                loader(tblname) -> entry. If None, the table which is not loaded is regarded as not existing.
+        """
+        entry = self.entries.get(tblname)
+        if entry is None:
+            if self.is_complete or loader is None: return {}
+            entry = loader(tblname) # The lock is not held during the query. The same table may be loaded twice, but it's harmless.
+            with self.lock:
+                entry = self.entries.setdefault(tblname, entry)
+        return entry
+
+    def get_all(self, loader=None) -> dict[str, dict]:
+        """
+        Params::
+            loader:
+                loader() -> {tblname: entry} of all tables. If None, only the loaded tables are returned.
+        """
+        if not self.is_complete and loader is not None:
+            self.set_all(loader())
+        return self.entries
+
+    def set(self, tblname: str, entry: dict):
+        with self.lock:
+            self.entries       = self.entries | {tblname: entry}
+            self.decode_schema = {x: y for x, y in self.decode_schema.items() if x[0] != tblname}
+
+    def set_all(self, entries: dict[str, dict]):
+        with self.lock:
+            self.entries       = entries
+            self.is_complete   = True
+            self.decode_schema = {}
+
+    def refresh(self, tblname: str=None):
+        """ Forget the entry of tblname and the decode schemas built from it. If None, all entries. """
+        with self.lock:
+            if tblname is None:
+                self.entries       = {}
+                self.decode_schema = {}
+            else:
+                self.entries       = {x: y for x, y in self.entries.items() if x != tblname}
+                self.decode_schema = {x: y for x, y in self.decode_schema.items() if x[0] != tblname}
+            self.is_complete = False
+
+
+class LazyLayout(Mapping):
+    def __init__(self, store: LayoutStore, field: str, connector=None):
+        """
+        Read-only mapping of {tblname: value of the field} which loads one table on the first access.
+        Iteration ( keys(), items(), len(), ... ) loads all tables at once.
+        Params::
+            field:
+                "layout", "layout_type" or "constraint"
+            connector:
+                The object which has load_table_layout(tblname) and load_table_layout_all(). ex) DBConnector
+                It's held by weak reference. If None, only the loaded tables are visible.
+        """
+        assert isinstance(store, LayoutStore)
+        assert field in ["layout", "layout_type", "constraint"]
+        self.store     = store
+        self.field     = field
+        self.connector = weakref.ref(connector) if connector is not None else None
+
+    def __loader(self, name: str):
+        connector = self.connector() if self.connector is not None else None
+        return getattr(connector, name) if connector is not None else None
+
+    def __getitem__(self, tblname: str):
+        if not isinstance(tblname, str): raise KeyError(tblname)
+        entry = self.store.get(tblname, loader=self.__loader("load_table_layout"))
+        if self.field not in entry: raise KeyError(tblname)
+        return entry[self.field]
+
+    def __iter__(self):
+        entries = self.store.get_all(loader=self.__loader("load_table_layout_all"))
+        return iter([x for x, y in entries.items() if self.field in y])
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(field: {self.field}, n_loaded: {len(self.store.entries)}, is_complete: {self.store.is_complete})"
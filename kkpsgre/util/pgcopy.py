@@ -0,0 +1,220 @@
+import io, json, struct, decimal
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+# local package
+from kkpsgre.util.com import check_type_list
+
+
+__all__ = [
+    "PGCOPY_HEADER",
+    "PGCOPY_TRAILER",
+    "PGCOPY_TYPES",
+    "encode_numeric",
+    "encode_pgcopy_column",
+    "df_to_pgcopy",
+    "CopyStream",
+]
+
+
+PGCOPY_HEADER  = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0) # signature, flags, header extension length
+PGCOPY_TRAILER = struct.pack(">h", -1)
+EPOCH_PSGRE_US = 946684800 * 1000000 # 2000-01-01 00:00:00 UTC [us]
+EPOCH_PSGRE_D  = 10957               # 2000-01-01 [day]
+# data_type of information_schema.columns: (kind, numpy dtype of the binary format)
+PGCOPY_TYPES = {
+    "smallint":                    ("int",       ">i2"),
+    "integer":                     ("int",       ">i4"),
+    "bigint":                      ("int",       ">i8"),
+    "real":                        ("float",     ">f4"),
+    "double precision":            ("float",     ">f8"),
+    "boolean":                     ("bool",      "u1"),
+    "timestamp with time zone":    ("timestamp", ">i8"),
+    "timestamp without time zone": ("timestamp", ">i8"),
+    "date":                        ("date",      ">i4"),
+    "text":                        ("text",      None),
+    "character varying":           ("text",      None),
+    "character":                   ("text",      None),
+    "numeric":                     ("numeric",   None),
+    "json":                        ("json",      None),
+    "jsonb":                       ("json",      None),
+}
+
+
+def encode_numeric(value: object) -> bytes:
+    """
+    PostgreSQL NUMERIC binary format: ndigits, weight, sign, dscale and base 10000 digits.
+    Usage::
+        >>> encode_numeric(decimal.Decimal("-12345.678"))
+        b'\\x00\\x03\\x00\\x01@\\x00\\x00\\x03\\x00\\x01\\t)\\x1a|'
+    """
+    if not isinstance(value, decimal.Decimal):
+        value = decimal.Decimal(repr(value) if isinstance(value, float) else str(value))
+    if value.is_nan():
+        return struct.pack(">hhHH", 0, 0, 0xC000, 0)
+    sign, digits, exp = value.as_tuple()
+    digits = "".join(str(x) for x in digits)
+    if exp > 0:
+        digits, exp = digits + "0" * exp, 0
+    dscale = -exp
+    if dscale > len(digits):
+        str_int, str_frac = "", "0" * (dscale - len(digits)) + digits
+    else:
+        str_int, str_frac = digits[:len(digits) - dscale], digits[len(digits) - dscale:]
+    str_int  = str_int.zfill((len(str_int) + 3) // 4 * 4)
+    str_frac = str_frac.ljust((len(str_frac) + 3) // 4 * 4, "0")
+    groups   = [int(str_int[i:i+4]) for i in range(0, len(str_int), 4)] + [int(str_frac[i:i+4]) for i in range(0, len(str_frac), 4)]
+    weight   = len(str_int) // 4 - 1
+    while len(groups) > 0 and groups[0] == 0:
+        groups.pop(0)
+        weight -= 1
+    while len(groups) > 0 and groups[-1] == 0:
+        groups.pop()
+    if len(groups) == 0: weight = 0
+    return struct.pack(f">hhHH{len(groups)}H", len(groups), weight, 0x4000 if sign else 0x0000, dscale, *groups)
+
+def __to_numeric(se: pd.Series) -> pd.Series:
+    if se.dtype == object or pd.api.types.is_string_dtype(se) or pd.api.types.is_bool_dtype(se):
+        se = pd.to_numeric(se.where(~se.isna(), None))
+    return se
+
+def __to_var_width(values: list[bytes | None]) -> (np.ndarray, np.ndarray):
+    lens = np.array([(len(x) if x is not None else -1) for x in values], dtype=np.int64)
+    return lens, np.frombuffer(b"".join([x for x in values if x is not None]), dtype=np.uint8)
+
+def encode_pgcopy_column(se: pd.Series, data_type: str) -> (np.ndarray, np.ndarray, int | None):
+    """
+    Encode one column into the field values of binary COPY.
+    Return::
+        (lens, data, width)
+        lens:  int64 array of the field length. -1 means NULL.
+        data:  fixed width: uint8 array (n_rows, width), variable width: uint8 array of the concatenated non-null values.
+        width: byte width of fixed width type. None means variable width.
+    """
+    assert isinstance(se, pd.Series)
+    assert isinstance(data_type, str)
+    if data_type not in PGCOPY_TYPES:
+        raise ValueError(f"data_type: {data_type} is not supported in binary COPY. supported: {list(PGCOPY_TYPES.keys())}")
+    kind, dtype = PGCOPY_TYPES[data_type]
+    if kind in ["int", "float"]:
+        se = __to_numeric(se)
+        ndf_null = se.isna().to_numpy()
+        ndf      = se.to_numpy(dtype=np.float64 if kind == "float" or se.dtype.kind == "f" else np.int64, na_value=0)
+        if kind == "float":
+            ndf_null = ndf_null | np.isinf(ndf)
+        else:
+            ndf = np.rint(ndf) if ndf.dtype.kind == "f" else ndf
+        ndf = ndf.astype(dtype)
+    elif kind == "bool":
+        ndf_null = se.isna().to_numpy()
+        ndf      = se.where(~ndf_null, False).astype(bool).to_numpy().astype(dtype)
+    elif kind == "timestamp":
+        se = pd.to_datetime(se, utc=(data_type == "timestamp with time zone"))
+        if isinstance(se.dtype, pd.DatetimeTZDtype):
+            se = se.dt.tz_convert("UTC") if data_type == "timestamp with time zone" else se
+            se = se.dt.tz_localize(None)
+        ndf_null = se.isna().to_numpy()
+        ndf      = (se.to_numpy(dtype="datetime64[us]").astype(np.int64) - EPOCH_PSGRE_US).astype(dtype)
+    elif kind == "date":
+        se = pd.to_datetime(se)
+        if isinstance(se.dtype, pd.DatetimeTZDtype): se = se.dt.tz_localize(None)
+        ndf_null = se.isna().to_numpy()
+        ndf      = (se.to_numpy(dtype="datetime64[D]").astype(np.int64) - EPOCH_PSGRE_D).astype(dtype)
+    elif kind == "text":
+        ndf_null = se.isna().to_numpy()
+        try:
+            arr = pa.array(se, type=pa.large_string(), from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arr = pa.array(se.where(ndf_null, se.astype(str)), type=pa.large_string(), from_pandas=True)
+        offsets = np.frombuffer(arr.buffers()[1], dtype=np.int64)[arr.offset:arr.offset + len(arr) + 1]
+        lens    = np.where(ndf_null, -1, np.diff(offsets))
+        data    = np.frombuffer(arr.buffers()[2], dtype=np.uint8)[offsets[0]:offsets[-1]] if arr.buffers()[2] is not None else np.zeros(0, dtype=np.uint8)
+        return lens, data, None
+    elif kind == "numeric":
+        values = [(None if x is None or (isinstance(x, float) and not np.isfinite(x)) or x is pd.NA else encode_numeric(x)) for x in se.astype(object).where(~se.isna(), None).tolist()]
+        return *__to_var_width(values), None
+    elif kind == "json":
+        prefix = b"\x01" if data_type == "jsonb" else b"" # jsonb binary format has the version number.
+        values = [(None if x is None else prefix + (x if isinstance(x, str) else json.dumps(x)).encode("utf8")) for x in se.astype(object).where(~se.isna(), None).tolist()]
+        return *__to_var_width(values), None
+    width = np.dtype(dtype).itemsize
+    lens  = np.where(ndf_null, -1, width).astype(np.int64)
+    return lens, ndf.view(np.uint8).reshape(-1, width), width
+
+def __scatter_int(buffer: np.ndarray, positions: np.ndarray, values: np.ndarray, dtype: str):
+    width = np.dtype(dtype).itemsize
+    buffer[positions[:, None] + np.arange(width)] = np.asarray(values).astype(dtype).view(np.uint8).reshape(-1, width)
+
+def df_to_pgcopy(df: pd.DataFrame, data_types: list[str], header: bool=True, trailer: bool=True) -> io.BytesIO:
+    """
+    Encode dataframe into PostgreSQL binary COPY format ( COPY ... FROM STDIN WITH (FORMAT binary) ).
+    Each column is encoded from its numpy / arrow buffer and scattered into one output buffer, so there is no loop of rows.
+    Params::
+        data_types:
+            data_type of information_schema.columns of each column. ex) [DB.db_layout_type[tblname][x] for x in df.columns]
+        header, trailer:
+            If False, the header or the trailer is not included. It's for encoding a large dataframe chunk by chunk.
+    Note::
+        NaN, inf and -inf of float are NULL. Naive datetime is regarded as UTC for "timestamp with time zone".
+    """
+    assert isinstance(df, pd.DataFrame)
+    assert check_type_list(data_types, str) and len(data_types) == df.shape[1]
+    assert isinstance(header, bool) and isinstance(trailer, bool)
+    n_header       = len(PGCOPY_HEADER)  if header  else 0
+    n_trailer      = len(PGCOPY_TRAILER) if trailer else 0
+    n_rows, n_cols = df.shape
+    columns   = [encode_pgcopy_column(df.iloc[:, i], x) for i, x in enumerate(data_types)]
+    sizes     = np.stack([np.maximum(x[0], 0) + 4 for x in columns], axis=1) if n_cols > 0 else np.zeros((n_rows, 0), dtype=np.int64)
+    row_sizes = sizes.sum(axis=1) + 2
+    row_start = n_header + np.concatenate([[0], np.cumsum(row_sizes)[:-1]]).astype(np.int64) if n_rows > 0 else np.zeros(0, dtype=np.int64)
+    n_total   = n_header + int(row_sizes.sum()) + n_trailer
+    buffer    = np.empty(n_total, dtype=np.uint8)
+    if header:  buffer[:n_header]  = np.frombuffer(PGCOPY_HEADER,  dtype=np.uint8)
+    if trailer: buffer[-n_trailer:] = np.frombuffer(PGCOPY_TRAILER, dtype=np.uint8)
+    __scatter_int(buffer, row_start, np.full(n_rows, n_cols), ">i2")
+    field_start = row_start + 2
+    for (lens, data, width), size in zip(columns, sizes.T):
+        __scatter_int(buffer, field_start, lens, ">i4")
+        boolwk = (lens >= 0)
+        if width is not None:
+            buffer[(field_start[boolwk] + 4)[:, None] + np.arange(width)] = data[boolwk]
+        elif data.shape[0] > 0:
+            lenswk = lens[boolwk]
+            starts = np.concatenate([[0], np.cumsum(lenswk)[:-1]]).astype(np.int64)
+            buffer[np.repeat(field_start[boolwk] + 4 - starts, lenswk) + np.arange(data.shape[0])] = data
+        field_start = field_start + size
+    return io.BytesIO(buffer.tobytes())
+
+
+class CopyStream:
+    def __init__(self, chunks, is_bytes: bool=False):
+        """
+        File-like object which is read by psycopg2's copy_expert().
+        The chunks are pulled from the iterator only when the server needs more data,
+        so at most one chunk exists in memory at once.
+        Params::
+            chunks:
+                iterator of str ( text format ) or bytes ( binary format ).
+        """
+        assert isinstance(is_bytes, bool)
+        self.chunks = iter(chunks)
+        self.empty  = b"" if is_bytes else ""
+        self.chunk  = self.empty
+        self.pos    = 0
+        self.n_read = 0
+
+    def read(self, size: int=-1) -> str | bytes:
+        listwk, n = [], 0
+        while size < 0 or n < size:
+            if self.pos >= len(self.chunk):
+                self.chunk, self.pos = next(self.chunks, None), 0
+                if self.chunk is None:
+                    self.chunk = self.empty
+                    break
+                continue
+            x = self.chunk[self.pos:] if size < 0 else self.chunk[self.pos:self.pos + size - n]
+            self.pos += len(x)
+            n        += len(x)
+            listwk.append(x)
+        self.n_read += n
+        return self.empty.join(listwk)
@@ -1,4 +1,5 @@
-import re, datetime, copy
+import re, datetime, copy, decimal
+from functools import lru_cache
 import pandas as pd
 import numpy as np
 # local package
@@ -8,8 +9,17 @@ from kkpsgre.util.com import check_type, check_type_list, str_to_datetime
 __all__ = [
     "escape_mysql_reserved_word",
     "to_str_timestamp",
-    "parse_conditions",
     "sql_to_mongo_filter",
+    "tokenize_where_clause",
+    "is_aggregate_select",
+    "parse_select_items",
+    "sql_to_mongo_pipeline",
+    "create_multi_condition",
+    "create_range_conditions",
+    "create_minmax_sql",
+    "convert_placeholders",
+    "get_select_table_name",
+    "split_sql_statements",
 ]
 
 
@@ -28,12 +38,26 @@ OPERATORS_MONGO = {
     "IN": "$in",
     "in": "$in",
 }
-DICT_CONV_MONGO = {
-    "true":  True, 
-    "false": False, 
-    "True":  True, 
-    "False": False, 
+AGGREGATES_MONGO = {
+    "count": "$sum",
+    "sum":   "$sum",
+    "avg":   "$avg",
+    "min":   "$min",
+    "max":   "$max",
 }
+PATTERN_AGGREGATE = r"(count|sum|avg|min|max)\s*\(\s*(distinct\s+)?(\*|[\w\.]+)\s*\)"
+TOKEN_PATTERN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?(?![\w\.]))
+  | (?P<op><=|>=|<>|!=|=|<|>)
+  | (?P<lparen>\()
+  | (?P<rparen>\))
+  | (?P<comma>,)
+  | (?P<word>[A-Za-z_][\w\.]*|`[^`]+`|"[^"]+")
+""", re.VERBOSE)
+PATTERN_ISO_DATETIME = re.compile(r"^\d{4}-\d{2}-\d{2}( \d{2}:\d{2}:\d{2}(\.\d{1,6})?([+-]\d{2}:?\d{2})?)?$")
+KEYWORDS_WHERE = ["and", "or", "not", "in", "is", "null", "none", "true", "false"]
 
 
 def escape_mysql_reserved_word(sql: str, reserved_word: list[str]):
@@ -56,189 +80,281 @@ def escape_mysql_reserved_word(sql: str, reserved_word: list[str]):
     sqlnew = "(".join(sqlnew)
     return sqlnew
     
-def parse_conditions(sql_where_clause: str, escapes):
-    def __tmp(tmp):
+def tokenize_where_clause(sql_where_clause: str) -> list[tuple[str, str]]:
+    """
+    Split the clause into tokens in a single pass.
+    A double-quoted word is "quoted". It's a field name before the operator and a string literal after it, as the old eval based parser did.
+    Usage::
+        >>> tokenize_where_clause("a >= 1 and b in ('x', 'y''s')")
+        [('ident', 'a'), ('op', '>='), ('number', '1'), ('and', 'and'), ('ident', 'b'), ('in', 'in'),
+         ('lparen', '('), ('string', "'x'"), ('comma', ','), ('string', "'y''s'"), ('rparen', ')')]
+    """
+    assert isinstance(sql_where_clause, str)
+    tokens, i = [], 0
+    for match in TOKEN_PATTERN.finditer(sql_where_clause):
+        if match.start() != i:
+            raise ValueError(f"Strange input: {sql_where_clause}. unexpected character at {i}: {sql_where_clause[i:i+10]} ...")
+        i    = match.end()
+        kind = match.lastgroup
+        if kind == "space": continue
+        value = match.group(kind)
+        if kind == "word":
+            if value.lower() in KEYWORDS_WHERE:
+                kind = value.lower()
+            elif value[0] == '"':
+                kind, value = "quoted", value[1:-1]
+            else:
+                kind, value = "ident", value.strip('`"')
+        tokens.append((kind, value))
+    if i != len(sql_where_clause):
+        raise ValueError(f"Strange input: {sql_where_clause}. unexpected character at {i}: {sql_where_clause[i:i+10]} ...")
+    return tokens
+
+def __convert_where_value(kind: str, value: str):
+    if   kind in ["string", "quoted"]:
+        value = value[1:-1].replace("''", "'") if kind == "string" else value
+        if len(value) == 0 or not value[0].isdigit(): return value # All the formats of str_to_datetime start with year.
+        if PATTERN_ISO_DATETIME.match(value) is not None:
+            try:
+                return datetime.datetime.fromisoformat(value) # Same result as str_to_datetime but much faster than strptime.
+            except ValueError:
+                pass
         try:
-            return str_to_datetime(tmp)
+            return str_to_datetime(value)
         except ValueError:
-            return tmp
-    def __work(value):
-        if value in DICT_CONV_MONGO:
-            return DICT_CONV_MONGO[value]
-        else:
-            value = eval(value)
-            if isinstance(value, str):
-                return __tmp(value)
-            elif isinstance(value, tuple) or isinstance(value, list):
-                return [(__tmp(x) if isinstance(x, str) else x) for x in value]
-            else:
-                return value
-    pattern = r"(\w+)\s*(\sIN\s|!=|<>|<=|>=|<|>|=)\s*([^\s]+|\(.*\))(\s+AND|\s+OR|\s*$)"
-    matches = re.findall(pattern, sql_where_clause, re.IGNORECASE)
-    current_operator   = None
-    current_conditions = []
-    mongo_query        = {}
-    for match in matches:
-        field, operator, value, logical_op = [x.strip() for x in match] # ex) field: aa, operator: >, value: 0, logical_op: and
-        for i, x in enumerate(escapes): value = value.replace(f"%%@{i}%%", x)
-        condition = {field: {OPERATORS_MONGO[operator]: __work(value)}}
-        if logical_op:
-            if current_operator and current_operator != OPERATORS_MONGO[logical_op]:
-                mongo_query[current_operator] = current_conditions
-                current_conditions = []
-            current_operator = OPERATORS_MONGO[logical_op]
-        current_conditions.append(condition)
-    if current_operator:
-        mongo_query[current_operator] = current_conditions
+            return value
+    elif kind == "number":
+        return float(value) if re.search(r"[\.eE]", value) else int(value)
+    elif kind == "true":
+        return True
+    elif kind == "false":
+        return False
+    elif kind in ["null", "none"]:
+        return None
     else:
-        mongo_query = current_conditions[0]
-    return mongo_query
+        raise ValueError(f"{value} is not a value.")
+
+@lru_cache(maxsize=1024)
+def __compile_where_clause(sql_where_clause: str) -> dict:
+    """
+    Recursive-descent parser. AND binds tighter than OR like SQL.
+        expr      := and_expr ( OR and_expr )*
+        and_expr  := primary ( AND primary )*
+        primary   := "(" expr ")" | condition
+        condition := ident op value | ident [NOT] IN "(" value ( "," value )* ")" | ident IS [NOT] NULL
+    """
+    tokens = tokenize_where_clause(sql_where_clause)
+    n_tok  = len(tokens)
+    i      = 0
+    def __peek():
+        return tokens[i][0] if i < n_tok else None
+    def __take(*kinds: str) -> str:
+        nonlocal i
+        if i >= n_tok or tokens[i][0] not in kinds:
+            raise ValueError(f"Strange input: {sql_where_clause}. expected {kinds} but got {tokens[i] if i < n_tok else 'end of clause'}")
+        i += 1
+        return tokens[i - 1]
+    def __value():
+        return __convert_where_value(*__take("string", "quoted", "number", "true", "false", "null", "none"))
+    def __condition() -> dict:
+        _, field = __take("ident", "quoted")
+        kind, op = __take("op", "in", "not", "is")
+        if kind == "op":
+            return {field: {OPERATORS_MONGO[op]: __value()}}
+        if kind == "is":
+            if __peek() == "not":
+                __take("not")
+                __take("null", "none")
+                return {field: {"$ne": None}}
+            __take("null", "none")
+            return {field: {"$eq": None}}
+        if kind == "not": __take("in")
+        __take("lparen")
+        values = [__value()]
+        while __peek() == "comma":
+            __take("comma")
+            values.append(__value())
+        __take("rparen")
+        return {field: {("$nin" if kind == "not" else "$in"): values}}
+    def __primary() -> dict:
+        if __peek() == "lparen":
+            __take("lparen")
+            ret = __expr()
+            __take("rparen")
+            return ret
+        return __condition()
+    def __and_expr() -> dict:
+        listwk = [__primary()]
+        while __peek() == "and":
+            __take("and")
+            listwk.append(__primary())
+        return listwk[0] if len(listwk) == 1 else {"$and": listwk}
+    def __expr() -> dict:
+        listwk = [__and_expr()]
+        while __peek() == "or":
+            __take("or")
+            listwk.append(__and_expr())
+        return listwk[0] if len(listwk) == 1 else {"$or": listwk}
+    ret = __expr()
+    if i != n_tok:
+        raise ValueError(f"Strange input: {sql_where_clause}. unexpected token {tokens[i]}")
+    return ret
+
+def __copy_filter(obj):
+    # The cached filter must not be modified by the caller. This is faster than copy.deepcopy.
+    if isinstance(obj, dict):
+        return {x: __copy_filter(y) for x, y in obj.items()}
+    elif isinstance(obj, list):
+        return [__copy_filter(x) for x in obj]
+    return obj
+
+def sql_to_mongo_filter(sql_where_clause: str) -> dict:
+    """
+    Convert SQL WHERE clause to MongoDB filter.
+    The clause is tokenized and parsed in linear time, and the result is memoized by the clause text.
+    Usage::
+        >>> sql_to_mongo_filter("gender in ('male', 'female', 0) and (age > 30 or name = 'Taro')")
+        {'$and': [{'gender': {'$in': ['male', 'female', 0]}}, {'$or': [{'age': {'$gt': 30}}, {'name': {'$eq': 'Taro'}}]}]}
+    Note::
+        =, !=, <>, <, <=, >, >=, [NOT] IN, IS [NOT] NULL, AND, OR and parentheses are supported.
+        The quoted string which can be converted to datetime is converted to datetime.
+        A double-quoted value is a string literal like a single-quoted one. ex) name = "Taro"
+    """
+    assert isinstance(sql_where_clause, str)
+    return __copy_filter(__compile_where_clause(sql_where_clause.strip()))
 
-def sql_to_mongo_filter(sql_where_clause):
+def is_aggregate_select(str_select: str, str_group: str=None) -> bool:
     """
-    sql_where_clause = '''
-    gender in ('male', 'female', 0) and ((name = 'Taro'))
-    and (
-        (department = 'Sales' AND age > 30) 
-        OR 
-        (department = 'Engineering' AND (salary > 70000 OR position IN ('Manager', 'Lead Engineer')))
+    Usage::
+        >>> is_aggregate_select("a, COUNT(*) AS n")
+        True
+        >>> is_aggregate_select("DISTINCT a")
+        True
+        >>> is_aggregate_select("a, b")
+        False
+    """
+    assert isinstance(str_select, str)
+    return (
+        (str_group is not None) or
+        (re.search(PATTERN_AGGREGATE, str_select, flags=re.IGNORECASE) is not None) or
+        (re.match(r"^\s*distinct\s+", str_select, flags=re.IGNORECASE) is not None)
     )
-    AND 
-    (location = 'New York' OR location = 'San Francisco')
-    '''.strip()
+
+def parse_select_items(str_select: str) -> (bool, list[dict]):
     """
-    sql_escape_sq    = re.findall(r"'[^']+'", sql_where_clause)
-    tmp              = re.split(r"'[^']+'", sql_where_clause)
-    sql_where_clause = []
-    for i, x in enumerate(tmp):
-        sql_where_clause.append(x)
-        sql_where_clause.append(f"%%@{i}%%")
-    sql_where_clause = re.sub(r"\s+", " ", "".join(sql_where_clause[:-1])).strip().replace(" AND ", " and ").replace(" And ", " and ").replace(" OR ", " or ").replace(" Or ", " or ").replace(" IN ", " in ").replace(" In ", " in ")
-    sql_escape_in    = re.findall(r" in \([^\(\)]+\)", sql_where_clause)
-    tmp              = re.split(r" in \([^\(]+\)", sql_where_clause)
-    sql_where_clause = []
-    for i, x in enumerate(tmp):
-        sql_where_clause.append(x)
-        sql_where_clause.append(f"%%IN{i}%%")
-    sql_where_clause = "".join(sql_where_clause[:-1])
-    def __work1(string: str, escapes: list[str]):
-        listret, count, st_i = [], None, 0        
-        for i, word in enumerate(string):
-            if word == "(":
-                if count is None:
-                    listret.append(string[st_i:i])
-                    count = 1
-                    st_i  = i
-                else:
-                    count += 1
-            if word == ")":
-                if count is None:
-                    raise ValueError(f"Strange input: {string}")
-                else:
-                    count -= 1
-            if count is not None and count == 0:
-                listret.append(string[st_i:i+1])
-                count = None
-                st_i  = i+1
-        listret.append(string[st_i:])
-        listret = [x for x in listret if x.strip() != ""]
-        listretwk = [listret[0], ]
-        for x in listret[1:]:
-            if x.find(" and ") >= 0 or x.find(" or ") >= 0:
-                listretwk.append(x)
-            else:
-                # a case of IN phrase is expected.
-                listretwk[-1] = listretwk[-1] + x
-        listret = listretwk
-        listret = [x for x in listret if x.strip() != ""]
-        i = 0
-        while True:
-            x = listret[i]
-            if x[:5] == " and "  and len(x) != 5:
-                listret = listret[:i] + [" and ", x[5:]]  + listret[i+1:]
-                i = 0
-                continue
-            if x[:4] == " or "   and len(x) != 4:
-                listret = listret[:i] + [" or ",  x[4:]]  + listret[i+1:]
-                i = 0
-                continue
-            if x[-5:] == " and " and len(x) != 5:
-                listret = listret[:i] + [x[:-5], " and "] + listret[i+1:]
-                i = 0
-                continue
-            if x[-4:] == " or "  and len(x) != 4:
-                listret = listret[:i] + [x[:-4],  " or "] + listret[i+1:]
-                i = 0
-                continue
-            if i >= (len(listret) - 1): break
-            i += 1
-        listwk = []
-        for tmp in listret:
-            for i, x in enumerate(escapes):
-                tmp = tmp.replace(f"%%IN{i}%%", x)
-            listwk.append(tmp)
-        listret = listwk
-        if len(listret) == 1:
-            # If it's not changed, it will convert to string.
-            listret = listret[0] # Don't do strip()
-            if listret[0] == "(" and listret[-1] == ")":
-                return __work1(listret[1:-1])
-        return listret
-    def __work2(listwk: list[str], escapes: list[str]):
-        listwk = copy.deepcopy(listwk)
-        for i, tmp in enumerate(listwk):
-            if tmp[0] == "(" and tmp[-1] == ")":
-                tmp = tmp[1:-1]
-            listwk[i] = __work1(tmp, escapes)
-            if isinstance(listwk[i], list):
-                listwk[i] = __work2(listwk[i], escapes)
-        return listwk
-    sql_where_clauses = __work2([sql_where_clause, ], sql_escape_in)
-    if isinstance(sql_where_clauses, str):
-        sql_where_clauses = [sql_where_clauses, ]
-    elif isinstance(sql_where_clauses, list) and len(sql_where_clauses) == 1 and isinstance(sql_where_clauses[0], list):
-        sql_where_clauses = sql_where_clauses[0]
+    Parse the select list of an aggregate query.
+    Usage::
+        >>> parse_select_items("a, COUNT(*), SUM(b) AS total, COUNT(DISTINCT c) AS n")
+        (False, [
+            {'func': None,    'column': 'a', 'alias': 'a',     'distinct': False},
+            {'func': 'count', 'column': '*', 'alias': 'count', 'distinct': False},
+            {'func': 'sum',   'column': 'b', 'alias': 'total', 'distinct': False},
+            {'func': 'count', 'column': 'c', 'alias': 'n',     'distinct': True},
+        ])
+    Note::
+        The alias of aggregate function without "AS" is the function name like PostgreSQL.
     """
-    >>> sql_where_clauses
-    [
-        'gender in (%%@0%%, %%@1%%, 0)',
-        ' and ',
-        'name = %%@2%%',
-        ' and ',
-        [
-            'department = %%@3%% and age > 30',
-            ' or ',
-            [
-                'department = %%@4%%',
-                ' and ',
-                'salary > 70000 or position IN (%%@5%%, %%@6%%)'
-            ]
-        ],
-        ' and ',
-        'location = %%@7%% or location = %%@8%%'
-    ]
+    assert isinstance(str_select, str)
+    str_select  = str_select.strip()
+    is_distinct = re.match(r"^distinct\s+", str_select, flags=re.IGNORECASE) is not None
+    if is_distinct: str_select = re.sub(r"^distinct\s+", "", str_select, flags=re.IGNORECASE)
+    items = []
+    for x in str_select.split(","):
+        x     = x.strip()
+        match = re.match(r"^(.+?)\s+as\s+(\w+)$", x, flags=re.IGNORECASE)
+        expr, alias = (match.group(1).strip(), match.group(2)) if match is not None else (x, None)
+        match = re.match(f"^{PATTERN_AGGREGATE}$", expr, flags=re.IGNORECASE)
+        if match is not None:
+            func, distinct, column = match.group(1).lower(), match.group(2) is not None, match.group(3)
+            if column == "*" and func != "count":
+                raise ValueError(f"{expr} is not supported.")
+            items.append({"func": func, "column": column, "alias": (func if alias is None else alias), "distinct": distinct})
+        elif re.match(r"^[\w\.]+$", expr) is not None:
+            items.append({"func": None, "column": expr, "alias": (expr if alias is None else alias), "distinct": False})
+        else:
+            raise ValueError(f"{expr} is not supported in the select list.")
+    aliases = [x["alias"] for x in items]
+    if len(aliases) != len(set(aliases)):
+        raise ValueError(f"select list has duplicated names: {aliases}. Use 'AS' to name them.")
+    return is_distinct, items
+
+def sql_to_mongo_pipeline(
+    str_select: str, mongo_filter: dict=None, str_group: str=None, str_having: str=None, limit: int=None
+) -> (list[dict], list[str]):
     """
-    def __work3(clauses: list[str | list], escapes: list[str]):
-        if len(clauses) == 1:
-            return parse_conditions(clauses[0], escapes)
-        strop, listwk = None, []
-        for i, clause in enumerate(clauses):
-            if i % 2 == 1:
-                if strop is None:
-                    strop = clause
-                else:
-                    assert strop == clause # Operator must be one.
-            else:
-                if isinstance(clause, str):
-                    listwk.append(parse_conditions(clause, escapes))
-                elif isinstance(clause, list):
-                    listwk.append(__work3(clause))
-                else:
-                    raise ValueError(f"This is not expected. [{clause}]")
-        return {
-            OPERATORS_MONGO[strop.strip()]: listwk
-        }
-    return __work3(sql_where_clauses, sql_escape_sq)
+    Convert "SELECT ... WHERE ... GROUP BY ... HAVING ... LIMIT ..." to MongoDB aggregation pipeline.
+    COUNT/SUM/AVG/MIN/MAX, COUNT(*), COUNT(DISTINCT x) and SELECT DISTINCT are supported.
+    Usage::
+        >>> sql_to_mongo_pipeline("a, COUNT(*) AS n", mongo_filter={"b": {"$gt": 0}}, str_group="a", str_having="n > 1")
+        ([
+            {'$match': {'b': {'$gt': 0}}},
+            {'$group': {'_id': {'a': '$a'}, 'n': {'$sum': 1}}},
+            {'$project': {'_id': 0, 'a': '$_id.a', 'n': 1}},
+            {'$match': {'n': {'$gt': 1}}}
+        ], ['a', 'n'])
+    Return::
+        (pipeline, output column names)
+    """
+    assert isinstance(str_select, str)
+    assert mongo_filter is None or isinstance(mongo_filter, dict)
+    assert str_group  is None or isinstance(str_group,  str)
+    assert str_having is None or isinstance(str_having, str)
+    assert limit is None or isinstance(limit, int)
+    is_distinct, items = parse_select_items(str_select)
+    groups = [x.strip() for x in str_group.split(",")] if str_group is not None else []
+    if is_distinct:
+        if len([x for x in items if x["func"] is not None]) > 0:
+            raise ValueError("SELECT DISTINCT with aggregate function is not supported.")
+        groups = groups + [x["column"] for x in items if x["column"] not in groups]
+    for x in items:
+        if x["func"] is None and x["column"] not in groups:
+            raise ValueError(f"column: {x['column']} must appear in the GROUP BY clause or be used in an aggregate function.")
+    # HAVING refers to the aggregate functions. They are replaced with aliases, and hidden aliases are added if they are not in the select list.
+    hiddens = []
+    if str_having is not None:
+        def __replace(match: re.Match):
+            func, distinct, column = match.group(1).lower(), match.group(2) is not None, match.group(3)
+            for x in items + hiddens:
+                if x["func"] == func and x["column"] == column and x["distinct"] == distinct:
+                    return x["alias"]
+            hiddens.append({"func": func, "column": column, "alias": f"__having{len(hiddens)}", "distinct": distinct})
+            return hiddens[-1]["alias"]
+        str_having = re.sub(PATTERN_AGGREGATE, __replace, str_having, flags=re.IGNORECASE)
+    dict_group   = {"_id": ({x.replace(".", "_"): f"${x}" for x in groups} if len(groups) > 0 else None)}
+    dict_project = {"_id": 0}
+    for x in groups:
+        dict_project[x.replace(".", "_")] = f"$_id.{x.replace('.', '_')}"
+    for x in items + hiddens:
+        if x["func"] is None:
+            if x["alias"] != x["column"].replace(".", "_"):
+                dict_project[x["alias"]] = f"$_id.{x['column'].replace('.', '_')}"
+            continue
+        if x["distinct"]:
+            dict_group[  x["alias"]] = {"$addToSet": f"${x['column']}"}
+            dict_project[x["alias"]] = {"$size": {"$filter": {"input": f"${x['alias']}", "cond": {"$ne": ["$$this", None]}}}}
+        elif x["func"] == "count" and x["column"] == "*":
+            dict_group[  x["alias"]] = {"$sum": 1}
+            dict_project[x["alias"]] = 1
+        elif x["func"] == "count":
+            dict_group[  x["alias"]] = {"$sum": {"$cond": [{"$ne": [{"$ifNull": [f"${x['column']}", None]}, None]}, 1, 0]}}
+            dict_project[x["alias"]] = 1
+        else:
+            dict_group[  x["alias"]] = {AGGREGATES_MONGO[x["func"]]: f"${x['column']}"}
+            dict_project[x["alias"]] = 1
+    pipeline = []
+    if mongo_filter is not None and len(mongo_filter) > 0:
+        pipeline.append({"$match": mongo_filter})
+    pipeline.append({"$group": dict_group})
+    pipeline.append({"$project": dict_project})
+    if str_having is not None:
+        pipeline.append({"$match": sql_to_mongo_filter(str_having.strip())})
+    columns = [x["alias"] for x in items]
+    dropped = [x for x in dict_project.keys() if x != "_id" and x not in columns]
+    if len(dropped) > 0:
+        pipeline.append({"$project": {x: 0 for x in dropped}})
+    if limit is not None:
+        pipeline.append({"$limit": limit})
+    return pipeline, columns
 
 def create_multi_condition(idxs: pd.DataFrame | pd.MultiIndex):
     sql = None
@@ -271,6 +387,169 @@ def create_multi_condition(idxs: pd.DataFrame | pd.MultiIndex):
         raise TypeError(f"input data type is not expected. {type(idxs)}")
     return sql
 
+def create_range_conditions(colname: str, vmin: object, vmax: object, n_partitions: int, dbtype: str="psgre") -> list[str]:
+    """
+    Split [vmin, vmax] into disjoint ranges of equal width and create the WHERE conditions.
+    The first condition includes NULL and the last one includes vmax.
+    Usage::
+        >>> create_range_conditions("id", 1, 10, 3)
+        ['(id >= 1 AND id < 4) OR id IS NULL', 'id >= 4 AND id < 7', 'id >= 7 AND id <= 10']
+    """
+    assert isinstance(colname, str)
+    assert isinstance(n_partitions, int) and n_partitions >= 1
+    assert dbtype in ["psgre", "mysql"]
+    if check_type(vmin, [datetime.datetime, pd.Timestamp]):
+        vmin, vmax = pd.Timestamp(vmin), pd.Timestamp(vmax)
+        tz         = vmin.tz
+        boundaries = np.linspace(vmin.timestamp(), vmax.timestamp(), n_partitions + 1)[1:-1]
+        boundaries = [pd.Timestamp(x, unit="s", tz=("UTC" if tz is not None else None)) for x in boundaries]
+        boundaries = [vmin] + [(x.tz_convert(tz) if tz is not None else x) for x in boundaries] + [vmax]
+        def __conv(x):
+            if dbtype == "mysql" and x.tz is not None:
+                return f"'{x.tz_convert('UTC').strftime('%Y-%m-%d %H:%M:%S.%f')}'" # MySQL doesn't manage TimeZone so convert all data to UTC datetime.
+            return f"'{x.strftime('%Y-%m-%d %H:%M:%S.%f%z')}'"
+    elif check_type(vmin, [int, np.integer]):
+        boundaries = np.floor(np.linspace(int(vmin), int(vmax), n_partitions + 1)[1:-1]).astype(np.int64).tolist()
+        boundaries = [int(vmin)] + boundaries + [int(vmax)]
+        __conv     = lambda x: str(int(x))
+    elif check_type(vmin, [float, np.floating, decimal.Decimal]):
+        boundaries = np.linspace(float(vmin), float(vmax), n_partitions + 1)[1:-1].tolist()
+        boundaries = [vmin] + boundaries + [vmax]
+        __conv     = lambda x: repr(float(x)) if not isinstance(x, decimal.Decimal) else str(x)
+    else:
+        raise TypeError(f"type: {type(vmin)}, {vmin} is not expected as a partition value !!")
+    listwk = []
+    for x in boundaries:
+        if len(listwk) == 0 or __conv(listwk[-1]) != __conv(x): listwk.append(x)
+    boundaries = [__conv(x) for x in listwk]
+    if len(boundaries) == 1:
+        return [f"{colname} = {boundaries[0]} OR {colname} IS NULL"]
+    conditions = []
+    for i in range(len(boundaries) - 1):
+        if i == len(boundaries) - 2:
+            condition = f"{colname} >= {boundaries[i]} AND {colname} <= {boundaries[i + 1]}"
+        else:
+            condition = f"{colname} >= {boundaries[i]} AND {colname} < {boundaries[i + 1]}"
+        if i == 0:
+            condition = f"({condition}) OR {colname} IS NULL"
+        conditions.append(condition)
+    return conditions
+
+def convert_placeholders(sql: str, style: str) -> (str, list[int | str]):
+    """
+    Convert the placeholders of psycopg2 / mysql.connector ( %s or %(name)s ) for server-side prepared statements.
+    Like the drivers, "%" is interpreted even in quoted strings, so literal "%" must be "%%". It's converted to "%".
+    Params::
+        style:
+            "numeric": $1, $2, ... for PostgreSQL PREPARE. The same name is the same number.
+            "qmark":   ?, ?, ...   for MySQL prepared statement. The same name appears repeatedly in keys.
+    Usage::
+        >>> convert_placeholders("SELECT * FROM t WHERE a = %(a)s AND b LIKE 'x%%' AND c > %(a)s;", "numeric")
+        ("SELECT * FROM t WHERE a = $1 AND b LIKE 'x%' AND c > $1;", ['a'])
+        >>> convert_placeholders("SELECT * FROM t WHERE a = %s AND b = %s;", "qmark")
+        ('SELECT * FROM t WHERE a = ? AND b = ?;', [0, 1])
+    Return::
+        (converted sql, keys) keys is the order of parameters. int means the index of positional parameters.
+    """
+    assert isinstance(sql, str)
+    assert style in ["numeric", "qmark"]
+    listwk, keys, i, n, n_pos = [], [], 0, len(sql), 0
+    while i < n:
+        x = sql[i]
+        if x == "%" and i + 1 < n:
+            if sql[i + 1] == "%":
+                listwk.append("%")
+                i += 2
+                continue
+            if sql[i + 1] == "s":
+                key = n_pos
+                n_pos += 1
+                i += 2
+            elif sql[i + 1] == "(":
+                j = sql.find(")s", i)
+                if j < 0: raise ValueError(f"Strange placeholder in sql: {sql[i:i+20]} ...")
+                key = sql[i + 2:j]
+                i   = j + 2
+            else:
+                raise ValueError(f"Strange placeholder in sql: {sql[i:i+20]} ...")
+            if style == "numeric":
+                if key not in keys: keys.append(key)
+                listwk.append(f"${keys.index(key) + 1}")
+            else:
+                keys.append(key)
+                listwk.append("?")
+            continue
+        listwk.append(x)
+        i += 1
+    if len(set(type(x) for x in keys)) > 1:
+        raise ValueError(f"positional and named placeholders are mixed in sql: {sql}")
+    return "".join(listwk), keys
+
+def create_minmax_sql(sql: str, colname: str) -> str | None:
+    """
+    Create the sql which selects MIN and MAX of the column directly from the table of a simple single-table query,
+    so that the whole query doesn't need to run in a sub query.
+    Return None if it cannot be pushed down. ex) JOIN, GROUP BY, DISTINCT, LIMIT, or the column is renamed by "AS".
+    Usage::
+        >>> create_minmax_sql("SELECT id, name FROM test_table WHERE id > 1 ORDER BY id;", "id")
+        'SELECT MIN(id) AS vmin, MAX(id) AS vmax FROM test_table WHERE id > 1;'
+    """
+    assert isinstance(sql, str)
+    assert isinstance(colname, str)
+    if get_select_table_name(sql) is None: return None
+    if re.search(r"\b(group\s+by|having|limit|offset|distinct|union|fetch)\b", sql, flags=re.IGNORECASE) is not None: return None
+    match = re.match(r"^\s*select\s+(.+?)\s+from\s+(.+?)\s*;?\s*$", sql, flags=re.IGNORECASE | re.DOTALL)
+    if match is None: return None
+    items = [x.strip() for x in match.group(1).split(",")]
+    if not (items == ["*"] or colname in items): return None
+    if re.search(rf"\bas\s+{re.escape(colname)}\b", match.group(1), flags=re.IGNORECASE) is not None: return None
+    str_from = re.sub(r"\border\s+by\b.*$", "", match.group(2), flags=re.IGNORECASE | re.DOTALL).strip()
+    return f"SELECT MIN({colname}) AS vmin, MAX({colname}) AS vmax FROM {str_from};"
+
+def get_select_table_name(sql: str) -> str | None:
+    """
+    Return the table name if the sql selects from only one table. Otherwise ( JOIN, sub query, ... ) return None.
+    Usage::
+        >>> get_select_table_name("SELECT id, name FROM test_table WHERE id > 1;")
+        'test_table'
+        >>> get_select_table_name("SELECT * FROM test_table a JOIN test_table2 b ON a.id = b.id;")
+        None
+    """
+    assert isinstance(sql, str)
+    match = re.match(
+        r"^\s*select\s+(?:(?!\(\s*select\s).)+?\s+from\s+([\w\.`\"]+)(?:\s+(?:as\s+)?(?!where\b|group\b|order\b|limit\b|having\b)\w+)?\s*(?:(?:where|group|order|limit|having)\b(?:(?!\(\s*select\s|\bjoin\b).)*)?;?\s*$",
+        sql, flags=re.IGNORECASE | re.DOTALL
+    )
+    if match is None: return None
+    return match.group(1).split(".")[-1].strip('`"')
+
+def split_sql_statements(sql: str) -> list[str] | None:
+    """
+    Split the sql by ";" which is not in quoted strings or identifiers.
+    Usage::
+        >>> split_sql_statements("DELETE FROM t WHERE a = 'x;y'; INSERT INTO t VALUES (1);")
+        ["DELETE FROM t WHERE a = 'x;y';", 'INSERT INTO t VALUES (1);']
+    Return::
+        List of statements. None means the sql cannot be split safely ( comments or dollar-quoted strings ).
+    """
+    assert isinstance(sql, str)
+    if re.search(r"--|/\*|\$[A-Za-z_]*\$", sql) is not None:
+        return None
+    list_sql, quote, i_start = [], None, 0
+    for i, x in enumerate(sql):
+        if quote is not None:
+            if x == quote: quote = None # '' and "" are the escapes, and they are the same as closing and opening again.
+        elif x in ["'", '"', "`"]:
+            quote = x
+        elif x == ";":
+            list_sql.append(sql[i_start:i + 1].strip())
+            i_start = i + 1
+    if quote is not None:
+        return None
+    if sql[i_start:].strip() != "":
+        list_sql.append(sql[i_start:].strip())
+    return [x for x in list_sql if x != ";"]
+
 def to_str_timestamp(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
     for x in df.columns:
@@ -1,11 +1,14 @@
-import asyncio, copy
+import asyncio, copy, contextlib
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI
 import pandas as pd
 import numpy as np
 from pydantic import BaseModel
 # local package
 from kkpsgre.connector import DBConnector
+from kkpsgre.pool import DBConnectorPool
 from kkpsgre.util.sql import to_str_timestamp
+from kkpsgre.util.cache import get_write_tables
 
 
 class Select(BaseModel):
@@ -16,7 +19,14 @@ class Insert(BaseModel):
     tblname: str
     is_select: bool
     add_sql: str | None = None
-        
+
+class Upsert(BaseModel):
+    data: dict
+    tblname: str
+    update_columns: list[str] | None = None
+    do_nothing: bool = False
+    keys: list[str] | None = None
+
 class Delete(BaseModel):
     tblname: str
     str_where: str | None = None
@@ -30,80 +40,131 @@ class ReConnect(BaseModel):
     is_newlogfile: bool=False
 
 
-def create_app(HOST: str, PORT: int, DBNAME: str, USER: str, PASS: str, DBTYPE: str):
+def create_app(
+    HOST: str, PORT: int, DBNAME: str, USER: str, PASS: str, DBTYPE: str, cache_max_bytes: int=None, cache_ttl: float=None,
+    min_size: int=1, max_size: int=8, timeout: float=30.0
+):
     """
+    Params::
+        cache_max_bytes, cache_ttl:
+            Cache of select results. See DBConnector.
+        min_size, max_size, timeout:
+            Connection pool. See DBConnectorPool. The DB work of each request runs in a thread of max_size threads,
+            so the requests are processed in parallel and the event loop isn't blocked.
     Usage::
         webapi.py
         >>> from kkpsgre.webapi import create_app
         >>> app = create_app(HOST, PORT, DBNAME, USER, PASS, dbtype=DBTYPE)
         uvicorn
         >>> nohup uvicorn dbapi:app --port ${PORT} >/dev/null 2>&1 &
-
+    Note::
+        The writes to the same table wait for each other. The writes whose tables cannot be specified ( DDL, ... ) wait for each other.
     """
-    app  = FastAPI()
-    lock = asyncio.Lock()
-    DB   = DBConnector(HOST, PORT, DBNAME, USER, PASS, dbtype=DBTYPE, max_disp_len=200)
+    app      = FastAPI()
+    executor = ThreadPoolExecutor(max_workers=max_size)
+    locks    = {} # tblname: asyncio.Lock. None is for the writes whose tables cannot be specified.
+    kwargs   = {"max_disp_len": 200, "cache_max_bytes": cache_max_bytes, "cache_ttl": cache_ttl, "min_size": min_size, "max_size": max_size, "timeout": timeout}
+    state    = {"pool": DBConnectorPool(HOST, PORT, DBNAME, USER, PASS, dbtype=DBTYPE, **kwargs)}
+
+    async def run(func, *args):
+        """ Run func(DB, *args) in the thread pool with a connection of the pool. """
+        pool = state["pool"]
+        def __work():
+            with pool.connection() as DB:
+                return func(DB, *args)
+        return await asyncio.get_running_loop().run_in_executor(executor, __work)
+
+    async def run_write(tblnames: list[str] | None, func, *args):
+        """ Only the writes which have the same table wait for each other. The locks are taken in sorted order to avoid deadlock. """
+        keys = sorted(set(tblnames)) if tblnames is not None else [None]
+        async with contextlib.AsyncExitStack() as stack:
+            for x in keys:
+                await stack.enter_async_context(locks.setdefault(x, asyncio.Lock()))
+            return await run(func, *args)
 
     @app.post('/select/')
     async def select(select: Select):
-        async with lock:
-            df = DB.select_sql(select.sql)
+        df = await run(lambda DB: DB.select_sql(select.sql))
         return to_str_timestamp(df).to_json()
 
-    @app.post('/insert/')
-    async def insert(insert: Insert):
-        df = pd.DataFrame(insert.data)
+    def to_df(data: dict) -> pd.DataFrame:
+        df = pd.DataFrame(data)
         for x in df.columns:
             if (df[x].dtype == np.dtypes.ObjectDType) and df.shape[0] > 0:
                 if str(df[x].iloc[0]).find("%DATETIME%") == 0:
                     df[x] = df[x].str[len("%DATETIME%"):]
                     df[x] = pd.to_datetime(df[x])
-        async with lock:
+        return df
+
+    @app.post('/insert/')
+    async def insert(insert: Insert):
+        df = to_df(insert.data)
+        def __work(DB: DBConnector):
             if insert.add_sql is not None:
                 DB.delete_sql(insert.tblname, str_where=insert.add_sql, set_sql=True)
             DB.insert_from_df(df, insert.tblname, set_sql=True, str_null="", is_select=insert.is_select)
             DB.execute_sql()
+        await run_write([insert.tblname], __work)
+        return True
+
+    @app.post('/upsert/')
+    async def upsert(upsert: Upsert):
+        df = to_df(upsert.data)
+        def __work(DB: DBConnector):
+            DB.upsert_from_df(df, upsert.tblname, update_columns=upsert.update_columns, do_nothing=upsert.do_nothing, set_sql=True, keys=upsert.keys)
+            DB.execute_sql()
+        await run_write([upsert.tblname], __work)
         return True
 
     @app.post('/delete/')
     async def delete(delete: Delete):
-        async with lock:
+        def __work(DB: DBConnector):
             DB.delete_sql(delete.tblname, str_where=delete.str_where, set_sql=True)
             DB.execute_sql()
+        await run_write([delete.tblname], __work)
         return True
 
     @app.post('/exec/')
     async def exec(exec: Exec):
-        async with lock:
+        tblnames = []
+        for x in ([exec.sql] if isinstance(exec.sql, str) else exec.sql):
+            listwk = get_write_tables(x)
+            if listwk is None:
+                tblnames = None
+                break
+            tblnames += listwk
+        def __work(DB: DBConnector):
             DB.set_sql(exec.sql)
             DB.execute_sql()
+        await run_write(tblnames, __work)
         return True
 
     @app.post('/reconnect/')
     async def connect(reconnect: ReConnect):
         if reconnect.logfilepath == "": reconnect.logfilepath = None
-        async with lock:
-            DB.__del__()
-            DB.__init__(HOST, PORT, DBNAME, USER, PASS, dbtype=DBTYPE, max_disp_len=200, logfilepath=reconnect.logfilepath, log_level=reconnect.log_level, is_newlogfile=reconnect.is_newlogfile)
+        pool = await asyncio.get_running_loop().run_in_executor(executor, lambda: DBConnectorPool(
+            HOST, PORT, DBNAME, USER, PASS, dbtype=DBTYPE, logfilepath=reconnect.logfilepath, log_level=reconnect.log_level, is_newlogfile=reconnect.is_newlogfile, **kwargs
+        ))
+        pool, state["pool"] = state["pool"], pool
+        pool.close() # The connections in use are closed when they're returned.
         return True
 
     @app.post('/disconnect/')
     async def disconnect(disconnect: BaseModel):
-        async with lock:
-            DB.__del__()
+        state["pool"].close()
         return True
 
     @app.post('/dbinfo/')
     async def dbinfo(_: BaseModel):
-        dictwk = None
-        async with lock:
-            dictwk = copy.deepcopy(DB.dbinfo)
-        return dictwk
+        return copy.deepcopy(state["pool"].dbinfo)
+
+    @app.post('/cache/')
+    async def cache(_: BaseModel):
+        return state["pool"].cache_info()
 
     @app.post('/test/')
     async def test(_: BaseModel):
-        async with lock:
-            df = DB.read_table_layout()
+        df = await run(lambda DB: DB.read_table_layout())
         return df.to_json()
 
     return app
@@ -0,0 +1,49 @@
+import argparse, io, time
+import numpy as np
+import pandas as pd
+# local package
+from kkpsgre.util.dataframe import to_string_all_columns
+from kkpsgre.util.pgcopy import df_to_pgcopy
+
+
+"""
+Benchmark of encoding a dataframe for COPY FROM. No database is needed.
+    csv    : to_string_all_columns + replace + to_csv ( current execute_copy_from_df )
+    binary : df_to_pgcopy ( format="binary" )
+Usage::
+    python bench_copy_from_df.py --rows 100000
+"""
+
+
+def create_df(n_rows: int) -> (pd.DataFrame, list[str]):
+    rng = np.random.default_rng(0)
+    df  = pd.DataFrame({
+        "id":       np.arange(n_rows),
+        "value1":   rng.random(n_rows),
+        "value2":   np.where(rng.random(n_rows) < 0.1, np.nan, rng.random(n_rows) * 1000),
+        "count":    rng.integers(0, 1000000, n_rows),
+        "unixtime": pd.Timestamp("2024-01-01", tz="UTC") + pd.to_timedelta(np.arange(n_rows), unit="s"),
+        "name":     [f"name{i % 1000}" for i in range(n_rows)],
+    })
+    return df, ["bigint", "double precision", "double precision", "integer", "timestamp with time zone", "text"]
+
+def encode_csv(df: pd.DataFrame) -> io.StringIO:
+    df = df.copy()
+    df["unixtime"] = df["unixtime"].dt.strftime("%Y-%m-%d %H:%M:%S.%f%z")
+    df = to_string_all_columns(df, n_round=8, rep_nan="%%null%%", rep_inf="%%null%%", rep_minf="%%null%%", strtmp="-9999999")
+    df = df.replace(r"\r\n", " ", regex=True).replace(r"\n", " ", regex=True).replace(r"\t", " ", regex=True).replace(r"\\", " ", regex=True)
+    buffer = io.StringIO()
+    df.to_csv(buffer, quotechar="\t", sep="\t", index=False, header=False)
+    return buffer
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+    df, data_types = create_df(args.rows)
+    for name, func in [("csv", lambda: encode_csv(df)), ("binary", lambda: df_to_pgcopy(df, data_types))]:
+        time_st = time.perf_counter()
+        buffer  = func()
+        time_ed = time.perf_counter()
+        print(f"{name:6s} rows: {args.rows}, encode: {time_ed - time_st:8.3f} [s], size: {len(buffer.getvalue()) / 1024 / 1024:8.1f} [MB]")
@@ -0,0 +1,43 @@
+import argparse, time
+# local package
+from kkpsgre.connector import DBConnector
+
+
+"""
+Benchmark of the latency of execute_sql() and select_many() by the PostgreSQL driver.
+    psycopg2 : one network round trip per statement.
+    psycopg  : psycopg 3 pipeline mode. The statements are sent at once and the results are read after that.
+The difference grows with the network latency. To emulate a remote server on the local network, add a delay to the interface.
+    sudo tc qdisc add dev eth0 root netem delay 5ms   # remove: sudo tc qdisc del dev eth0 root
+Usage::
+    python bench_execute_pipeline.py --host 99.99.0.2 --number 100
+"""
+
+
+TBLNAME = "test_table"
+
+
+def run(db: DBConnector, n: int) -> (float, float):
+    time_st = time.perf_counter()
+    for i in range(n):
+        db.set_sql(f"DELETE FROM {TBLNAME} WHERE id = {1000000 + i};")
+        db.set_sql(f"INSERT INTO {TBLNAME} (id) VALUES ({1000000 + i});")
+    db.execute_sql()
+    time_ex = time.perf_counter() - time_st
+    time_st = time.perf_counter()
+    db.select_many([f"SELECT id FROM {TBLNAME} WHERE id = {1000000 + i};" for i in range(n)])
+    time_se = time.perf_counter() - time_st
+    db.delete_sql(TBLNAME, str_where=f"id >= 1000000 and id < {1000000 + n}", set_sql=False)
+    return time_ex, time_se
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host",   type=str, default="99.99.0.2")
+    parser.add_argument("--port",   type=int, default=5432)
+    parser.add_argument("--number", type=int, default=100)
+    args = parser.parse_args()
+    for driver in ["psycopg2", "psycopg"]:
+        db = DBConnector(args.host, port=args.port, dbname="testdb", user="postgres", password="postgres", dbtype="psgre", max_disp_len=100, driver=driver)
+        time_ex, time_se = run(db, args.number)
+        print(f"{driver:8s} statements: {args.number * 2:6d}, execute_sql: {time_ex:8.3f} [s], select_many: {time_se:8.3f} [s]")
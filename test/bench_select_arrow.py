@@ -0,0 +1,72 @@
+import argparse, datetime, time, resource
+import multiprocessing as mp
+import pandas as pd
+import polars as pl
+import pyarrow as pa
+# local package
+from kkpsgre.util.arrow import rows_to_arrow
+
+
+"""
+Benchmark of decoding the rows fetched by cursor into a dataframe.
+The rows are created in the process so that no database is needed.
+Each case runs in a new process so that the peak RSS ( ru_maxrss ) is not affected by other cases.
+Usage::
+    python bench_select_arrow.py --long 1000000 --wide 200
+"""
+
+
+TZ = datetime.timezone(datetime.timedelta(hours=9))
+
+
+def create_rows(n_rows: int, n_cols: int) -> (list[tuple], list[str], list[pa.DataType]):
+    """ The columns are cycle of int, float, string, datetime and bool like a general table. """
+    base     = datetime.datetime(2024, 1, 1, tzinfo=TZ)
+    funcs    = [
+        (lambda i: i,                                          pa.int64()),
+        (lambda i: (i * 0.1 if i % 10 != 0 else None),         pa.float64()),
+        (lambda i: f"str{i % 1000}",                           pa.string()),
+        (lambda i: base + datetime.timedelta(seconds=i),       pa.timestamp("us", tz="UTC")),
+        (lambda i: (i % 2 == 0 if i % 7 != 0 else None),       pa.bool_()),
+    ]
+    colnames = [f"col{i}" for i in range(n_cols)]
+    types    = [funcs[i % len(funcs)][1] for i in range(n_cols)]
+    rows     = [tuple(funcs[j % len(funcs)][0](i) for j in range(n_cols)) for i in range(n_rows)]
+    return rows, colnames, types
+
+def decode(rows: list[tuple], colnames: list[str], types: list[pa.DataType], method: str):
+    if   method == "current_pandas":
+        return pd.DataFrame(rows, columns=colnames)
+    elif method == "current_polars":
+        return pl.DataFrame(rows, schema=colnames, orient="row", infer_schema_length=None)
+    elif method == "arrow_pandas":
+        return rows_to_arrow(rows, colnames, types).to_pandas(types_mapper=pd.ArrowDtype)
+    elif method == "arrow_polars":
+        return pl.from_arrow(rows_to_arrow(rows, colnames, types))
+    else:
+        raise ValueError(f"unexpected method: {method}")
+
+def run_case(n_rows: int, n_cols: int, method: str, queue: mp.Queue):
+    rows, colnames, types = create_rows(n_rows, n_cols)
+    rss_bef = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    time_st = time.perf_counter()
+    df      = decode(rows, colnames, types, method)
+    time_ed = time.perf_counter()
+    rss_aft = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((df.shape, time_ed - time_st, (rss_aft - rss_bef) / 1024)) # ru_maxrss is KB in Linux
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--long", type=int, default=1000000)
+    parser.add_argument("--wide", type=int, default=200)
+    args = parser.parse_args()
+    ctx  = mp.get_context("spawn")
+    for name, n_rows, n_cols in [("long", args.long, 10), ("wide", args.long // 20, args.wide)]:
+        for method in ["current_pandas", "arrow_pandas", "current_polars", "arrow_polars"]:
+            queue   = ctx.Queue()
+            process = ctx.Process(target=run_case, args=(n_rows, n_cols, method, queue))
+            process.start()
+            shape, sec, rss = queue.get()
+            process.join()
+            print(f"{name:4s} {str(shape):16s} {method:15s} decode: {sec:8.3f} [s], peak RSS increase: {rss:9.1f} [MB]")
@@ -0,0 +1,46 @@
+import argparse, time
+import numpy as np
+import pandas as pd
+# local package
+from kkpsgre.util.dataframe import to_string_all_columns, to_string_all_columns_legacy
+
+
+"""
+Benchmark of converting all columns to strings for insert / update / COPY. No database is needed.
+    legacy     : to_string_all_columns_legacy ( np.vectorize and regex check of each column )
+    vectorised : to_string_all_columns ( dispatched on the dtype )
+The outputs are checked to be the same.
+Usage::
+    python bench_to_string_all_columns.py --rows 1000000 --cols 30
+"""
+
+
+def create_df(n_rows: int, n_cols: int) -> pd.DataFrame:
+    """ The columns are int, nullable Int, float, float with nan / inf, bool, datetime and string in rotation. """
+    rng   = np.random.default_rng(0)
+    funcs = [
+        lambda: rng.integers(-1000000, 1000000, n_rows),
+        lambda: pd.array(np.where(rng.random(n_rows) < 0.1, None, rng.integers(0, 1000, n_rows)), dtype="Int64"),
+        lambda: rng.random(n_rows) * 1000,
+        lambda: np.where(rng.random(n_rows) < 0.1, np.nan, np.where(rng.random(n_rows) < 0.01, np.inf, rng.standard_normal(n_rows))),
+        lambda: rng.random(n_rows) < 0.5,
+        lambda: pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 10**8, n_rows), unit="s"),
+        lambda: pd.Series([f"name{i % 1000}" for i in range(n_rows)], dtype=object).where(rng.random(n_rows) >= 0.1, None),
+    ]
+    return pd.DataFrame({f"col{i}": funcs[i % len(funcs)]() for i in range(n_cols)})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--cols", type=int, default=30)
+    parser.add_argument("--nround", type=int, default=8)
+    args = parser.parse_args()
+    df      = create_df(args.rows, args.cols)
+    results = {}
+    for name, func in [("legacy", to_string_all_columns_legacy), ("vectorised", to_string_all_columns)]:
+        time_start    = time.perf_counter()
+        results[name] = func(df, n_round=args.nround, rep_nan="%%null%%", rep_inf="%%null%%", rep_minf="%%null%%", strtmp="-9999999")
+        print(f"{name:10s}: {time.perf_counter() - time_start:8.2f} [s]")
+    assert results["legacy"].equals(results["vectorised"])
+    print(f"rows: {args.rows}, cols: {args.cols}, same output: True")
@@ -4,3 +4,10 @@ set -euo pipefail
 python test_sql_pandas.py
 python test_sql_polars.py
 python test_error.py
+python test_sql_to_mongo_filter.py
+python test_to_string_all_columns.py
+if python -c "import asyncpg, aiomysql, motor" 2>/dev/null; then
+    python test_sql_async.py
+else
+    echo "test_sql_async.py is skipped because the optional extra \"async\" is not installed. pip install kkpsgre[async]"
+fi
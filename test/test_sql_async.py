@@ -0,0 +1,52 @@
+import asyncio
+# local package
+from kkpsgre.connector_async import AsyncDBConnector
+from kklogger import set_logger
+from test_sql_pandas import create_test_df_pandas, DBNAME, TBLNAME
+
+
+LOGGER = set_logger(__name__)
+
+
+async def main():
+    df_org   = create_test_df_pandas()
+    db_psgre = AsyncDBConnector("99.99.0.2", port=5432,  dbname=DBNAME, user="postgres", password="postgres", dbtype="psgre", max_disp_len=5000)
+    db_mysql = AsyncDBConnector("99.99.0.3", port=3306,  dbname=DBNAME, user="mysql",    password="mysql",    dbtype="mysql", max_disp_len=5000)
+    db_mongo = AsyncDBConnector("99.99.0.4", port=27017, dbname=DBNAME, user="root",     password="secret",   dbtype="mongo", max_disp_len=5000)
+    await asyncio.gather(db_psgre.connect(), db_mysql.connect(), db_mongo.connect())
+
+    LOGGER.info("DELETE & INSERT", color=["BOLD", "GREEN"])
+    for db in [db_psgre, db_mysql, db_mongo]:
+        await db.delete_sql(TBLNAME, str_where="id in (1,2,3,4,5,6)", set_sql=False)
+        await db.insert_from_df(df_org, TBLNAME, set_sql=False, n_round=30)
+
+    LOGGER.info("CONCURRENT SELECT", color=["BOLD", "GREEN"])
+    for db in [db_psgre, db_mysql, db_mongo]:
+        list_df = await asyncio.gather(*[db.select_sql(f"SELECT id FROM {TBLNAME} WHERE id = {x}") for x in df_org["id"].tolist()])
+        assert [y for x in list_df for y in x["id"].tolist()] == df_org["id"].tolist()
+    df = await db_psgre.select_sql(f"SELECT {','.join(df_org.columns.tolist())} FROM {TBLNAME} WHERE id = %s", params=(1, ))
+    assert df["id"].tolist() == [1]
+
+    LOGGER.info("COPY", color=["BOLD", "GREEN"])
+    for format in ["csv", "binary"]:
+        await db_psgre.delete_sql(TBLNAME, str_where="id in (1,2,3,4,5,6)", set_sql=False)
+        await db_psgre.execute_copy_from_df(df_org, TBLNAME, system_colname_list=[], format=format)
+        df = await db_psgre.select_sql(f"SELECT id, int_with_nan FROM {TBLNAME} ORDER BY id;")
+        assert df["id"].tolist() == df_org["id"].tolist() and df["int_with_nan"].isna().sum() == df_org["int_with_nan"].isna().sum()
+
+    LOGGER.info("EXECUTE", color=["BOLD", "GREEN"])
+    for db in [db_psgre, db_mysql]:
+        await db.upsert_from_df(df_org.assign(int_no_nan=df_org["int_no_nan"] + 1), TBLNAME, update_columns=["int_no_nan"])
+        await db.execute_sql()
+        df = await db.select_sql(f"SELECT id, int_no_nan FROM {TBLNAME} ORDER BY id;")
+        assert df["int_no_nan"].tolist() == (df_org["int_no_nan"] + 1).tolist()
+    await db_mongo.upsert_from_df(df_org.assign(int_no_nan=df_org["int_no_nan"] + 1), TBLNAME, update_columns=["int_no_nan"], keys=["id"])
+    await db_mongo.update_from_df(df_org.assign(int_no_nan=df_org["int_no_nan"] + 2), TBLNAME, ["int_no_nan"], ["id"])
+    df = (await db_mongo.select_sql(f"SELECT id, int_no_nan FROM {TBLNAME}")).sort_values("id")
+    assert df["int_no_nan"].tolist() == (df_org["int_no_nan"] + 2).tolist()
+
+    await asyncio.gather(db_psgre.close(), db_mysql.close(), db_mongo.close())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
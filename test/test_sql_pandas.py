@@ -1,5 +1,8 @@
+import importlib.util
+import decimal
 import pandas as pd
 import numpy as np
+import polars as pl
 from datetime import datetime, timezone, timedelta
 from zoneinfo import ZoneInfo
 # local package
@@ -176,3 +179,202 @@ if __name__ == "__main__":
     assert df["bool_no_nan"].astype(bool).equals(df_org["bool_no_nan"])
     assert df["bool_with_nan"].astype(object).replace({float("nan"): None}).apply(lambda x: bool(x) if x is not None else None).equals(df_org["bool_with_nan"])
     assert df["category_column"].equals(df_org["category_column"].astype(str))
+
+    LOGGER.info("SELECT ITER", color=["BOLD", "GREEN"])
+    for db in [db_psgre, db_mysql, db_mongo]:
+        df      = db.select_sql(f"SELECT {','.join(df_org.columns.tolist())} FROM {TBLNAME}")
+        list_df = [dfwk for dfwk in db.select_iter(f"SELECT {','.join(df_org.columns.tolist())} FROM {TBLNAME}", chunksize=4)]
+        assert len(list_df) == 2
+        assert pd.concat(list_df, axis=0, ignore_index=True).equals(df)
+
+    LOGGER.info("SELECT COPY", color=["BOLD", "GREEN"])
+    df      = db_psgre.select_sql( f"SELECT {','.join(df_org.columns.tolist())} FROM {TBLNAME}")
+    df_copy = db_psgre.select_copy(f"SELECT {','.join(df_org.columns.tolist())} FROM {TBLNAME}")
+    assert df_copy["id"].equals(df["id"])
+    assert (df_copy["datetime_no_nan"].dt.tz_convert("UTC") == df["datetime_no_nan"].dt.tz_convert("UTC")).all()
+    assert df_copy["str_no_nan"  ].equals(df["str_no_nan"  ])
+    assert df_copy["str_with_nan"].equals(df["str_with_nan"])
+    assert df_copy["bool_no_nan" ].equals(df["bool_no_nan" ])
+
+    LOGGER.info("SELECT PARALLEL", color=["BOLD", "GREEN"])
+    for db in [db_psgre, db_mysql]:
+        df = db.select_sql_parallel(f"SELECT {','.join(df_org.columns.tolist())} FROM {TBLNAME}", "id", n_partitions=3, n_workers=2)
+        assert df["id"].tolist() == df_org["id"].tolist()
+        df = db.select_sql_parallel(f"SELECT * FROM (SELECT id FROM {TBLNAME}) AS a", "id", n_partitions=8, n_workers=2, vmin=1, vmax=6)
+        assert df["id"].tolist() == df_org["id"].tolist()
+
+    LOGGER.info("SELECT CACHE", color=["BOLD", "GREEN"])
+    db_cache = DBConnector("99.99.0.2", port=5432,  dbname=DBNAME, user="postgres", password="postgres", dbtype="psgre", max_disp_len=5000, cache_max_bytes=2**20, cache_ttl=60)
+    df1 = db_cache.select_sql(f"SELECT * FROM {TBLNAME}")
+    df2 = db_cache.select_sql(f"SELECT *\n FROM {TBLNAME};")
+    assert df1.equals(df2) and db_cache.cache_info()["hits"] == 1
+    db_cache.delete_sql(TBLNAME, str_where="id = 1", set_sql=False)
+    assert db_cache.cache_info()["n_entries"] == 0
+    assert db_cache.select_sql(f"SELECT * FROM {TBLNAME}").shape[0] == df1.shape[0] - 1
+
+    LOGGER.info("SELECT MONGO ARROW", color=["BOLD", "GREEN"])
+    df    = db_mongo.select_sql(f"SELECT {','.join(df_org.columns.tolist())} FROM {TBLNAME}")
+    df_pa = db_mongo.select_sql(f"SELECT {','.join(df_org.columns.tolist())} FROM {TBLNAME}", use_arrow=True)
+    assert df_pa["id"].equals(df["id"])
+    assert df_pa["datetime_no_nan"].equals(df["datetime_no_nan"])
+    assert df_pa["str_with_nan"].equals(df["str_with_nan"])
+
+    LOGGER.info("SELECT MONGO GROUP BY", color=["BOLD", "GREEN"])
+    sql      = f"SELECT category_column, COUNT(*) AS n, SUM(int_no_nan) AS total, MAX(float_with_nan) AS fmax FROM {TBLNAME} GROUP BY category_column HAVING COUNT(*) > 1;"
+    df_psgre = db_psgre.select_sql(sql).sort_values("category_column").reset_index(drop=True)
+    df_mongo = db_mongo.select_sql(sql).sort_values("category_column").reset_index(drop=True)
+    assert df_mongo.columns.tolist() == ["category_column", "n", "total", "fmax"]
+    assert df_mongo["category_column"].tolist() == df_psgre["category_column"].tolist()
+    assert df_mongo["n"].tolist() == df_psgre["n"].tolist()
+    assert df_mongo["total"].tolist() == df_psgre["total"].tolist()
+    assert db_mongo.select_sql(f"SELECT COUNT(DISTINCT category_column) AS n FROM {TBLNAME};")["n"].iloc[0] == df_org["category_column"].nunique()
+
+    LOGGER.info("SELECT PARAMS", color=["BOLD", "GREEN"])
+    for host, port, user, dbtype in [("99.99.0.2", 5432, "postgres", "psgre"), ("99.99.0.3", 3306, "mysql", "mysql")]:
+        db_prep = DBConnector(host, port=port, dbname=DBNAME, user=user, password=user, dbtype=dbtype, max_disp_len=5000, prepared_cache_size=2)
+        for i in [2, 3, 4, 2]:
+            df = db_prep.select_sql(f"SELECT id FROM {TBLNAME} WHERE id = %(id)s OR id = %(id)s + 100;", params={"id": i})
+            assert df["id"].tolist() == [i]
+        assert len(db_prep.prepared) == 1
+        db_prep.execute_sql(f"DELETE FROM {TBLNAME} WHERE id = %s;", params=(2, ))
+        assert db_prep.select_sql(f"SELECT id FROM {TBLNAME} WHERE id = %s;", params=(2, )).shape[0] == 0
+
+    LOGGER.info("SELECT SCHEMA", color=["BOLD", "GREEN"])
+    for db in [db_psgre, db_mysql]:
+        df = db.select_sql(f"SELECT {','.join(df_org.columns.tolist())} FROM {TBLNAME};", ret_polars=True)
+        assert df.schema["float_with_nan"] in [pl.Float32, pl.Float64] and df.schema["datetime_no_nan"] == pl.Datetime("us", "UTC")
+        assert len(db.layout_store.decode_schema) > 0
+
+    LOGGER.info("SELECT NUMERIC", color=["BOLD", "GREEN"])
+    for db in [db_psgre, db_mysql]:
+        sql = "SELECT CAST(1.10 AS DECIMAL(10,2)) AS x;"
+        assert db.select_sql(sql)["x"].iloc[0] == decimal.Decimal("1.10")
+        assert db.select_sql(sql, ret_polars=True).schema["x"] == pl.Decimal
+        db_float = db.clone(numeric_as_float=True)
+        assert db_float.select_sql(sql)["x"].dtype == np.float64
+        assert db_float.select_sql(sql, ret_polars=True).schema["x"] == pl.Float64
+        db_float.__del__()
+
+    LOGGER.info("COPY BINARY", color=["BOLD", "GREEN"])
+    db_psgre.delete_sql(TBLNAME, str_where="id in (1,2,3,4,5,6)", set_sql=False)
+    db_psgre.execute_copy_from_df(df_org, TBLNAME, system_colname_list=[], format="binary")
+    df = db_psgre.select_sql(f"SELECT {','.join(df_org.columns.tolist())} FROM {TBLNAME} ORDER BY id;")
+    assert df["id"].tolist() == df_org["id"].tolist() and df["float_with_nan"].isna().tolist() == df_org["float_with_nan"].isna().tolist()
+    assert df["str_with_nan"].isna().tolist() == df_org["str_with_nan"].isna().tolist()
+
+    LOGGER.info("COPY STREAM", color=["BOLD", "GREEN"])
+    for format in ["csv", "binary"]:
+        db_psgre.delete_sql(TBLNAME, str_where="id in (1,2,3,4,5,6)", set_sql=False)
+        db_psgre.execute_copy_from_df(df_org, TBLNAME, system_colname_list=[], format=format, chunksize=4)
+        assert db_psgre.select_sql(f"SELECT id FROM {TBLNAME} ORDER BY id;")["id"].tolist() == df_org["id"].tolist()
+
+    LOGGER.info("INSERT VALUES", color=["BOLD", "GREEN"])
+    for db in [db_psgre, db_mysql]:
+        db.delete_sql(TBLNAME, str_where="id in (1,2,3,4,5,6)", set_sql=False)
+        db.insert_from_df(df_org, TBLNAME, set_sql=False, method="values", page_size=4)
+        df = db.select_sql(f"SELECT {','.join(df_org.columns.tolist())} FROM {TBLNAME} ORDER BY id;")
+        assert df["id"].tolist() == df_org["id"].tolist() and df["str_with_nan"].equals(df_org["str_with_nan"])
+
+    LOGGER.info("LOAD DATA", color=["BOLD", "GREEN"])
+    db_load = DBConnector("99.99.0.3", port=3306, dbname=DBNAME, user="mysql", password="mysql", dbtype="mysql", max_disp_len=5000, kwargs_db={"allow_local_infile": True})
+    db_load.delete_sql(TBLNAME, str_where="id in (1,2,3,4,5,6)", set_sql=False)
+    db_load.execute_load_data_from_df(df_org, TBLNAME, system_colname_list=[], chunksize=4)
+    df = db_load.select_sql(f"SELECT {','.join(df_org.columns.tolist())} FROM {TBLNAME} ORDER BY id;")
+    assert df["id"].tolist() == df_org["id"].tolist() and df["str_with_nan"].isna().tolist() == df_org["str_with_nan"].isna().tolist()
+
+    LOGGER.info("UPSERT", color=["BOLD", "GREEN"])
+    for db in [db_psgre, db_mysql]:
+        dfwk = df_org.copy()
+        dfwk["int_no_nan"] = dfwk["int_no_nan"] // 2
+        db.upsert_from_df(dfwk, TBLNAME, update_columns=["int_no_nan"], set_sql=False, page_size=4)
+        df = db.select_sql(f"SELECT id, int_no_nan FROM {TBLNAME} ORDER BY id;")
+        assert df["id"].tolist() == dfwk["id"].tolist() and df["int_no_nan"].tolist() == dfwk["int_no_nan"].tolist()
+        db.upsert_from_df(df_org, TBLNAME, do_nothing=True, set_sql=False)
+        assert db.select_sql(f"SELECT int_no_nan FROM {TBLNAME} ORDER BY id;")["int_no_nan"].tolist() == dfwk["int_no_nan"].tolist()
+
+    LOGGER.info("UPDATE STAGING", color=["BOLD", "GREEN"])
+    for db in [db_psgre, db_mysql]:
+        dfwk = df_org.copy()
+        dfwk["int_no_nan"]   = dfwk["int_no_nan"] * 3
+        dfwk["str_with_nan"] = dfwk["str_with_nan"].iloc[::-1].values
+        db.update_from_df(dfwk, TBLNAME, columns_set=["int_no_nan", "str_with_nan"], columns_where=["id"], method="staging", chunksize=4, page_size=2)
+        df = db.select_sql(f"SELECT id, int_no_nan, str_with_nan FROM {TBLNAME} ORDER BY id;")
+        assert df["int_no_nan"].tolist() == dfwk["int_no_nan"].tolist() and df["str_with_nan"].isna().tolist() == dfwk["str_with_nan"].isna().tolist()
+
+    LOGGER.info("UPDATE STAGING WITHOUT COPY BINARY", color=["BOLD", "GREEN"])
+    for db in [db_psgre, db_mysql]:
+        # TIME is not in PGCOPY_TYPES, so the temporary table is loaded by inserts and the strings are kept as they are.
+        db.execute_sql("DROP TABLE IF EXISTS test_staging;")
+        db.execute_sql("CREATE TABLE test_staging (id INTEGER PRIMARY KEY, tm TIME, memo TEXT);")
+        db.execute_sql("INSERT INTO test_staging (id, tm, memo) VALUES (1, '10:00:00', 'a'), (2, NULL, 'b'), (3, NULL, 'c');")
+        db.refresh("test_staging")
+        dfwk = pd.DataFrame({"id": [1, 2, 3], "tm": ["11:00:00", None, "12:30:00"], "memo": ["tab\there", "line1\nline2\r\nline3", "back\\slash"]})
+        db.update_from_df(dfwk, "test_staging", columns_set=["tm", "memo"], columns_where=["id"], method="staging", page_size=2)
+        df = db.select_sql("SELECT id, memo FROM test_staging ORDER BY id;")
+        assert df["memo"].tolist() == dfwk["memo"].tolist()
+        db.execute_sql("DROP TABLE test_staging;")
+
+    LOGGER.info("INSERT CHUNKED", color=["BOLD", "GREEN"])
+    for db in [db_psgre, db_mysql]:
+        db.delete_sql(TBLNAME, str_where="id in (1,2,3,4,5,6)", set_sql=False)
+        db.insert_from_df(df_org, TBLNAME, set_sql=True, max_bytes=1000, max_rows=4)
+        assert len(db.sql_list) >= 2 and max([len(x.encode("utf8")) for x in db.sql_list]) <= 1000
+        db.execute_sql()
+        assert db.select_sql(f"SELECT id FROM {TBLNAME} ORDER BY id;")["id"].tolist() == df_org["id"].tolist()
+    assert db_mysql.get_max_statement_bytes() < db_mysql.max_packet
+
+    LOGGER.info("MONGO INSERT CHUNKED", color=["BOLD", "GREEN"])
+    db_mongo.delete_sql(TBLNAME, str_where="id in (1,2,3,4,5,6)")
+    db_mongo.insert_from_df(df_org, TBLNAME, n_jobs=2, chunksize=4, sort_by="datetime_no_nan")
+    df = db_mongo.select_sql(f"SELECT {','.join(df_org.columns.tolist())} FROM {TBLNAME}")
+    assert sorted(df["id"].tolist()) == df_org["id"].tolist() and df["int_with_nan"].isna().sum() == df_org["int_with_nan"].isna().sum()
+
+    LOGGER.info("MONGO UPSERT", color=["BOLD", "GREEN"])
+    dfwk = df_org.copy()
+    dfwk["str_no_nan"] = dfwk["str_no_nan"] + "_upd"
+    db_mongo.update_from_df(dfwk.iloc[:3], TBLNAME, columns_set=["str_no_nan"], columns_where=["id"], chunksize=2, n_jobs=2)
+    db_mongo.upsert_from_df(dfwk.iloc[3:], TBLNAME, keys=["id"], update_columns=["str_no_nan"], chunksize=2, n_jobs=2)
+    df = db_mongo.select_sql(f"SELECT id, str_no_nan FROM {TBLNAME}").sort_values("id")
+    assert df["id"].tolist() == dfwk["id"].tolist() and df["str_no_nan"].tolist() == dfwk["str_no_nan"].tolist()
+
+    if importlib.util.find_spec("psycopg") is not None: # psycopg 3 is the optional extra "psycopg3".
+        LOGGER.info("PSYCOPG PIPELINE", color=["BOLD", "GREEN"])
+        db_pipe = DBConnector("99.99.0.2", port=5432,  dbname=DBNAME, user="postgres", password="postgres", dbtype="psgre", max_disp_len=5000, driver="psycopg")
+        db_pipe.delete_sql(TBLNAME, str_where="id in (1,2,3,4,5,6)", set_sql=True)
+        db_pipe.insert_from_df(df_org, TBLNAME, set_sql=True, max_rows=2)
+        assert db_pipe.is_pipeline(db_pipe.sql_list)
+        db_pipe.execute_sql()
+        df1, df2 = db_pipe.select_many([f"SELECT id FROM {TBLNAME} ORDER BY id;", f"SELECT COUNT(*) AS n FROM {TBLNAME};"])
+        assert df1["id"].tolist() == df_org["id"].tolist() and df2["n"].tolist() == [df_org.shape[0]]
+        db_pipe.set_sql(f"DELETE FROM {TBLNAME} WHERE id = 1;")
+        db_pipe.set_sql(f"INSERT INTO {TBLNAME} (id) VALUES (2);") # duplicate key. The DELETE is rolled back as well.
+        try:
+            db_pipe.execute_sql()
+            assert False
+        except Exception:
+            pass
+        assert db_psgre.select_sql(f"SELECT id FROM {TBLNAME} ORDER BY id;")["id"].tolist() == df_org["id"].tolist()
+    else:
+        LOGGER.warning("PSYCOPG PIPELINE is skipped because psycopg is not installed.")
+
+    LOGGER.info("POOL", color=["BOLD", "GREEN"])
+    from concurrent.futures import ThreadPoolExecutor
+    from kkpsgre.pool import DBConnectorPool
+    pool = DBConnectorPool("99.99.0.2", port=5432, dbname=DBNAME, user="postgres", password="postgres", dbtype="psgre", max_disp_len=5000, min_size=1, max_size=3, timeout=10)
+    def __select(x: int) -> list[int]:
+        with pool.connection() as DB:
+            assert DB.layout_store is pool.layout_store and len(DB.sql_list) == 0
+            return DB.select_sql(f"SELECT id FROM {TBLNAME} WHERE id = {x};")["id"].tolist()
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        assert [y for x in executor.map(__select, df_org["id"].tolist()) for y in x] == df_org["id"].tolist()
+    assert pool.info()["n_open"] <= 3
+    pool.close()
+
+    LOGGER.info("LAZY LAYOUT", color=["BOLD", "GREEN"])
+    db_lazy = DBConnector("99.99.0.2", port=5432,  dbname=DBNAME, user="postgres", password="postgres", dbtype="psgre", max_disp_len=5000)
+    assert len(db_lazy.layout_store.entries) == 0
+    assert db_lazy.db_layout[TBLNAME] == db_psgre.db_layout[TBLNAME] and db_lazy.db_constraint[TBLNAME] == db_psgre.db_constraint[TBLNAME]
+    assert list(db_lazy.layout_store.entries.keys()) == [TBLNAME] and "not_exist_table" not in db_lazy.db_layout
+    db_lazy.refresh(TBLNAME)
+    assert db_lazy.db_layout_type[TBLNAME] == db_psgre.db_layout_type[TBLNAME] and db_lazy.layout_store.is_complete == False
+    assert TBLNAME in list(db_lazy.db_layout.keys()) and db_lazy.layout_store.is_complete
@@ -166,3 +166,12 @@ if __name__ == "__main__":
     assert df["bool_no_nan"].equals(df_org["bool_no_nan"])
     assert df["bool_with_nan"].equals(df_org["bool_with_nan"])
     assert df["category_column"].equals(df_org["category_column"].cast(str))
+
+    LOGGER.info("COPY", color=["BOLD", "GREEN"])
+    for format in ["csv", "binary"]:
+        db_psgre.delete_sql(TBLNAME, str_where="id in (1,2,3,4,5,6)", set_sql=False)
+        db_psgre.execute_copy_from_df(df_org, TBLNAME, system_colname_list=[], format=format, chunksize=4)
+        df = db_psgre.select_sql(f"SELECT {','.join(df_org.columns)} FROM {TBLNAME} ORDER BY id;")
+        assert df["id"].equals(df_org["id"])
+        assert df["str_with_nan"].is_null().equals(df_org["str_with_nan"].is_null()) # Line breaks and tabs are converted to spaces.
+        assert df["float_with_nan"].equals(df_org["float_with_nan"].replace([np.inf, -np.inf], None))
@@ -0,0 +1,37 @@
+import datetime
+# local package
+from kkpsgre.util.sql import sql_to_mongo_filter
+from bench_sql_to_mongo_filter import sql_to_mongo_filter_legacy
+from kklogger import set_logger
+
+
+LOGGER = set_logger(__name__)
+
+
+if __name__ == "__main__":
+    LOGGER.info("SAME AS LEGACY", color=["BOLD", "GREEN"])
+    for clause in [
+        "name = 'Taro'",
+        'name = "Taro"',
+        'a >= 1 and b = "x"',
+        "a = None",
+        "a = True and b = False",
+        "a != 1 and b <> 'x' and c = 1.5 and d = -1",
+        "gender in ('male', 'female', 0)",
+        'gender in ("male", "female")',
+        "id in (1, 2, 3) and name = 'x'",
+        "a = 1 or b = 2",
+        "a = 1 and (b = 2 or c = 3)",
+        "gender in ('male', 'female', 0) and (age > 30 or name = 'Taro')",
+        "dt >= '2024-01-01 00:00:00' and dt < \"2024-02-01\"",
+    ]:
+        assert sql_to_mongo_filter(clause) == sql_to_mongo_filter_legacy(clause), clause
+
+    LOGGER.info("NOT SUPPORTED BY LEGACY", color=["BOLD", "GREEN"])
+    assert sql_to_mongo_filter("a = null and b is not null") == {"$and": [{"a": {"$eq": None}}, {"b": {"$ne": None}}]}
+    assert sql_to_mongo_filter("a not in ('x', \"y\")") == {"a": {"$nin": ["x", "y"]}}
+    assert sql_to_mongo_filter("(a = 1 and b = 2) or (c = 3 and (d = 4 or e = '2024-01-01'))") == {"$or": [
+        {"$and": [{"a": {"$eq": 1}}, {"b": {"$eq": 2}}]},
+        {"$and": [{"c": {"$eq": 3}}, {"$or": [{"d": {"$eq": 4}}, {"e": {"$eq": datetime.datetime(2024, 1, 1)}}]}]},
+    ]}
+    assert sql_to_mongo_filter('"my field" = "it\'s"') == {"my field": {"$eq": "it's"}}
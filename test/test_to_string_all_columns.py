@@ -0,0 +1,37 @@
+import datetime
+import numpy as np
+import pandas as pd
+# local package
+from kkpsgre.util.dataframe import to_string_all_columns, to_string_all_columns_legacy
+from kklogger import set_logger
+
+
+LOGGER = set_logger(__name__)
+
+
+if __name__ == "__main__":
+    LOGGER.info("SAME AS LEGACY", color=["BOLD", "GREEN"])
+    tz = datetime.timezone(datetime.timedelta(hours=9))
+    df = pd.DataFrame({
+        "int":           [1, -2, 0, 2**62, -3],
+        "int_nullable":  pd.array([1, None, -3, 2**62, 0], dtype="Int64"),
+        "float":         [1.5, np.nan, np.inf, -np.inf, 0.123456789],
+        "float_integer": [1.0, np.nan, -2.0, 3.0, 100.0],
+        "bool":          [True, False, True, True, False],
+        "datetime_tz":   [
+            datetime.datetime(2024, 1, 1, 0, 0, 0, tzinfo=tz), None, datetime.datetime(2024, 2, 29, 23, 59, 59, 123456, tzinfo=tz),
+            datetime.datetime(1999, 12, 31, 12, 0, 0, tzinfo=tz), datetime.datetime(2024, 6, 1, 9, 30, 0, tzinfo=tz),
+        ],
+        "str":           ["a", None, "it's", "Emoji🔥", ""],
+        "str_integer":   ["1", "-2", "3.00", "-0.0", "9223372036854775807"],
+        "str_int_nan":   ["10", None, "-20", "30.0", "0"],
+        "str_float":     ["1.5", "-0.25", "3.14159265358979", None, "100.0001"],
+        "mixed":         [1, "a", 2.5, None, True],
+        "mixed_numeric": [1, 2.5, None, -3, 4.0],
+    })
+    for n_round in [0, 3, 8]:
+        df_new = to_string_all_columns(df, n_round=n_round)
+        df_old = to_string_all_columns_legacy(df, n_round=n_round)
+        for x in df.columns:
+            assert df_new[x].tolist() == df_old[x].tolist(), f"n_round: {n_round}, column: {x}, new: {df_new[x].tolist()}, legacy: {df_old[x].tolist()}"
+        assert df_new.equals(df_old)